@@ -0,0 +1,140 @@
+# answer_cache.py
+"""
+Semantic-similarity cache for generated answers.
+
+An answer is reused when a new question from the same role retrieves the
+same passage set and its embedding is within `threshold` cosine similarity
+of a cached question. Lookup is one matrix-vector product over the cached
+query embeddings of that role. Entries are evicted by TTL and LRU (bounded
+by `max_entries`) and dropped when their collection changes.
+"""
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1000, ttl_s: Optional[float] = 3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        # per role: normalized query matrix + parallel entry list
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._entries: Dict[str, List[Dict]] = {}
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidated": 0}
+
+    @staticmethod
+    def passage_key(passages: List[Dict]) -> tuple:
+        return tuple(sorted(str(p.get("id") or p.get("source")) for p in passages))
+
+    def __len__(self):
+        return sum(len(e) for e in self._entries.values())
+
+    def lookup(self, role: str, query_embedding, passages: List[Dict]) -> Optional[Dict]:
+        """Cached {"answer", "question", "similarity"} or None."""
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        key = self.passage_key(passages)
+        now = time.time()
+        with self._lock:
+            self._expire(role, now)
+            entries = self._entries.get(role)
+            if not entries:
+                self.stats["misses"] += 1
+                return None
+
+            sims = self._vectors[role] @ q
+            same_passages = np.fromiter((e["passage_key"] == key for e in entries), dtype=bool, count=len(entries))
+            sims = np.where(same_passages, sims, -np.inf)
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.stats["misses"] += 1
+                return None
+
+            entry = entries[best]
+            entry["last_used"] = now
+            entry["hits"] += 1
+            self.stats["hits"] += 1
+            return {"answer": entry["answer"], "question": entry["question"], "similarity": float(sims[best])}
+
+    def store(self, role: str, collection_name, question: str, query_embedding,
+              passages: List[Dict], answer: str) -> None:
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        now = time.time()
+        entry = {
+            "question": question,
+            "answer": answer,
+            "collection_name": collection_name,
+            "passage_key": self.passage_key(passages),
+            "created_at": now,
+            "last_used": now,
+            "hits": 0,
+        }
+        with self._lock:
+            if role in self._vectors:
+                self._vectors[role] = np.vstack([self._vectors[role], q[None, :]])
+                self._entries[role].append(entry)
+            else:
+                self._vectors[role] = q[None, :]
+                self._entries[role] = [entry]
+            self._evict_lru()
+
+    def invalidate(self, collection_name: Optional[str] = None) -> int:
+        """Drop entries built on `collection_name` (all entries if None)."""
+        removed = 0
+        with self._lock:
+            for role in list(self._entries):
+                # fan-out answers are built on a tuple of collections
+                keep = [i for i, e in enumerate(self._entries[role])
+                        if collection_name is not None and collection_name not in (
+                            e["collection_name"] if isinstance(e["collection_name"], tuple) else (e["collection_name"],)
+                        )]
+                removed += len(self._entries[role]) - len(keep)
+                self._keep(role, keep)
+            self.stats["invalidated"] += removed
+        return removed
+
+    def metrics(self) -> Dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self),
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+    # ---------- internals (lock held) ----------
+
+    def _keep(self, role: str, keep: List[int]) -> None:
+        if not keep:
+            self._vectors.pop(role, None)
+            self._entries.pop(role, None)
+            return
+        self._vectors[role] = self._vectors[role][keep]
+        self._entries[role] = [self._entries[role][i] for i in keep]
+
+    def _expire(self, role: str, now: float) -> None:
+        if not self.ttl_s or role not in self._entries:
+            return
+        entries = self._entries[role]
+        keep = [i for i, e in enumerate(entries) if now - e["created_at"] <= self.ttl_s]
+        if len(keep) < len(entries):
+            self.stats["expired"] += len(entries) - len(keep)
+            self._keep(role, keep)
+
+    def _evict_lru(self) -> None:
+        overflow = len(self) - self.max_entries
+        if overflow <= 0:
+            return
+        by_age = sorted(
+            ((e["last_used"], role, i) for role, entries in self._entries.items() for i, e in enumerate(entries))
+        )
+        drop: Dict[str, set] = {}
+        for _, role, i in by_age[:overflow]:
+            drop.setdefault(role, set()).add(i)
+        for role, idx in drop.items():
+            self._keep(role, [i for i in range(len(self._entries[role])) if i not in idx])
+        self.stats["evictions"] += overflow
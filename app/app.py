@@ -1,14 +1,28 @@
 # app.py
+import time
+_T_SCRIPT_START = time.perf_counter()
+
 import streamlit as st
 #from functools import lru_cache
-from config import COLLECTION_MAP, DEFAULT_TOP_K
+from config import COLLECTION_MAP, DEFAULT_TOP_K, VECTOR_STORAGE, RESCORE_FACTOR, \
+    REDUCED_DIM, PROJECTION_DIR, PCA_SAMPLE_SIZE, PCA_MIN_SAMPLES, PCA_WHITEN, SNAPSHOT_DIR, \
+    DEDUP_CONFIG, DEDUP_DIR, INDEX_TYPE, INDEX_PARAMS, TUNING_DIR, TARGET_RECALL, RETUNE_GROWTH, \
+    ANSWER_CACHE, SINGLE_FLIGHT_MAX_WAIT_S, EMBED_BATCHING, CONSISTENCY, REINDEX_DIR, REINDEX, \
+    TEXT_STORE, QUERY_JOURNAL, RANGE_SEARCH, LOAD_SCHEDULER, MMAP_FIELDS, SMALL_TO_BIG, \
+    PAGE_CACHE, ROUTING, CHUNKING
 
-from rag_backend import connect_milvus, answer_question, ensure_collection, \
-    prep_embedding, ingest_pdf_to_collection  
 #from milvus_utils import drop_milvus_collections, pause_milvus_service
-from milvus_utils2 import pause_milvus_service
-from sentence_transformers import SentenceTransformer
-EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# heavy / optional modules (rag_backend -> pymilvus + pypdf, milvus_utils2 -> IBM
+# SDKs, snapshot -> pyarrow, sentence_transformers -> torch) and the modules that
+# pull them in are imported lazily where they are used, so the first page renders
+# while the warm-up thread does the expensive imports
+from warmup import get_model, start_warmup
+from singleflight import SingleFlight
+from consistency import write_token
+from text_store import open_text_store
+from small_to_big import parents_namespace
+from routing import role_collections, drop_summary, summary_path
+from filters import compile_filter
 from pprint import pprint
 
 import os
@@ -34,23 +48,162 @@ MANAGERS_COLLECTION = "offerings_managers_only"
 # Embedding model (384 dimensions)
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 EMBEDDING_DIM = 384  # fixed for this model
+STORED_DIM = REDUCED_DIM or EMBEDDING_DIM  # dim of the vector field in Milvus
 
 # ---------- Embedding model ----------
 
-@st.cache_resource
 def get_embedder(model_name: str):
-    return SentenceTransformer(model_name)
+    # process-wide cache shared with the background warm-up
+    return get_model(model_name)
+
+@st.cache_resource
+def get_embed_batcher():
+    # one batcher per server process, shared by all sessions
+    if not EMBED_BATCHING["enabled"]:
+        return None
+    from embed_batcher import EmbeddingBatcher
+    options = {k: v for k, v in EMBED_BATCHING.items() if k != "enabled"}
+    return EmbeddingBatcher(get_embedder(EMBEDDING_MODEL_NAME), **options)
 
 def embed_fn(texts):
     """
     texts: List[str]
     returns: List[List[float]]  (Milvus-ready)
     """
+    batcher = get_embed_batcher()
+    if batcher is not None:
+        return batcher.embed(texts)
     model = get_embedder(EMBEDDING_MODEL_NAME)
     return model.encode(texts, convert_to_numpy=True).tolist()
 
 
 
+# ---------- Server warm-up (once per process, not per session) ----------
+
+def _warmup_connect():
+    # runs in the warm-up thread, so pymilvus is imported off the script path
+    from rag_backend import connect_milvus
+    return connect_milvus(MILVUS_HOST, MILVUS_PORT, API_KEY)
+
+@st.cache_resource
+def get_readiness():
+    return start_warmup(
+        EMBEDDING_MODEL_NAME,
+        connect=_warmup_connect,
+        started_at=_T_SCRIPT_START,
+        imports_s=time.perf_counter() - _T_SCRIPT_START,
+    )
+
+readiness = get_readiness()
+
+
+@st.cache_resource
+def get_answer_cache():
+    if not ANSWER_CACHE["enabled"]:
+        return None
+    from answer_cache import SemanticAnswerCache
+    return SemanticAnswerCache(
+        threshold=ANSWER_CACHE["threshold"],
+        max_entries=ANSWER_CACHE["max_entries"],
+        ttl_s=ANSWER_CACHE["ttl_s"],
+    )
+
+answer_cache = get_answer_cache()
+
+
+@st.cache_resource
+def get_single_flight():
+    return SingleFlight(max_wait_s=SINGLE_FLIGHT_MAX_WAIT_S)
+
+single_flight = get_single_flight()
+
+
+@st.cache_resource
+def get_text_store():
+    if not TEXT_STORE["enabled"]:
+        return None
+    return open_text_store(TEXT_STORE["path"], level=TEXT_STORE["level"])
+
+text_store = get_text_store()
+
+
+@st.cache_resource
+def get_parent_store():
+    if not SMALL_TO_BIG["enabled"]:
+        return None
+    return open_text_store(SMALL_TO_BIG["store_path"])
+
+parent_store = get_parent_store()
+small_to_big = {k: v for k, v in SMALL_TO_BIG.items() if k != "store_path"}
+
+
+@st.cache_resource
+def get_page_cache():
+    if not PAGE_CACHE["enabled"]:
+        return None
+    from page_cache import open_page_cache
+    return open_page_cache(PAGE_CACHE["path"])
+
+page_cache = get_page_cache()
+
+
+@st.cache_resource
+def get_query_journal():
+    if not QUERY_JOURNAL["enabled"]:
+        return None
+    from query_journal import QueryJournal
+    return QueryJournal(
+        QUERY_JOURNAL["path"],
+        slow_ms=QUERY_JOURNAL["slow_ms"],
+        max_bytes=QUERY_JOURNAL["max_bytes"],
+        backups=QUERY_JOURNAL["backups"],
+    )
+
+query_journal = get_query_journal()
+
+@st.cache_resource
+def get_load_scheduler():
+    if not LOAD_SCHEDULER["enabled"]:
+        return None
+    from load_scheduler import LoadScheduler
+    return LoadScheduler(
+        idle_ttl_s=LOAD_SCHEDULER["idle_ttl_s"],
+        max_loaded=LOAD_SCHEDULER["max_loaded"],
+        check_interval_s=LOAD_SCHEDULER["check_interval_s"],
+        rate_window_s=LOAD_SCHEDULER["rate_window_s"],
+        pinned=LOAD_SCHEDULER["pinned"],
+    ).start()
+
+load_scheduler = get_load_scheduler()
+
+
+@st.cache_resource
+def get_reindex_jobs():
+    # the current (or last) background reindex, shared by all sessions
+    return {}
+
+reindex_jobs = get_reindex_jobs()
+
+
+def ensure_loaded_for(client, names):
+    # query-based maintenance (sample, scan, export, retune) needs loaded collections
+    from metadata import ensure_loaded
+    for name in names:
+        if load_scheduler is not None:
+            load_scheduler.ensure_loaded(client, name, count=False)
+        else:
+            ensure_loaded(client, name)
+
+
+range_search = {k: v for k, v in RANGE_SEARCH.items() if k != "enabled"} if RANGE_SEARCH["enabled"] else None
+routing = {k: v for k, v in ROUTING.items() if k != "dir"}
+routing_dir = ROUTING["dir"] if ROUTING["enabled"] else None
+
+
+def invalidate_answer_cache(collections):
+    if answer_cache is not None:
+        for name in collections:
+            answer_cache.invalidate(name)
 
 
 # ---------- Session state ----------
@@ -61,6 +214,13 @@ if "milvus_connected" not in st.session_state:
 if "is_embedding" not in st.session_state:
     st.session_state.is_embedding = False
 
+# pick up the warmed-up model / connection as soon as they are ready
+if readiness.embedder_ready.is_set():
+    st.session_state.is_embedding = True
+if readiness.milvus_ready.is_set() and st.session_state.client is None:
+    st.session_state.client = readiness.client
+    st.session_state.milvus_connected = True
+
 if "last_backend_error" not in st.session_state:
     st.session_state.last_backend_error = None
 
@@ -73,12 +233,17 @@ if "data_is_loaded" not in st.session_state:
 if "is_sample" not in st.session_state:
     st.session_state.is_sample = False
 
+if "write_tokens" not in st.session_state:
+    # collection -> write token of this session's last ingest (read-your-writes)
+    st.session_state.write_tokens = {}
+
 
 
 
 # ---------- Actions (safe callbacks) ----------
 
 def connect_milvus_bt():
+    from rag_backend import connect_milvus
     try:
         # IMPORTANT: keep the signature you already have
         # init_milvus(MILVUS_HOST, MILVUS_PORT, MILVUS_API_KEY)
@@ -93,6 +258,7 @@ def connect_milvus_bt():
 
 
 def prepare_embedding():
+    from rag_backend import prep_embedding
     try:
         stats = prep_embedding(embed_fn=embed_fn, collection_map=COLLECTION_MAP)
         st.session_state.is_embedding = True
@@ -105,9 +271,16 @@ def prepare_embedding():
         st.session_state.last_backend_error = f"Load failed: {e}"
 
 def prepare_collections(client, PUBLIC_COLLECTION, MANAGERS_COLLECTION):
+    from rag_backend import ensure_collection
+    from metadata import invalidate_metadata
     try:
-        ensure_collection(client, PUBLIC_COLLECTION, EMBEDDING_DIM)
-        ensure_collection(client, MANAGERS_COLLECTION, EMBEDDING_DIM)
+        for name in [PUBLIC_COLLECTION, MANAGERS_COLLECTION]:
+            ensure_collection(
+                client, name, STORED_DIM, vector_storage=VECTOR_STORAGE,
+                index_type=INDEX_TYPE, index_params=INDEX_PARAMS,
+                store_text=text_store is None,
+                mmap_fields=MMAP_FIELDS,
+            )
         
         st.session_state.is_collection = True
         #st.session_state.last_backend_error = None
@@ -117,9 +290,16 @@ def prepare_collections(client, PUBLIC_COLLECTION, MANAGERS_COLLECTION):
         st.session_state.last_backend_error = f"Something wrong creating collections: {e}"
    
     try:
-        st.session_state.client.load_collection(PUBLIC_COLLECTION)
-        st.session_state.client.load_collection(MANAGERS_COLLECTION)
-        st.success(f"Collections loaded: {st.session_state.client.list_collections()}")
+        if load_scheduler is not None:
+            # loaded on first query, released when idle
+            for name in [PUBLIC_COLLECTION, MANAGERS_COLLECTION]:
+                load_scheduler.track(st.session_state.client, name)
+            st.success(f"Collections scheduled for on-demand loading: {[PUBLIC_COLLECTION, MANAGERS_COLLECTION]}")
+            return
+        for name in [PUBLIC_COLLECTION, MANAGERS_COLLECTION]:
+            st.session_state.client.load_collection(name)
+            invalidate_metadata(name)  # load state changed
+        st.success(f"Collections loaded: {[PUBLIC_COLLECTION, MANAGERS_COLLECTION]}")
     except Exception as e:
         st.session_state.is_collection = False
         st.session_state.last_backend_error = f"Something wrong with loading collections: {e}"
@@ -159,6 +339,9 @@ def prepare_collections(client, PUBLIC_COLLECTION, MANAGERS_COLLECTION):
 
 
 def load_data():
+    from rag_backend import ingest_pdf_to_collection
+    from tuning import maybe_retune
+    from reindex import resolve_collection
     try:
         client = st.session_state.client
         if client is None:
@@ -166,25 +349,70 @@ def load_data():
             return
 
         # Public
-        ingest_pdf_to_collection(
+        public_token = ingest_pdf_to_collection(
             client=client,
             collection_name=PUBLIC_COLLECTION,
             pdf_path=PUBLIC_PDF_PATH,
             offering_id="offering_xyz",
             model=get_embedder(EMBEDDING_MODEL_NAME),
+            vector_storage=VECTOR_STORAGE,
+            reduce_dim=REDUCED_DIM,
+            projection_dir=PROJECTION_DIR,
+            pca_sample_size=PCA_SAMPLE_SIZE,
+            pca_whiten=PCA_WHITEN,
+            pca_min_samples=PCA_MIN_SAMPLES,
+            dedup=DEDUP_CONFIG.get(PUBLIC_COLLECTION),
+            dedup_dir=DEDUP_DIR,
+            text_store=text_store,
+            small_to_big=small_to_big,
+            parent_store=parent_store,
+            page_cache=page_cache,
+            routing_dir=routing_dir,
+            routing_centroids=ROUTING["n_centroids"],
+            chunking=CHUNKING,
         )
 
         # Managers
-        ingest_pdf_to_collection(
+        managers_token = ingest_pdf_to_collection(
             client=client,
             collection_name=MANAGERS_COLLECTION,
             pdf_path=MANAGERS_PDF_PATH,
             offering_id="offering_xyz",
             model=get_embedder(EMBEDDING_MODEL_NAME),
+            vector_storage=VECTOR_STORAGE,
+            reduce_dim=REDUCED_DIM,
+            projection_dir=PROJECTION_DIR,
+            pca_sample_size=PCA_SAMPLE_SIZE,
+            pca_whiten=PCA_WHITEN,
+            pca_min_samples=PCA_MIN_SAMPLES,
+            dedup=DEDUP_CONFIG.get(MANAGERS_COLLECTION),
+            dedup_dir=DEDUP_DIR,
+            text_store=text_store,
+            small_to_big=small_to_big,
+            parent_store=parent_store,
+            page_cache=page_cache,
+            routing_dir=routing_dir,
+            routing_centroids=ROUTING["n_centroids"],
+            chunking=CHUNKING,
         )
 
+        for token in (public_token, managers_token):
+            if token is not None:
+                st.session_state.write_tokens[token["collection_name"]] = token
         st.session_state.data_is_loaded = True
+        invalidate_answer_cache([PUBLIC_COLLECTION, MANAGERS_COLLECTION])
         st.success("Data loaded into BOTH collections.")
+
+        # (re-)tune search params if the collections are new or grew a lot
+        ensure_loaded_for(client, [PUBLIC_COLLECTION, MANAGERS_COLLECTION])
+        for name in [PUBLIC_COLLECTION, MANAGERS_COLLECTION]:
+            tuned = maybe_retune(
+                client, resolve_collection(client, name), TUNING_DIR, growth=RETUNE_GROWTH,
+                target_recall=TARGET_RECALL, vector_storage=VECTOR_STORAGE,
+                consistency_level=CONSISTENCY["tuning"],
+            )
+            if tuned:
+                st.info(f"Tuned '{name}': {tuned['params']} (recall@{tuned['top_k']}={tuned['recall']})")
     except Exception as e:
         st.session_state.data_is_loaded = False
         st.session_state.last_backend_error = f"Load data failed: {type(e).__name__}: {e}"
@@ -192,13 +420,17 @@ def load_data():
 
 
 def sample_col():
+    from reindex import resolve_collection
     try:
+        ensure_loaded_for(st.session_state.client, [PUBLIC_COLLECTION])
         rows_public = st.session_state.client.query(
                 collection_name=PUBLIC_COLLECTION,
-                filter="offering_id == 'offering_xyz'",
-                output_fields=["id", "offering_id", "text"],
+                filter=compile_filter({"offering_ids": ["offering_xyz"]}),
+                output_fields=["id", "offering_id"] + ([] if text_store is not None else ["text"]),
                 limit=5,
             )
+        if text_store is not None:
+            text_store.fill_texts(resolve_collection(st.session_state.client, PUBLIC_COLLECTION), rows_public)
     
         for r in rows_public:
             #print("----")
@@ -223,15 +455,25 @@ def sample_col():
 #     st.session_state.data_is_loaded = False
 
 def drop_milvus_coll():
+    from reindex import drop_alias_and_versions
+    from milvus_utils import drop_milvus_collections
     try:
         if st.session_state.client is None:
             st.warning("Connect first.")
             return
 
+        # aliased (reindexed) collections: the alias and all its versions
+        for name in [PUBLIC_COLLECTION, MANAGERS_COLLECTION]:
+            for version in drop_alias_and_versions(st.session_state.client, name, REINDEX_DIR):
+                forget_collection_state(version)
         drop_milvus_collections(
             client=st.session_state.client,
             collections=[PUBLIC_COLLECTION, MANAGERS_COLLECTION],
         )
+        for name in [PUBLIC_COLLECTION, MANAGERS_COLLECTION]:
+            forget_collection_state(name)
+        invalidate_answer_cache([PUBLIC_COLLECTION, MANAGERS_COLLECTION])
+        st.session_state.write_tokens = {}
         st.session_state.is_collection = False
         st.session_state.data_is_loaded = False
         st.session_state.is_sample = False
@@ -243,6 +485,321 @@ def drop_milvus_coll():
 
 
 
+def export_snapshots():
+    from snapshot import export_collection
+    try:
+        if st.session_state.client is None:
+            st.warning("Connect first.")
+            return
+
+        ensure_loaded_for(st.session_state.client, [PUBLIC_COLLECTION, MANAGERS_COLLECTION])
+        for name in [PUBLIC_COLLECTION, MANAGERS_COLLECTION]:
+            manifest = export_collection(
+                client=st.session_state.client,
+                collection_name=name,
+                out_dir=os.path.join(SNAPSHOT_DIR, name),
+                text_store=text_store,
+                projection_dir=PROJECTION_DIR,
+                dedup_dir=DEDUP_DIR,
+                routing_dir=routing_dir,
+                parent_store=parent_store,
+            )
+            st.success(f"Exported {manifest['num_rows']} rows from '{name}'.")
+    except Exception as e:
+        st.session_state.last_backend_error = f"Export failed: {type(e).__name__}: {e}"
+        st.error(st.session_state.last_backend_error)
+
+
+def import_snapshots():
+    from snapshot import import_collection
+    try:
+        if st.session_state.client is None:
+            st.warning("Connect first.")
+            return
+
+        if st.session_state.get("overwrite_on_import"):
+            # drop through the app so dedup / tuning / routing state goes too
+            drop_milvus_coll()
+        for name in [PUBLIC_COLLECTION, MANAGERS_COLLECTION]:
+            n = import_collection(
+                client=st.session_state.client,
+                collection_name=name,
+                snapshot_dir=os.path.join(SNAPSHOT_DIR, name),
+                text_store=text_store,
+                projection_dir=PROJECTION_DIR,
+                dedup_dir=DEDUP_DIR,
+                routing_dir=routing_dir,
+                parent_store=parent_store,
+            )
+            st.session_state.write_tokens[name] = write_token(name)  # no insert timestamp: next read is Strong
+            st.success(f"Imported {n} rows into '{name}'.")
+        st.session_state.is_collection = True
+        st.session_state.data_is_loaded = True
+        invalidate_answer_cache([PUBLIC_COLLECTION, MANAGERS_COLLECTION])
+    except Exception as e:
+        st.session_state.last_backend_error = f"Import failed: {type(e).__name__}: {e}"
+        st.error(st.session_state.last_backend_error)
+
+
+REINDEX_SOURCES = {
+    PUBLIC_COLLECTION: PUBLIC_PDF_PATH,
+    MANAGERS_COLLECTION: MANAGERS_PDF_PATH,
+}
+
+
+def collection_state_files(name):
+    """Files holding per-collection state, keyed by the physical collection name."""
+    from dedup import dedup_state_path, duplicates_log_path
+    from tuning import tuned_path
+    from projection import projection_path
+    paths = [
+        projection_path(PROJECTION_DIR, name),
+        tuned_path(TUNING_DIR, name),
+        dedup_state_path(DEDUP_DIR, name),
+        duplicates_log_path(DEDUP_DIR, name),
+    ]
+    if routing_dir:
+        paths.append(summary_path(routing_dir, name))
+    return paths
+
+
+def move_collection_state(old_name, new_name):
+    """Follow a renamed collection with its state files and stored texts."""
+    for old_path, new_path in zip(collection_state_files(old_name), collection_state_files(new_name)):
+        if os.path.exists(old_path):
+            os.replace(old_path, new_path)
+    if text_store is not None:
+        text_store.rename_collection(old_name, new_name)
+    if parent_store is not None:
+        parent_store.rename_collection(parents_namespace(old_name), parents_namespace(new_name))
+
+
+def forget_collection_state(name):
+    """Delete a dropped collection's state files and stored texts."""
+    if load_scheduler is not None:
+        load_scheduler.forget(name)
+    for path in collection_state_files(name):
+        if os.path.exists(path):
+            os.remove(path)
+    drop_summary(routing_dir, name)  # also clears its cached summary
+    if text_store is not None:
+        text_store.delete_collection(name)
+    if parent_store is not None:
+        parent_store.delete_collection(parents_namespace(name))
+
+
+def _build_version(client, physical_name, alias):
+    from rag_backend import ensure_collection, ingest_pdf_to_collection
+    from tuning import maybe_retune
+    from metadata import invalidate_metadata
+    ensure_collection(
+        client, physical_name, STORED_DIM, vector_storage=VECTOR_STORAGE,
+        index_type=INDEX_TYPE, index_params=INDEX_PARAMS,
+        store_text=text_store is None,
+        mmap_fields=MMAP_FIELDS,
+    )
+    client.load_collection(physical_name)
+    invalidate_metadata(physical_name)
+    ingest_pdf_to_collection(
+        client=client,
+        collection_name=physical_name,
+        pdf_path=REINDEX_SOURCES[alias],
+        offering_id="offering_xyz",
+        model=get_embedder(EMBEDDING_MODEL_NAME),
+        vector_storage=VECTOR_STORAGE,
+        reduce_dim=REDUCED_DIM,
+        projection_dir=PROJECTION_DIR,
+        pca_sample_size=PCA_SAMPLE_SIZE,
+        pca_whiten=PCA_WHITEN,
+        pca_min_samples=PCA_MIN_SAMPLES,
+        dedup=DEDUP_CONFIG.get(alias),
+        dedup_dir=DEDUP_DIR,
+        text_store=text_store,
+        small_to_big=small_to_big,
+        parent_store=parent_store,
+        page_cache=page_cache,
+        routing_dir=routing_dir,
+        routing_centroids=ROUTING["n_centroids"],
+        chunking=CHUNKING,
+    )
+    maybe_retune(
+        client, physical_name, TUNING_DIR, growth=RETUNE_GROWTH,
+        target_recall=TARGET_RECALL, vector_storage=VECTOR_STORAGE,
+        consistency_level="Strong",
+    )
+
+
+def _shadow_search(client, physical_name, question, embed):
+    from rag_backend import SearchOptions, semantic_search
+    from tuning import load_tuned_params
+    from projection import load_projection
+    from metadata import collection_meta
+    tuned = load_tuned_params(TUNING_DIR, physical_name, collection_meta(client, physical_name))
+    return semantic_search(
+        client, physical_name, question, embed, top_k=DEFAULT_TOP_K,
+        options=SearchOptions(
+            vector_storage=VECTOR_STORAGE, rescore_factor=RESCORE_FACTOR,
+            consistency_level="Strong",
+            text_store=text_store,
+            small_to_big=small_to_big,
+            parent_store=parent_store,
+        ),
+        projection=load_projection(PROJECTION_DIR, physical_name),
+        search_params=tuned["params"] if tuned else None,
+    )
+
+
+def _reindex_alias(client, alias, legacy, embed, on_step):
+    # runs in the reindex job thread: no st.* calls in here
+    from tuning import load_tuned_params
+    from reindex import reindex, resolve_collection
+    from metadata import collection_meta
+    physical = resolve_collection(client, alias)
+    tuned = load_tuned_params(TUNING_DIR, physical, collection_meta(client, physical)) \
+        if client.has_collection(alias) else None
+    report = reindex(
+        client, alias,
+        build_fn=lambda name: _build_version(client, name, alias),
+        reindex_dir=REINDEX_DIR,
+        shadow_questions=REINDEX["shadow_questions"],
+        search_fn=lambda name, q: _shadow_search(client, name, q, embed),
+        min_overlap=REINDEX["min_overlap"],
+        replace_legacy=legacy,
+        on_legacy_rename=move_collection_state,
+        keep_versions=REINDEX["keep_versions"],
+        on_step=on_step,
+        min_count_ratio=REINDEX["min_count_ratio"],
+        min_recall=REINDEX["min_recall"],
+        n_queries=REINDEX["n_queries"],
+        vector_storage=VECTOR_STORAGE,
+        top_k=DEFAULT_TOP_K,
+        search_params=tuned["params"] if tuned else None,
+    )
+    if report["switched"]:
+        invalidate_answer_cache([alias])
+    return report
+
+
+def reindex_collections():
+    """Start rebuilding both collections as new versions in the background."""
+    from reindex import is_alias, start_reindex_job
+    client = st.session_state.client
+    if client is None:
+        st.warning("Connect first.")
+        return
+    job = reindex_jobs.get("current")
+    if job is not None and job.running:
+        st.warning("A reindex is already running.")
+        return
+    legacy = {}
+    for alias in REINDEX_SOURCES:
+        legacy[alias] = client.has_collection(alias) and not is_alias(client, alias)
+        if legacy[alias] and not st.session_state.get("confirm_legacy_reindex"):
+            st.warning(f"'{alias}' was created before aliases were used. Tick \"Migrate legacy collections\" "
+                       f"to rename it to '{alias}__v0' (kept for rollback) and reindex it.")
+            del legacy[alias]
+    if not legacy:
+        return
+    # cached resources are resolved here, in the script thread, not in the job
+    batcher = get_embed_batcher()
+    model = get_embedder(EMBEDDING_MODEL_NAME)
+    embed = batcher.embed if batcher is not None \
+        else (lambda texts: model.encode(texts, convert_to_numpy=True).tolist())
+    reindex_jobs["current"] = start_reindex_job(
+        list(legacy),
+        lambda alias, on_step: _reindex_alias(client, alias, legacy[alias], embed, on_step),
+    )
+    st.info("Reindex started in the background - progress is shown under \"Reindex job\".")
+
+
+def show_reindex_job():
+    job = reindex_jobs.get("current")
+    if job is None:
+        return
+    with st.expander("Reindex job", expanded=job.running):
+        if job.running:
+            st.caption("🟡 Running - use Refresh to update the progress")
+            st.button("Refresh 🔄", key="refresh_reindex")
+        st.json(job.summary())
+        for alias, report in job.reports.items():
+            if report["switched"]:
+                st.success(f"'{alias}' now serves '{report['candidate']}'.")
+            else:
+                st.warning(f"'{alias}' not switched, '{report['candidate']}' kept for inspection.")
+            st.json(report)
+        for alias, error in job.errors.items():
+            st.error(f"Reindex of '{alias}' failed: {error}")
+    if not job.running and st.session_state.get("reindex_seen") is not job:
+        # this session's write tokens point at the old physical collections
+        for alias, report in job.reports.items():
+            if report["switched"]:
+                st.session_state.write_tokens.pop(alias, None)
+        st.session_state.reindex_seen = job
+
+
+def refit_projections():
+    """Refit the PCA projections on all rows (after the collections have grown)."""
+    from rag_backend import reproject_collection
+    client = st.session_state.client
+    if client is None:
+        st.warning("Connect first.")
+        return
+    for name in [PUBLIC_COLLECTION, MANAGERS_COLLECTION]:
+        try:
+            report = reproject_collection(
+                client, name, get_embedder(EMBEDDING_MODEL_NAME), PROJECTION_DIR,
+                reduce_dim=REDUCED_DIM, pca_sample_size=PCA_SAMPLE_SIZE, pca_whiten=PCA_WHITEN,
+                pca_min_samples=PCA_MIN_SAMPLES, text_store=text_store,
+                dedup_dir=DEDUP_DIR if DEDUP_CONFIG.get(name, {}).get("enabled") else None,
+            )
+        except Exception as e:
+            st.session_state.last_backend_error = f"Refit of '{name}' failed: {type(e).__name__}: {e}"
+            st.error(st.session_state.last_backend_error)
+            continue
+        st.session_state.write_tokens[name] = report["token"]
+        invalidate_answer_cache([name])
+        st.success(f"'{name}': projection refitted on {report['rows']} rows "
+                   f"(explained variance {report['explained_variance_ratio']:.3f}).")
+
+
+def rollback_collections():
+    from reindex import rollback
+    client = st.session_state.client
+    if client is None:
+        st.warning("Connect first.")
+        return
+    for alias in REINDEX_SOURCES:
+        try:
+            target = rollback(client, alias, REINDEX_DIR)
+            invalidate_answer_cache([alias])
+            st.success(f"'{alias}' rolled back to '{target}'.")
+        except Exception as e:
+            st.warning(f"Rollback of '{alias}': {e}")
+
+
+def scan_collections():
+    from integrity import scan_collection, format_scan_report
+    try:
+        if st.session_state.client is None:
+            st.warning("Connect first.")
+            return
+
+        ensure_loaded_for(st.session_state.client, [PUBLIC_COLLECTION, MANAGERS_COLLECTION])
+        for name in [PUBLIC_COLLECTION, MANAGERS_COLLECTION]:
+            report = scan_collection(
+                client=st.session_state.client,
+                collection_name=name,
+                dim=STORED_DIM,
+                vector_storage=VECTOR_STORAGE,
+                check_norm=not REDUCED_DIM,
+                text_store=text_store,
+            )
+            st.code(format_scan_report(report))
+    except Exception as e:
+        st.session_state.last_backend_error = f"Scan failed: {type(e).__name__}: {e}"
+        st.error(st.session_state.last_backend_error)
+
+
 
 # ------------------------
 # ---------- UI ----------
@@ -253,6 +810,37 @@ st.title("🔍 Multitenant Milvus RAG DEMO")
 st.caption("Milvus + LLM RAG • managers vs employees collections")
 
 with st.sidebar:
+    if readiness.ready:
+        st.caption(f"🟢 Server ready (warm-up {readiness.phases.get('time_to_ready', 0):.1f} s)")
+    else:
+        st.caption("🟡 Server warming up (loading embedding model)...")
+    with st.expander("Startup profile"):
+        st.json(readiness.summary())
+    if answer_cache is not None:
+        with st.expander("Answer cache"):
+            st.json(answer_cache.metrics())
+    with st.expander("Request coalescing"):
+        st.json(single_flight.metrics())
+    if EMBED_BATCHING["enabled"] and readiness.ready:
+        with st.expander("Embedding batcher"):
+            st.json(get_embed_batcher().metrics())
+    if st.session_state.milvus_connected:
+        from metadata import metrics as metadata_metrics
+        with st.expander("Metadata cache"):
+            st.json(metadata_metrics())
+    if text_store is not None:
+        with st.expander("Text store"):
+            st.json(text_store.stats())
+    if page_cache is not None:
+        with st.expander("Page text cache"):
+            st.json(page_cache.stats())
+    if load_scheduler is not None:
+        with st.expander("Load scheduler"):
+            st.json(load_scheduler.metrics())
+    if query_journal is not None:
+        with st.expander("Query journal"):
+            st.json({"path": query_journal.path, **query_journal.stats})
+
     st.subheader("Quick Setup:")
 
     # st.write("Status:  \n",
@@ -289,18 +877,39 @@ with st.sidebar:
 
     st.header("Settings")
     role = st.radio("Your role", ["Employee", "Manager"])
+    if load_scheduler is not None and st.session_state.milvus_connected \
+            and st.session_state.get("prefetched_role") != role:
+        # start loading the role's collection(s) while the question is typed
+        for name in role_collections(COLLECTION_MAP[role]):
+            load_scheduler.prefetch(st.session_state.client, name)
+        st.session_state.prefetched_role = role
     top_k = st.slider("Number of passages", 1, 10, DEFAULT_TOP_K)
     show_debug = st.checkbox("Show retrieved passages", value=True)
+    profile_next = st.checkbox("Profile requests 🔬", value=False,
+                               help="cProfile + tracemalloc around each Ask (slower; off = no overhead)")
 
     st.markdown("---")
     st.header("Milvus controls")
     
+    st.button("Integrity scan 🩺", on_click=scan_collections)
+    st.button("Export snapshots 💾", on_click=export_snapshots)
+    st.button("Import snapshots ♻️", on_click=import_snapshots)
+    st.checkbox("Overwrite on import", key="overwrite_on_import",
+                help="Drop the existing collections before importing (otherwise import refuses non-empty ones)")
+    reindex_running = reindex_jobs.get("current") is not None and reindex_jobs["current"].running
+    st.button("Reindex (blue/green) 🔁", on_click=reindex_collections, disabled=reindex_running)
+    st.checkbox("Migrate legacy collections", key="confirm_legacy_reindex",
+                help="Allow the first reindex to rename collections created before aliases to <name>__v0")
+    st.button("Roll back reindex ↩️", on_click=rollback_collections, disabled=reindex_running)
+    show_reindex_job()
+    st.button("Refit PCA projection 📐", on_click=refit_projections, disabled=not REDUCED_DIM)
     st.button("DROP Milvus collections ", on_click=drop_milvus_coll)
     #st.write("🟢 Sample made" if st.session_state.is_sample else "🔴 No sample")
     
     # better way -> runs only the if script, not entire app.py
     if st.button("⏸️ Pause Milvus", disabled=not SERVICE_ID):
         try:
+            from milvus_utils2 import pause_milvus_service
             resp = pause_milvus_service(
                 service_id=SERVICE_ID,
                 auth_instance_id=AUTH_INSTANCE_ID,
@@ -325,7 +934,7 @@ with st.sidebar:
 
 st.markdown(
     f"Current role: **{role}** – you will only search in "
-    f"`{COLLECTION_MAP[role]}` collection."
+    f"`{', '.join(role_collections(COLLECTION_MAP[role]))}` collection."
 )
 
 question = st.text_area(
@@ -333,8 +942,19 @@ question = st.text_area(
     placeholder="TravelFlex",
     height=100,
 )
+offering_filter = st.text_input(
+    "Restrict to offering ids (optional, comma-separated):",
+    placeholder="offering_xyz",
+)
 
-if st.button("Ask"):
+# the model is still loading in the warm-up thread; a failed warm-up (done but
+# not ready) falls back to the manual setup buttons instead of blocking Ask
+warming_up = not readiness.ready and not readiness.done.is_set()
+if warming_up:
+    st.info("⏳ Warming up (loading the embedding model) - Ask is enabled once the server is ready.")
+
+if st.button("Ask", disabled=warming_up):
+    from rag_backend import SearchOptions, answer_question
     if not question.strip():
         st.warning("Type your question first.")
     elif not st.session_state.milvus_connected:
@@ -348,26 +968,84 @@ if st.button("Ask"):
             #     collection_map=COLLECTION_MAP,
             #     top_k=top_k,
             # )
-                result = answer_question(
+            options = SearchOptions(
+                vector_storage=VECTOR_STORAGE,
+                rescore_factor=RESCORE_FACTOR,
+                projection_dir=PROJECTION_DIR,
+                tuning_dir=TUNING_DIR,
+                consistency_level=CONSISTENCY["search"],
+                read_token=[
+                    st.session_state.write_tokens.get(name) for name in role_collections(COLLECTION_MAP[role])
+                ],
+                text_store=text_store,
+                filters={"offering_ids": [o.strip() for o in offering_filter.split(",") if o.strip()]},
+                range_search=range_search,
+                load_scheduler=load_scheduler,
+                small_to_big=small_to_big,
+                parent_store=parent_store,
+                routing=routing,
+                routing_dir=routing_dir,
+            )
+            ask = lambda: answer_question(
                 client=st.session_state.client,
                 question=question,
                 role=role,
                 embed_fn=embed_fn,
                 collection_map=COLLECTION_MAP,
                 top_k=top_k,
+                options=options,
+                answer_cache=answer_cache,
+                # a coalesced request would be computed (and profiled) in another session
+                single_flight=None if profile_next else single_flight,
+                journal=query_journal,
             )
+            if profile_next:
+                from profiling import profile_call  # only imported when profiling
+                result, profile = profile_call(ask)
+            else:
+                result, profile = ask(), None
 
 
         st.subheader("Answer")
         st.write(result["answer"])
+        if result.get("cache_hit"):
+            st.caption("⚡ Answer served from the semantic cache")
 
         if show_debug:
+            if range_search is not None:
+                st.caption(f"Range search kept {len(result['passages'])} of up to {top_k} passages")
+            if result.get("route"):
+                route = result["route"]
+                st.caption(f"Routed to {', '.join(route['selected'])}"
+                           + (f" (fallback: {route['fallback']})" if route["fallback"] else ""))
+            st.caption(f"Context: {result['context_words']} words in {len(result['passages'])} passages")
+            st.caption("Timings (ms): " + ", ".join(f"{k} {v:.0f}" for k, v in result["timings"].items()))
             st.subheader("Sources")
             for i, p in enumerate(result["passages"], start=1):
                 with st.expander(f"Source {i} (score={p['score']:.4f})"):
                     st.write(p["text"])
                     if p.get("source"):
                         st.caption(f"Source: {p['source']}")
+                    if p.get("collection"):
+                        st.caption(f"Collection: {p['collection']}")
+
+        if profile is not None:
+            st.subheader(f"Profile ({profile['wall_ms']:.0f} ms under the profiler)")
+            st.caption("Stage timeline (ms)")
+            st.bar_chart({row["stage"]: row["duration_ms"] for row in profile["timeline"]})
+            st.dataframe(profile["timeline"], use_container_width=True)
+            st.caption("Hot functions (by own time)")
+            st.dataframe(profile["hot_functions"], use_container_width=True)
+            if profile["memory"]:
+                st.caption(f"Allocations: peak {profile['memory']['peak_kb']:.0f} KiB, "
+                           f"retained {profile['memory']['retained_kb']:.0f} KiB")
+                st.dataframe(profile["memory"]["top_allocations"], use_container_width=True)
+            st.download_button(
+                "Download profile (.prof)",
+                data=profile["pstats"],
+                file_name=f"request_{time.strftime('%Y%m%d_%H%M%S')}.prof",
+                mime="application/octet-stream",
+            )
 
 
 #bottom_status = st.empty()
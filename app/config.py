@@ -15,3 +15,176 @@ COLLECTION_MAP = {
 
 
 DEFAULT_TOP_K = 5
+
+# Vector storage: "float32", "float16", "bfloat16" or "binary" (HAMMING index).
+# Compact modes over-fetch top_k * RESCORE_FACTOR hits and rerank them
+# against the float32 query (0 disables rescoring). The rerank uses the
+# stored vectors: near float32 quality for float16 / bfloat16, but binary only
+# keeps sign bits, so rescoring improves its ranking without restoring it.
+VECTOR_STORAGE = "float32"
+RESCORE_FACTOR = 4
+
+# Optional PCA reduction of stored vectors (0 keeps the full embedding dim).
+# The projection is fitted at first ingest and saved in PROJECTION_DIR;
+# "Refit PCA projection" refits it on all rows once the collection has grown.
+# Fitting needs PCA_MIN_SAMPLES chunks (None = 4 * REDUCED_DIM, never fewer
+# than REDUCED_DIM + 1): the bundled PDFs give a few chunks each, so a
+# reduced collection needs a larger first document (or a small REDUCED_DIM).
+REDUCED_DIM = 0
+PROJECTION_DIR = "./projections"
+PCA_SAMPLE_SIZE = 10000
+PCA_MIN_SAMPLES = None
+PCA_WHITEN = False
+
+# Parquet snapshots written/read by the export/import buttons
+SNAPSHOT_DIR = "./snapshots"
+
+# Ingest-time near-duplicate elimination, per collection (keys as in
+# dedup.DEFAULT_DEDUP). State and duplicate -> canonical logs go to DEDUP_DIR.
+DEDUP_CONFIG = {
+    "offerings_public": {"enabled": False, "threshold": 0.8, "cosine_threshold": 0.95},
+    "offerings_managers_only": {"enabled": False, "threshold": 0.8, "cosine_threshold": 0.95},
+}
+DEDUP_DIR = "./dedup"
+
+# Vector index. FLAT is exact; for IVF_* / HNSW / DISKANN the search knob
+# (nprobe / ef / search_list) is tuned to TARGET_RECALL after data loads and
+# re-tuned when a collection grows by more than RETUNE_GROWTH.
+INDEX_TYPE = "FLAT"
+INDEX_PARAMS = {}          # e.g. {"nlist": 1024} for IVF_FLAT
+TUNING_DIR = "./tuning"
+TARGET_RECALL = 0.95
+RETUNE_GROWTH = 0.5
+
+# Semantic answer cache (shared by all sessions): reuse an answer when a
+# same-role question with the same retrieved passages is this similar.
+ANSWER_CACHE = {"enabled": True, "threshold": 0.95, "max_entries": 1000, "ttl_s": 3600}
+
+# Coalesce identical concurrent "Ask" requests; followers wait at most this
+# long for the in-flight one before running their own.
+SINGLE_FLIGHT_MAX_WAIT_S = 30.0
+
+# Shared embedding micro-batcher: query encodes from all sessions are
+# collected for up to max_wait_ms (or max_batch_size texts) and run as one
+# batch. A full queue (max_queue requests) rejects new ones after
+# submit_timeout_s.
+EMBED_BATCHING = {
+    "enabled": True,
+    "max_batch_size": 32,
+    "max_wait_ms": 2.0,
+    "num_workers": 1,
+    "max_queue": 1024,
+    "submit_timeout_s": 1.0,
+}
+
+# Consistency level per operation ("Strong" / "Session" / "Bounded" /
+# "Eventually"). Searches right after this session's own ingest use the
+# write token from ingestion instead, so they still see the new rows.
+CONSISTENCY = {
+    "search": "Bounded",
+    "tuning": "Strong",
+}
+
+# Blue/green reindexing: COLLECTION_MAP names become aliases over versioned
+# collections (<name>__v<N>). A new version must keep MIN_COUNT_RATIO of
+# the live row count and reach MIN_RECALL on a sample before the alias is
+# switched; SHADOW_QUESTIONS are run against both versions for the report.
+REINDEX_DIR = "./reindex"
+REINDEX = {
+    "min_count_ratio": 0.9,
+    "min_recall": 0.9,
+    "n_queries": 50,
+    "min_overlap": None,       # e.g. 0.6 to block switches that change results a lot
+    "keep_versions": 2,
+    "shadow_questions": [
+        "What is the scope of the offering?",
+        "What are the payment terms?",
+        "What is the deadline for submitting offers?",
+    ],
+}
+
+# External chunk text store: when enabled, new collections have no text
+# field; chunk text is kept compressed in this SQLite file and fetched for
+# the final hits only (no 2048-char limit). Existing collections keep their
+# schema, so switch this on together with a reindex or a fresh load.
+TEXT_STORE = {"enabled": False, "path": "./text_store/chunks.sqlite", "level": 3}
+
+# Query journal: append every Ask (question, role, top_k, search params,
+# per-stage timings, result keys) to a size-rotated JSONL file; requests
+# slower than slow_ms are flagged. Replay with `python app/query_journal.py`.
+QUERY_JOURNAL = {
+    "enabled": False,
+    "path": "./journal/queries.jsonl",
+    "slow_ms": 2000,
+    "max_bytes": 10_000_000,
+    "backups": 5,
+}
+
+# Range search: top_k becomes a cap; only hits better than `threshold`
+# are kept, and the list stops at the first score gap >= max_gap. The
+# threshold is per metric: minimum similarity for COSINE / IP, maximum
+# distance for L2 / HAMMING (bits; a binary collection with no HAMMING entry
+# is not cut). With compact storage and RESCORE_FACTOR > 0 the kept hits are
+# rescored to cosine similarities and cut again at `rescore_threshold`.
+RANGE_SEARCH = {
+    "enabled": False,
+    "threshold": {"COSINE": 0.3, "IP": 0.3},
+    "best": None,
+    "rescore_threshold": 0.3,
+    "max_gap": 0.15,
+    "min_hits": 1,
+}
+
+# Collection load scheduler: collections are loaded on first query and
+# released after idle_ttl_s without queries (or the coldest ones when more
+# than max_loaded are loaded); pinned collections stay loaded.
+LOAD_SCHEDULER = {
+    "enabled": False,
+    "idle_ttl_s": 900,
+    "max_loaded": None,
+    "check_interval_s": 60,
+    "rate_window_s": 300,
+    "pinned": [],
+}
+
+# Fields new collections serve memory-mapped from disk, e.g. ["text", "embedding"]
+MMAP_FIELDS = []
+
+# Small-to-big retrieval: embed sentence-level child chunks, keep their
+# parent windows in a local store and expand hits to deduplicated parents
+# (window = matched units +- N; None = whole parent). Needs a fresh load or
+# a reindex to take effect.
+SMALL_TO_BIG = {
+    "enabled": False,
+    "store_path": "./text_store/parents.sqlite",
+    "parent_tokens": 256,
+    "child_tokens": 48,
+    "fetch_factor": 4,
+    "window": 1,
+}
+
+# Cache of extracted PDF page text, keyed by file / page content hash and
+# extractor version. Re-ingesting an unchanged PDF (e.g. to try other chunk
+# sizes) skips pypdf; a changed PDF only has its changed pages re-extracted.
+PAGE_CACHE = {
+    "enabled": True,
+    "path": "./page_cache/pages.sqlite",
+}
+
+# Flat chunking at ingest (words per chunk, words shared by neighbours).
+# With the page cache on, changing these and re-ingesting (or reindexing)
+# re-chunks the cached page text without re-parsing the PDFs.
+CHUNKING = {"max_tokens": 256, "overlap": 20}
+
+# Routing for roles that map to a list of collections in COLLECTION_MAP
+# (e.g. "Manager": ["offerings_public", "offerings_managers_only", ...]).
+# Ingest keeps an n_centroids k-means summary of each collection under dir;
+# a query then searches only the `probes` collections whose summaries match
+# it best, or every collection when none matches by at least min_score.
+ROUTING = {
+    "enabled": False,
+    "dir": "./routing",
+    "n_centroids": 8,
+    "probes": 2,
+    "min_score": None,
+}
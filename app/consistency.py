@@ -0,0 +1,71 @@
+# consistency.py
+"""
+Per-operation consistency levels and read-your-writes tokens.
+
+Hot-path searches run at a cheap level (Bounded / Eventually). Ingestion
+returns a write token (the hybrid timestamp of its last insert); a search
+given that token waits until Milvus has applied that write, so the session
+that loaded data sees it without making every other search Strong. When
+the insert result carries no timestamp, the token makes that session's
+reads of the collection Strong.
+"""
+from typing import Dict, Optional
+
+
+CONSISTENCY_LEVELS = ("Strong", "Session", "Bounded", "Eventually")
+
+
+def _check_level(level: str) -> str:
+    if level not in CONSISTENCY_LEVELS:
+        raise ValueError(f"Unknown consistency level '{level}', expected one of {list(CONSISTENCY_LEVELS)}")
+    return level
+
+
+def mutation_timestamp(result) -> Optional[int]:
+    """
+    Hybrid timestamp of an insert / upsert result: MutationResult.timestamp,
+    or a "timestamp" key of a MilvusClient result dict. None if the result
+    does not carry one (MilvusClient in pymilvus 2.4+ drops it).
+    """
+    ts = getattr(result, "timestamp", None)
+    if ts is None and isinstance(result, dict):
+        ts = result.get("timestamp")
+    return int(ts) if ts else None
+
+
+def write_token(collection_name: str, result=None) -> Dict:
+    """
+    Token for a write to `collection_name`, from the write's result (the
+    last insert / upsert). Without a server timestamp the token asks for a
+    Strong read instead: a client-clock timestamp could be ahead of the
+    server's and make the read wait until it times out.
+    """
+    return {"collection_name": collection_name, "timestamp": mutation_timestamp(result)}
+
+
+def consistency_kwargs(
+    collection_name: str,
+    level: Optional[str] = None,
+    read_token: Optional[Dict] = None,
+) -> Dict:
+    """
+    Extra kwargs for client.search / client.query. A read_token for this
+    collection pins the read to at least that write; otherwise `level` is
+    used (None keeps the collection's default). read_token may also be a
+    list of tokens (one per collection of a fan-out search).
+    """
+    if isinstance(read_token, list):
+        read_token = next((t for t in read_token if t and t.get("collection_name") == collection_name), None)
+    if read_token and read_token.get("collection_name") == collection_name:
+        if read_token.get("timestamp") is None:
+            return {"consistency_level": "Strong"}
+        return {"consistency_level": "Customized", "guarantee_timestamp": int(read_token["timestamp"])}
+    if level is None:
+        return {}
+    return {"consistency_level": _check_level(level)}
+
+
+def read_timestamps(read_token) -> tuple:
+    """Timestamps of a read_token (or list of tokens), e.g. for request keys."""
+    tokens = read_token if isinstance(read_token, list) else [read_token]
+    return tuple(t["timestamp"] for t in tokens if t)
@@ -0,0 +1,373 @@
+# dedup.py
+"""
+Ingest-time near-duplicate chunk elimination.
+
+Chunks are MinHashed on word shingles and bucketed with LSH banding, so
+candidate pairs come from shared buckets instead of all-pairs comparison.
+Candidates above the Jaccard threshold can additionally be confirmed with a
+cosine check on their embeddings.
+
+Per collection, the signatures (and embeddings) of kept chunks are stored in
+`<dedup_dir>/<collection>.npz` so later PDFs are deduplicated against what is
+already in Milvus, and every dropped chunk is logged with its canonical row
+in `<dedup_dir>/<collection>.duplicates.jsonl`.
+"""
+import json
+import os
+import zlib
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+_MERSENNE_31 = np.uint64((1 << 31) - 1)
+_KEY_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+DEFAULT_DEDUP = {
+    "enabled": False,
+    "threshold": 0.8,          # estimated Jaccard similarity of shingle sets
+    "cosine_threshold": 0.95,  # None to skip the embedding check
+    "num_perm": 128,
+    "bands": 16,               # num_perm / bands rows per band
+    "shingle_size": 5,         # words per shingle
+    # each chunk is compared with at most this many (oldest) rows per LSH
+    # bucket: bounds the cost of repeated boilerplate, at the price of
+    # missing a match that only shares an oversized bucket
+    "max_bucket_compare": 32,
+}
+
+
+def _shingle_hashes(text: str, shingle_size: int) -> np.ndarray:
+    tokens = text.lower().split()
+    if len(tokens) <= shingle_size:
+        grams = [" ".join(tokens)]
+    else:
+        grams = [" ".join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)]
+    return np.fromiter(
+        (zlib.crc32(g.encode("utf-8")) & 0x7FFFFFFF for g in set(grams)),
+        dtype=np.uint64,
+    )
+
+
+def minhash_signatures(
+    texts: List[str],
+    num_perm: int = 128,
+    shingle_size: int = 5,
+    seed: int = 1,
+) -> np.ndarray:
+    """MinHash signature matrix (len(texts), num_perm) using (a*x + b) mod 2^31-1."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, (1 << 31) - 1, size=(num_perm, 1), dtype=np.uint64)
+    b = rng.integers(0, (1 << 31) - 1, size=(num_perm, 1), dtype=np.uint64)
+
+    sigs = np.empty((len(texts), num_perm), dtype=np.uint32)
+    for i, text in enumerate(texts):
+        h = _shingle_hashes(text, shingle_size)
+        # a, h < 2^31 so a * h fits in uint64
+        sigs[i] = ((a * h[None, :] + b) % _MERSENNE_31).min(axis=1)
+    return sigs
+
+
+def band_keys(signatures: np.ndarray, bands: int) -> np.ndarray:
+    """
+    LSH bucket keys (len(signatures), bands): one uint64 hash per band.
+
+    Keys are stored with the dedup state, so a new ingest only bands its own
+    chunks; a hash collision only adds a candidate, which the Jaccard check
+    then rejects.
+    """
+    n, num_perm = signatures.shape
+    if num_perm % bands:
+        raise ValueError(f"num_perm={num_perm} is not divisible by bands={bands}")
+    rows = num_perm // bands
+    blocks = signatures.astype(np.uint64).reshape(n, bands, rows)
+    keys = np.zeros((n, bands), dtype=np.uint64)
+    with np.errstate(over="ignore"):  # wrap-around is the point
+        for r in range(rows):
+            keys = keys * _KEY_MULTIPLIER + blocks[:, :, r]
+    return keys
+
+
+def lsh_candidates(
+    signatures: np.ndarray,
+    bands: int,
+    max_bucket_compare: int = 32,
+    keys: Optional[np.ndarray] = None,
+    start: int = 0,
+) -> Dict[int, set]:
+    """
+    Map each row >= start to the lower-indexed rows it shares an LSH bucket with.
+
+    A row is compared with the oldest max_bucket_compare members of each of
+    its buckets, so heavily repeated boilerplate stays cheap; a duplicate
+    whose match sits further down an oversized bucket can only be found
+    through another band. keys: precomputed band_keys() (stored rows first).
+    """
+    if keys is None:
+        keys = band_keys(signatures, bands)
+    n = len(keys)
+
+    candidates: Dict[int, set] = {}
+    for band in range(bands):
+        col = keys[:, band]
+        order = np.argsort(col, kind="stable")  # equal keys stay in row order
+        sorted_keys = col[order]
+        lo = np.searchsorted(sorted_keys, col[start:], side="left")
+        hi = np.searchsorted(sorted_keys, col[start:], side="right")
+        for i, a, b in zip(range(start, n), lo, hi):
+            for j in order[a:min(b, a + max_bucket_compare)]:
+                if j < i:
+                    candidates.setdefault(i, set()).add(int(j))
+    return candidates
+
+
+def _cosine(u: np.ndarray, v: np.ndarray) -> float:
+    denom = (np.linalg.norm(u) * np.linalg.norm(v)) or 1.0
+    return float(u @ v / denom)
+
+
+def find_near_duplicates(
+    chunks: List[str],
+    existing: Optional[Dict] = None,
+    embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+    threshold: float = 0.8,
+    cosine_threshold: Optional[float] = 0.95,
+    num_perm: int = 128,
+    bands: int = 16,
+    shingle_size: int = 5,
+    max_bucket_compare: int = 32,
+) -> Dict:
+    """
+    Find chunks that duplicate an earlier chunk or an already stored row.
+
+    existing: state from load_dedup_state() for the target collection.
+    embed_fn: used only for the cosine check, on the new chunks that have
+    candidate pairs; those embeddings are returned so they are not computed
+    twice.
+
+    Returns {"keep": [chunk idx], "duplicates": [{chunk, canonical_chunk |
+    canonical_row, jaccard, cosine}], "signatures": new signatures,
+    "band_keys": their LSH keys, "embeddings": {chunk idx: vector}}.
+    """
+    existing = existing or empty_dedup_state()
+    n_old = len(existing["ids"])
+    new_sigs = minhash_signatures(chunks, num_perm=num_perm, shingle_size=shingle_size)
+    if n_old and existing["signatures"].shape[1] != num_perm:
+        raise ValueError("Stored dedup signatures use a different num_perm")
+    all_sigs = np.vstack([existing["signatures"], new_sigs]) if n_old else new_sigs
+
+    # stored rows keep their keys; only states saved without them are re-banded
+    new_keys = band_keys(new_sigs, bands)
+    old_keys = existing.get("band_keys")
+    if n_old and (old_keys is None or old_keys.shape != (n_old, bands)):
+        old_keys = existing["band_keys"] = band_keys(existing["signatures"], bands)
+    all_keys = np.vstack([old_keys, new_keys]) if n_old else new_keys
+
+    # candidate pairs involving at least one new chunk
+    candidates = lsh_candidates(all_sigs, bands, max_bucket_compare, keys=all_keys, start=n_old)
+
+    use_cosine = embed_fn is not None and cosine_threshold is not None
+    embeddings: Dict[int, np.ndarray] = {}
+    if use_cosine and candidates:
+        involved = sorted({i - n_old for i in candidates} |
+                          {j - n_old for c in candidates.values() for j in c if j >= n_old})
+        vectors = np.asarray(embed_fn([chunks[i] for i in involved]), dtype=np.float32)
+        embeddings = dict(zip(involved, vectors))
+
+    def vector(row: int) -> np.ndarray:
+        if row < n_old:
+            return existing["embeddings"][row]
+        return embeddings[row - n_old]
+
+    root: Dict[int, int] = {}
+    duplicates = []
+    for i in range(n_old, len(all_sigs)):
+        for j in sorted(candidates.get(i, ())):
+            jaccard = float((all_sigs[i] == all_sigs[j]).mean())
+            if jaccard < threshold:
+                continue
+            cosine = None
+            if use_cosine and (j >= n_old or len(existing["embeddings"])):
+                cosine = _cosine(vector(i), vector(j))
+                if cosine < cosine_threshold:
+                    continue
+            canonical = root.get(j, j)
+            root[i] = canonical
+            entry = {"chunk": i - n_old, "jaccard": round(jaccard, 4), "cosine": cosine}
+            if canonical < n_old:
+                entry["canonical_row"] = canonical
+            else:
+                entry["canonical_chunk"] = canonical - n_old
+            duplicates.append(entry)
+            break
+
+    return {
+        "keep": [i - n_old for i in range(n_old, len(all_sigs)) if i not in root],
+        "duplicates": duplicates,
+        "signatures": new_sigs,
+        "band_keys": new_keys,
+        "embeddings": {i: v.tolist() for i, v in embeddings.items()},
+    }
+
+
+# ---------- per-collection state ----------
+
+def empty_dedup_state() -> Dict:
+    return {
+        "signatures": np.zeros((0, 0), dtype=np.uint32),
+        "band_keys": np.zeros((0, 0), dtype=np.uint64),
+        "embeddings": np.zeros((0, 0), dtype=np.float32),
+        "ids": [],
+        "sources": [],
+    }
+
+
+def dedup_state_path(dedup_dir: str, collection_name: str) -> str:
+    return os.path.join(dedup_dir, f"{collection_name}.npz")
+
+
+def load_dedup_state(dedup_dir: str, collection_name: str) -> Dict:
+    path = dedup_state_path(dedup_dir, collection_name)
+    if not os.path.exists(path):
+        return empty_dedup_state()
+    with np.load(path) as data:
+        return {
+            "signatures": data["signatures"],
+            # states written before the keys were stored get re-banded once
+            "band_keys": data["band_keys"] if "band_keys" in data.files else None,
+            "embeddings": data["embeddings"],
+            "ids": data["ids"].tolist(),
+            "sources": data["sources"].tolist(),
+        }
+
+
+def update_dedup_state(
+    dedup_dir: str,
+    collection_name: str,
+    state: Dict,
+    signatures: np.ndarray,
+    embeddings,
+    ids: List[int],
+    sources: List[str],
+    keys: Optional[np.ndarray] = None,
+) -> Dict:
+    """Append the kept rows (with their Milvus ids and LSH keys) to the stored state."""
+    os.makedirs(dedup_dir, exist_ok=True)
+    emb = np.asarray(embeddings, dtype=np.float32)
+    old_keys = state.get("band_keys")
+    if keys is not None and len(state["ids"]):
+        # keys must cover every stored row with the same bands, else they are
+        # rebuilt on the next ingest
+        usable = old_keys is not None and old_keys.shape == (len(state["ids"]), keys.shape[1])
+        keys = np.vstack([old_keys, keys]) if usable else None
+    if len(state["ids"]):
+        signatures = np.vstack([state["signatures"], signatures])
+        if not len(ids):
+            emb = state["embeddings"]
+        elif emb.size and len(state["embeddings"]):
+            emb = np.vstack([state["embeddings"], emb])
+        else:
+            # embeddings must cover every stored row to be usable
+            emb = np.zeros((0, 0), dtype=np.float32)
+    elif not emb.size:
+        emb = np.zeros((0, 0), dtype=np.float32)
+    new_state = {
+        "signatures": signatures,
+        "band_keys": keys,
+        "embeddings": emb,
+        "ids": list(state["ids"]) + list(ids),
+        "sources": list(state["sources"]) + list(sources),
+    }
+    extra = {} if keys is None else {"band_keys": keys}
+    np.savez(
+        dedup_state_path(dedup_dir, collection_name),
+        signatures=new_state["signatures"],
+        **extra,
+        embeddings=new_state["embeddings"],
+        ids=np.asarray(new_state["ids"], dtype=np.int64),
+        sources=np.asarray(new_state["sources"], dtype=str),
+    )
+    return new_state
+
+
+def remap_dedup_ids(dedup_dir: str, collection_name: str, mapping: Dict[int, int]) -> int:
+    """Point stored rows at new primary keys (after an upsert reassigned them)."""
+    path = dedup_state_path(dedup_dir, collection_name)
+    if not mapping or not os.path.exists(path):
+        return 0
+    with np.load(path) as data:
+        state = {k: data[k] for k in data.files}
+    ids = state["ids"]
+    moved = np.isin(ids, list(mapping))
+    state["ids"] = np.asarray([mapping.get(int(i), int(i)) for i in ids], dtype=np.int64)
+    np.savez(path, **state)
+    return int(moved.sum())
+
+
+def duplicates_log_path(dedup_dir: str, collection_name: str) -> str:
+    return os.path.join(dedup_dir, f"{collection_name}.duplicates.jsonl")
+
+
+def log_duplicates(dedup_dir: str, collection_name: str, entries: List[Dict]) -> str:
+    """Append duplicate -> canonical mappings to the collection's JSONL log."""
+    os.makedirs(dedup_dir, exist_ok=True)
+    path = duplicates_log_path(dedup_dir, collection_name)
+    with open(path, "a") as f:
+        for e in entries:
+            f.write(json.dumps(e) + "\n")
+    return path
+
+
+def record_dedup_ingest(
+    dedup_dir: str,
+    collection_name: str,
+    state: Dict,
+    result: Dict,
+    kept_ids: List[int],
+    kept_sources: List[str],
+    kept_embeddings,
+    chunk_sources: List[str],
+) -> Dict:
+    """
+    After the insert: store the kept rows' signatures under their new Milvus
+    ids and log each dropped chunk against the id/source of its canonical row.
+    chunk_sources[i] is the source chunk i would have been stored under, so
+    the log uses the same labels as the rows (flat or small-to-big).
+    """
+    keep = result["keep"]
+    position = {chunk: k for k, chunk in enumerate(keep)}
+    entries = []
+    for d in result["duplicates"]:
+        if "canonical_chunk" in d:
+            k = position[d["canonical_chunk"]]
+            canonical_id, canonical_source = kept_ids[k], kept_sources[k]
+        else:
+            canonical_id = state["ids"][d["canonical_row"]]
+            canonical_source = state["sources"][d["canonical_row"]]
+        entries.append({
+            "source": chunk_sources[d["chunk"]],
+            "canonical_id": int(canonical_id),
+            "canonical_source": canonical_source,
+            "jaccard": d["jaccard"],
+            "cosine": d["cosine"],
+        })
+    if entries:
+        log_duplicates(dedup_dir, collection_name, entries)
+
+    return update_dedup_state(
+        dedup_dir,
+        collection_name,
+        state,
+        signatures=result["signatures"][keep],
+        embeddings=kept_embeddings,
+        ids=kept_ids,
+        sources=kept_sources,
+        keys=result["band_keys"][keep],
+    )
+
+
+def reset_dedup_state(dedup_dir: str, collection_name: str) -> None:
+    """Forget a collection's dedup state (call when the collection is dropped)."""
+    path = dedup_state_path(dedup_dir, collection_name)
+    if os.path.exists(path):
+        os.remove(path)
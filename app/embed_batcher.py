@@ -0,0 +1,122 @@
+# embed_batcher.py
+"""
+Shared in-process embedding micro-batcher.
+
+Sessions submit their (usually single-text) encode requests to one queue.
+Worker threads pick up a request, collect whatever else arrives within a
+short window (or until `max_batch_size` texts), run a single batched
+`model.encode` and hand each caller its rows back. The queue is bounded, so
+under overload callers get an error instead of piling up.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List
+
+import numpy as np
+
+
+class EmbeddingQueueFull(RuntimeError):
+    """Raised when the embedding queue stays full for longer than the submit timeout."""
+
+
+class EmbeddingBatcher:
+    def __init__(
+        self,
+        model,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 2.0,
+        num_workers: int = 1,
+        max_queue: int = 1024,
+        submit_timeout_s: float = 1.0,
+    ):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000.0
+        self.submit_timeout_s = submit_timeout_s
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0, "texts": 0, "batches": 0, "rejected": 0,
+            "max_queue_depth": 0, "encode_s": 0.0,
+        }
+        self._workers = [
+            threading.Thread(target=self._run, name=f"embed-batcher-{i}", daemon=True)
+            for i in range(num_workers)
+        ]
+        for w in self._workers:
+            w.start()
+
+    # ---------- client side ----------
+
+    def submit(self, texts: List[str]) -> Future:
+        future: Future = Future()
+        try:
+            self._queue.put((list(texts), future), timeout=self.submit_timeout_s)
+        except queue.Full:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise EmbeddingQueueFull(
+                f"Embedding queue full ({self._queue.maxsize} requests), try again later"
+            )
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+        return future
+
+    def encode(self, texts: List[str], convert_to_numpy: bool = True, **_) -> np.ndarray:
+        """SentenceTransformer-compatible encode() that goes through the batcher."""
+        return self.submit(texts).result()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Milvus-ready embeddings, like app.embed_fn."""
+        return self.encode(texts).tolist()
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            s = dict(self._stats)
+        return {
+            **s,
+            "queue_depth": self._queue.qsize(),
+            "avg_batch_texts": round(s["texts"] / s["batches"], 2) if s["batches"] else 0.0,
+            "encode_s": round(s["encode_s"], 3),
+        }
+
+    # ---------- worker side ----------
+
+    def _collect(self):
+        """Block for one request, then gather more until the window or batch is full."""
+        batch = [self._queue.get()]
+        n_texts = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait_s
+        while n_texts < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            n_texts += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [t for item_texts, _ in batch for t in item_texts]
+            t0 = time.perf_counter()
+            try:
+                vectors = np.asarray(self.model.encode(texts, convert_to_numpy=True))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["texts"] += len(texts)
+                self._stats["encode_s"] += time.perf_counter() - t0
+
+            start = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[start:start + len(item_texts)])
+                start += len(item_texts)
@@ -0,0 +1,66 @@
+# filters.py
+"""
+Structured search filters compiled to Milvus boolean expressions.
+
+A filter is a dict, e.g.
+    {"offering_ids": ["offering_xyz"], "source_prefixes": ["./data/offerings_public.pdf"]}
+Values of one key are OR-ed, keys are AND-ed; a missing or empty key does
+not restrict. The expression is passed to search() as `filter`, which
+Milvus applies as a pre-filter during the ANN search; with the scalar
+indexes ensure_collection creates (SCALAR_INDEXES) the matching rows come
+from the index instead of a scan of every row.
+"""
+import json
+from typing import Dict, Iterable, List, Optional, Union
+
+
+# scalar field -> index type created by ensure_collection. Milvus Lite only
+# implements INVERTED; on a Milvus server "Trie" also serves prefix matches on source.
+SCALAR_INDEXES = {"offering_id": "INVERTED", "source": "INVERTED"}
+
+# filter key -> scalar field it restricts
+FILTER_FIELDS = {"offering_ids": "offering_id", "source_prefixes": "source"}
+
+
+def _values(value: Union[None, str, Iterable[str]]) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [str(v) for v in value]
+
+
+def _quote(value: str) -> str:
+    # JSON string literals are valid Milvus string literals (quotes / backslashes escaped)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _like_prefix(prefix: str) -> str:
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return _quote(escaped + "%")
+
+
+def filter_fields(filters: Optional[Dict]) -> List[str]:
+    """Scalar fields the filter restricts."""
+    return [FILTER_FIELDS[k] for k in filters or {} if k in FILTER_FIELDS and _values(filters[k])]
+
+
+def compile_filter(filters: Optional[Dict]) -> str:
+    """Milvus expression for a structured filter ("" = no filter)."""
+    if not filters:
+        return ""
+    unknown = set(filters) - set(FILTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown filter keys {sorted(unknown)}, expected {sorted(FILTER_FIELDS)}")
+
+    clauses = []
+    offering_ids = _values(filters.get("offering_ids"))
+    if len(offering_ids) == 1:
+        clauses.append(f"offering_id == {_quote(offering_ids[0])}")
+    elif offering_ids:
+        clauses.append(f"offering_id in [{', '.join(_quote(v) for v in offering_ids)}]")
+
+    prefixes = _values(filters.get("source_prefixes"))
+    if prefixes:
+        clauses.append("(" + " or ".join(f"source like {_like_prefix(p)}" for p in prefixes) + ")")
+    return " and ".join(clauses)
@@ -0,0 +1,195 @@
+# integrity.py
+"""
+Full-collection integrity scan.
+
+Walks the whole collection with a query iterator in large batches and
+keeps only running counters (plus 8 bytes per row for text hashes), so it
+works on millions of rows without loading the collection into memory.
+"""
+import hashlib
+import time
+from collections import Counter
+from typing import Dict, List
+
+import numpy as np
+from pymilvus import MilvusClient
+
+from quantization import decode_vectors
+from reindex import resolve_collection
+
+
+SCAN_FIELDS = ["id", "offering_id", "text", "source", "embedding"]
+MAX_EXAMPLES = 5
+
+
+def _text_hash(text: str) -> int:
+    digest = hashlib.blake2b((text or "").encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _source_document(source: str) -> str:
+    # build_insert_payload stores "<pdf_path>#chunk=<i>"
+    return (source or "").split("#chunk=")[0]
+
+
+def _vector_width(raw, vector_storage: str, dim: int) -> int:
+    if isinstance(raw, list) and len(raw) == 1 and isinstance(raw[0], bytes):
+        raw = raw[0]
+    if isinstance(raw, bytes):
+        if vector_storage == "binary":
+            return len(raw) * 8
+        return len(raw) // (2 if vector_storage in ("float16", "bfloat16") else 4)
+    return len(raw)
+
+
+def _note(examples: Dict[str, List], issue: str, ids) -> None:
+    bucket = examples.setdefault(issue, [])
+    for i in ids:
+        if len(bucket) >= MAX_EXAMPLES:
+            break
+        bucket.append(i)
+
+
+def scan_collection(
+    client: MilvusClient,
+    collection_name: str,
+    dim: int,
+    vector_storage: str = "float32",
+    batch_size: int = 5000,
+    text_limit: int = 2048,
+    norm_tolerance: float = 1e-2,
+    check_norm: bool = True,
+    text_store=None,
+) -> Dict:
+    """
+    Scan every row of a collection and return a compact report:
+    row counts per offering_id and source document, duplicate texts,
+    zero / NaN / unnormalized vectors, wrong dimensions and texts that hit
+    the VARCHAR truncation limit. A few example ids are kept per issue.
+
+    Set check_norm=False for collections whose vectors are not expected to
+    be unit length (e.g. PCA-projected ones). With text_store, texts are
+    read from it (rows without one are reported as missing_text) and there
+    is no truncation limit to check.
+    """
+    t0 = time.time()
+    per_offering: Counter = Counter()
+    per_source: Counter = Counter()
+    hash_chunks = []
+    counts = Counter()
+    examples: Dict[str, List] = {}
+
+    iterator = client.query_iterator(
+        collection_name=collection_name,
+        batch_size=batch_size,
+        filter="",
+        output_fields=[f for f in SCAN_FIELDS if text_store is None or f != "text"],
+    )
+    physical_name = resolve_collection(client, collection_name)
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            counts["rows"] += len(batch)
+            print(f"[Scan] {counts['rows']} rows scanned in '{collection_name}'", end="\r")
+
+            ids = np.array([r["id"] for r in batch])
+            if text_store is not None:
+                stored = text_store.get_many(physical_name, ids.tolist())
+                missing = np.array([int(i) not in stored for i in ids], dtype=bool)
+                counts["missing_text"] += int(missing.sum())
+                _note(examples, "missing_text", ids[missing].tolist())
+                texts = [stored.get(int(i), "") for i in ids]
+            else:
+                texts = [r.get("text") or "" for r in batch]
+            per_offering.update(r.get("offering_id") for r in batch)
+            per_source.update(_source_document(r.get("source")) for r in batch)
+            hash_chunks.append(np.fromiter((_text_hash(t) for t in texts), dtype=np.uint64, count=len(texts)))
+
+            truncated = np.fromiter(
+                (text_store is None and len(t) >= text_limit for t in texts), dtype=bool, count=len(texts)
+            )
+            counts["text_at_limit"] += int(truncated.sum())
+            _note(examples, "text_at_limit", ids[truncated].tolist())
+
+            raw = [r.get("embedding") for r in batch]
+            widths = np.fromiter((_vector_width(v, vector_storage, dim) for v in raw), dtype=np.int64, count=len(raw))
+            wrong_dim = widths != dim
+            counts["wrong_dim"] += int(wrong_dim.sum())
+            _note(examples, "wrong_dim", ids[wrong_dim].tolist())
+
+            ok = ~wrong_dim
+            if not ok.any():
+                continue
+            vectors = decode_vectors([v for v, good in zip(raw, ok) if good], vector_storage, dim)
+            ok_ids = ids[ok]
+
+            nan = np.isnan(vectors).any(axis=1)
+            counts["nan"] += int(nan.sum())
+            _note(examples, "nan", ok_ids[nan].tolist())
+
+            if vector_storage == "binary":
+                # decoded to +/-1, so an all-zero bit vector is all -1
+                zero = (vectors < 0).all(axis=1)
+                counts["zero"] += int(zero.sum())
+                _note(examples, "zero", ok_ids[zero].tolist())
+                continue
+
+            norms = np.linalg.norm(np.nan_to_num(vectors), axis=1)
+            zero = ~nan & (norms == 0)
+            counts["zero"] += int(zero.sum())
+            _note(examples, "zero", ok_ids[zero].tolist())
+
+            if not check_norm:
+                continue
+            unnormalized = ~nan & ~zero & (np.abs(norms - 1.0) > norm_tolerance)
+            counts["unnormalized"] += int(unnormalized.sum())
+            _note(examples, "unnormalized", ok_ids[unnormalized].tolist())
+
+    finally:
+        iterator.close()
+
+    hashes = np.concatenate(hash_chunks) if hash_chunks else np.zeros(0, dtype=np.uint64)
+    _, hash_counts = np.unique(hashes, return_counts=True)
+    repeated = hash_counts[hash_counts > 1]
+
+    report = {
+        "collection_name": collection_name,
+        "rows": counts["rows"],
+        "per_offering_id": dict(per_offering.most_common()),
+        "per_source": dict(per_source.most_common()),
+        "duplicate_texts": {
+            "distinct_texts_repeated": int(len(repeated)),
+            "redundant_rows": int((repeated - 1).sum()),
+        },
+        "vectors": {
+            "wrong_dim": counts["wrong_dim"],
+            "nan": counts["nan"],
+            "zero": counts["zero"],
+            "unnormalized": counts["unnormalized"],
+        },
+        "text_at_limit": counts["text_at_limit"],
+        "missing_text": counts["missing_text"],
+        "examples": examples,
+        "seconds": round(time.time() - t0, 2),
+    }
+    print(f"\n[Scan] Finished '{collection_name}': {counts['rows']} rows in {report['seconds']} s")
+    return report
+
+
+def format_scan_report(report: Dict) -> str:
+    v = report["vectors"]
+    d = report["duplicate_texts"]
+    lines = [
+        f"Collection: {report['collection_name']} ({report['rows']} rows, {report['seconds']} s)",
+        f"  offering_id: {report['per_offering_id']}",
+        f"  source:      {report['per_source']}",
+        f"  duplicates:  {d['redundant_rows']} redundant rows over {d['distinct_texts_repeated']} texts",
+        f"  vectors:     wrong_dim={v['wrong_dim']} nan={v['nan']} zero={v['zero']} unnormalized={v['unnormalized']}",
+        f"  text at limit: {report['text_at_limit']}  missing text: {report.get('missing_text', 0)}",
+    ]
+    for issue, ids in report["examples"].items():
+        if ids:
+            lines.append(f"  e.g. {issue}: {ids}")
+    return "\n".join(lines)
@@ -0,0 +1,181 @@
+# load_scheduler.py
+"""
+Usage-driven load / release of collections.
+
+Searches go through LoadScheduler.ensure_loaded(), which records the
+query and loads the collection on demand. Concurrent requests for a cold
+collection queue behind a single load instead of each starting one. A
+background sweep releases collections idle for longer than idle_ttl_s and,
+when more than max_loaded are loaded, the ones with the lowest recent query
+rate, so query-node memory is bounded by the hot set rather than by the
+number of role / tenant collections. Pinned collections are never released.
+
+A search racing a release gets "collection not loaded" and is retried by
+semantic_search after loading again.
+"""
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional
+
+from pymilvus import MilvusClient
+
+from metadata import collection_meta, ensure_loaded, invalidate_metadata
+
+
+class LoadScheduler:
+    def __init__(
+        self,
+        idle_ttl_s: float = 900.0,
+        max_loaded: Optional[int] = None,
+        check_interval_s: float = 60.0,
+        rate_window_s: float = 300.0,
+        pinned: Iterable[str] = (),
+    ):
+        self.idle_ttl_s = idle_ttl_s
+        self.max_loaded = max_loaded
+        self.check_interval_s = check_interval_s
+        self.rate_window_s = rate_window_s
+        self.pinned = set(pinned)
+
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._clients: Dict[str, MilvusClient] = {}
+        self._queries: Dict[str, Deque[float]] = {}
+        self._last_used: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"loads": 0, "releases": 0, "queued": 0, "load_s": 0.0}
+
+    # ---------- usage ----------
+
+    def track(self, client: MilvusClient, collection_name: str, count: bool = False) -> None:
+        """Manage a collection (its idle time starts now); count=True records a query."""
+        now = time.time()
+        with self._lock:
+            self._clients[collection_name] = client
+            self._last_used[collection_name] = now
+            queries = self._queries.setdefault(collection_name, deque())
+            if count:
+                queries.append(now)
+            while queries and queries[0] < now - self.rate_window_s:
+                queries.popleft()
+
+    def ensure_loaded(self, client: MilvusClient, collection_name: str, count: bool = True) -> Dict:
+        """Record a query and make sure the collection is loaded; returns its metadata."""
+        self.track(client, collection_name, count=count)
+        meta = collection_meta(client, collection_name)
+        if meta["loaded"]:
+            return meta
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(collection_name, threading.Lock())
+        if load_lock.locked():
+            self.stats["queued"] += 1
+        with load_lock:
+            # re-check on the server: the caller queued ahead of us may have loaded it
+            invalidate_metadata(collection_name)
+            meta = collection_meta(client, collection_name)
+            if meta["loaded"]:
+                return meta
+            t0 = time.perf_counter()
+            meta = ensure_loaded(client, collection_name)
+            elapsed = time.perf_counter() - t0
+            self.stats["loads"] += 1
+            self.stats["load_s"] += elapsed
+            print(f"[LoadScheduler] Loaded '{collection_name}' in {elapsed:.2f} s")
+        return meta
+
+    def prefetch(self, client: MilvusClient, collection_name: str) -> None:
+        """Start loading a collection in the background (e.g. when a role is selected)."""
+        threading.Thread(
+            target=self.ensure_loaded, args=(client, collection_name), kwargs={"count": False}, daemon=True
+        ).start()
+
+    def query_rate(self, collection_name: str) -> float:
+        """Queries per minute over the rate window."""
+        now = time.time()
+        with self._lock:
+            queries = list(self._queries.get(collection_name, ()))
+        recent = sum(1 for t in queries if t >= now - self.rate_window_s)
+        return recent * 60.0 / self.rate_window_s
+
+    # ---------- release ----------
+
+    def _release(self, collection_name: str, reason: str) -> None:
+        client = self._clients[collection_name]
+        with self._load_locks.setdefault(collection_name, threading.Lock()):
+            client.release_collection(collection_name)
+            invalidate_metadata(collection_name)
+        self.stats["releases"] += 1
+        print(f"[LoadScheduler] Released '{collection_name}' ({reason})")
+
+    def _is_loaded(self, collection_name: str) -> bool:
+        try:
+            return collection_meta(self._clients[collection_name], collection_name)["loaded"]
+        except Exception:
+            return False  # dropped
+
+    def sweep(self) -> List[str]:
+        """Release idle collections, then the coldest ones above max_loaded."""
+        now = time.time()
+        with self._lock:
+            names = list(self._last_used)
+        loaded = [n for n in names if self._is_loaded(n)]
+        released = []
+
+        for name in loaded:
+            idle = now - self._last_used[name]
+            if name not in self.pinned and idle > self.idle_ttl_s:
+                self._release(name, f"idle {idle:.0f} s")
+                released.append(name)
+
+        remaining = [n for n in loaded if n not in released]
+        if self.max_loaded is not None and len(remaining) > self.max_loaded:
+            candidates = sorted(
+                (n for n in remaining if n not in self.pinned),
+                key=lambda n: (self.query_rate(n), self._last_used[n]),
+            )
+            for name in candidates[:len(remaining) - self.max_loaded]:
+                self._release(name, f"over max_loaded={self.max_loaded}")
+                released.append(name)
+        return released
+
+    def forget(self, collection_name: str) -> None:
+        """Stop managing a collection (e.g. after dropping it)."""
+        with self._lock:
+            for d in (self._clients, self._queries, self._last_used, self._load_locks):
+                d.pop(collection_name, None)
+
+    # ---------- background loop ----------
+
+    def start(self) -> "LoadScheduler":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="load-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.check_interval_s):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"[LoadScheduler] Sweep failed: {type(e).__name__}: {e}")
+
+    def metrics(self) -> Dict:
+        now = time.time()
+        return {
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in self.stats.items()},
+            "collections": {
+                name: {
+                    "loaded": self._is_loaded(name),
+                    "queries_per_min": round(self.query_rate(name), 2),
+                    "idle_s": round(now - self._last_used[name], 1),
+                    "pinned": name in self.pinned,
+                }
+                for name in list(self._last_used)
+            },
+        }
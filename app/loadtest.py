@@ -0,0 +1,367 @@
+# loadtest.py
+"""
+Concurrent multi-tenant load generator for answer_question.
+
+Replays a question corpus from simulated employees and managers against a
+local Milvus Lite database and a stub LLM, and reports throughput, latency
+percentiles per stage (embed / search / llm), error rates and the
+saturation point. Results are written as JSON so runs can be compared.
+
+Closed loop: N users, each asks, waits for the answer, thinks, asks again.
+Open loop: questions arrive as a Poisson process at a fixed rate, whether
+or not earlier ones have finished (latency includes queueing).
+
+Needs milvus-lite for the local database (pip install "pymilvus[milvus_lite]").
+
+Examples (from the repo root):
+    python app/loadtest.py --mode closed --users 10,30,60 --duration 30
+    python app/loadtest.py --mode open --rates 5,10,20,40 --out after.json --compare before.json
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+from pymilvus import MilvusClient
+
+from config import COLLECTION_MAP, EMBED_BATCHING
+from embed_batcher import EmbeddingBatcher
+from rag_backend import answer_question, ensure_collection, ingest_pdf_to_collection
+
+
+STAGES = ["embed", "search", "llm", "total"]
+
+DEFAULT_QUESTIONS = [
+    "TravelFlex",
+    "What does TravelFlex cover for flight delays?",
+    "How fast are claims paid out?",
+    "What is the margin target for HomeGuard?",
+    "Which products use NovaChain?",
+    "What are the main risks of AutoSafe?",
+    "How are premiums automated with tokens?",
+    "What is the pricing guideline for HealthShield?",
+]
+
+
+# ---------- stand-ins ----------
+
+class StubEmbedder:
+    """Deterministic hash-based embedder with a SentenceTransformer-like encode()."""
+
+    def __init__(self, dim: int = 384, latency_s: float = 0.0):
+        self.dim = dim
+        self.latency_s = latency_s
+
+    def encode(self, texts, convert_to_numpy=True, show_progress_bar=False):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            seed = int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little")
+            v = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            out[i] = v / np.linalg.norm(v)
+        return out
+
+
+def make_stub_llm(latency_s: float, jitter_s: float):
+    def stub_llm(prompt: str) -> str:
+        time.sleep(max(0.0, random.gauss(latency_s, jitter_s)))
+        return f"stub answer ({len(prompt)} prompt chars)"
+    return stub_llm
+
+
+class _TimedClient:
+    """Wraps a MilvusClient and records the time spent in search()."""
+
+    def __init__(self, client: MilvusClient, timings: Dict[str, float]):
+        self._client = client
+        self._timings = timings
+
+    def search(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return self._client.search(*args, **kwargs)
+        finally:
+            self._timings["search"] = self._timings.get("search", 0.0) + time.perf_counter() - t0
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+# ---------- one request ----------
+
+def run_request(client, model, llm_fn, question: str, role: str, top_k: int) -> Dict[str, float]:
+    """Run answer_question once and return per-stage timings in seconds."""
+    timings: Dict[str, float] = {}
+
+    def embed_fn(texts):
+        t0 = time.perf_counter()
+        try:
+            return model.encode(texts, convert_to_numpy=True).tolist()
+        finally:
+            timings["embed"] = timings.get("embed", 0.0) + time.perf_counter() - t0
+
+    def timed_llm(prompt):
+        t0 = time.perf_counter()
+        try:
+            return llm_fn(prompt)
+        finally:
+            timings["llm"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    answer_question(
+        client=_TimedClient(client, timings),
+        question=question,
+        role=role,
+        embed_fn=embed_fn,
+        collection_map=COLLECTION_MAP,
+        top_k=top_k,
+        llm_fn=timed_llm,
+    )
+    timings["total"] = time.perf_counter() - t0
+    return timings
+
+
+# ---------- load shapes ----------
+
+class _Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples: List[Dict[str, float]] = []
+        self.errors: Dict[str, int] = {}
+
+    def ok(self, timings: Dict[str, float]):
+        with self.lock:
+            self.samples.append(timings)
+
+    def error(self, e: Exception):
+        with self.lock:
+            key = type(e).__name__
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+
+def _pick_role(rng: random.Random, manager_share: float) -> str:
+    return "Manager" if rng.random() < manager_share else "Employee"
+
+
+def run_closed_loop(ctx: Dict, users: int, duration_s: float, think_s: float) -> Dict:
+    rec = _Recorder()
+    deadline = time.perf_counter() + duration_s
+    n_managers = round(users * ctx["manager_share"])
+
+    def user_loop(uid: int):
+        rng = random.Random(ctx["seed"] + uid)
+        role = "Manager" if uid < n_managers else "Employee"
+        while time.perf_counter() < deadline:
+            try:
+                rec.ok(run_request(ctx["client"], ctx["model"], ctx["llm_fn"],
+                                   rng.choice(ctx["questions"]), role, ctx["top_k"]))
+            except Exception as e:
+                rec.error(e)
+            if think_s:
+                time.sleep(rng.expovariate(1.0 / think_s))
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=user_loop, args=(u,), daemon=True) for u in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(rec, time.perf_counter() - t0, {"mode": "closed", "users": users})
+
+
+def run_open_loop(ctx: Dict, rate: float, duration_s: float, max_workers: int) -> Dict:
+    rec = _Recorder()
+    rng = random.Random(ctx["seed"])
+
+    def job(question: str, role: str, scheduled: float):
+        try:
+            timings = run_request(ctx["client"], ctx["model"], ctx["llm_fn"], question, role, ctx["top_k"])
+            timings["queue"] = time.perf_counter() - scheduled - timings["total"]
+            timings["total"] = time.perf_counter() - scheduled
+            rec.ok(timings)
+        except Exception as e:
+            rec.error(e)
+
+    t0 = time.perf_counter()
+    next_at = t0
+    offered = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while next_at < t0 + duration_s:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(job, rng.choice(ctx["questions"]), _pick_role(rng, ctx["manager_share"]), next_at)
+            offered += 1
+            next_at += rng.expovariate(rate)
+    return summarize(rec, time.perf_counter() - t0, {"mode": "open", "rate": rate, "offered": offered})
+
+
+# ---------- reporting ----------
+
+def summarize(rec: _Recorder, elapsed_s: float, step: Dict) -> Dict:
+    n_err = sum(rec.errors.values())
+    total = len(rec.samples) + n_err
+    latency = {}
+    for stage in STAGES + ["queue"]:
+        values = np.array([s[stage] for s in rec.samples if stage in s]) * 1000.0
+        if len(values):
+            latency[stage] = {
+                "p50_ms": round(float(np.percentile(values, 50)), 2),
+                "p95_ms": round(float(np.percentile(values, 95)), 2),
+                "p99_ms": round(float(np.percentile(values, 99)), 2),
+            }
+    return {
+        **step,
+        "requests": total,
+        "throughput_rps": round(len(rec.samples) / elapsed_s, 2) if elapsed_s else 0.0,
+        "error_rate": round(n_err / total, 4) if total else 0.0,
+        "errors": rec.errors,
+        "latency": latency,
+    }
+
+
+def find_saturation(steps: List[Dict], gain: float = 0.1, p95_factor: float = 3.0) -> Optional[Dict]:
+    """
+    First step where adding load stops paying off: throughput grows by less
+    than `gain`, p95 exceeds `p95_factor` x the first step's p95, or (open
+    loop) achieved throughput falls below 90% of the offered rate.
+    """
+    if not steps:
+        return None
+    base_p95 = steps[0]["latency"].get("total", {}).get("p95_ms")
+    for prev, cur in zip([None] + steps[:-1], steps):
+        p95 = cur["latency"].get("total", {}).get("p95_ms")
+        if cur["mode"] == "open" and cur["throughput_rps"] < 0.9 * cur["rate"]:
+            return cur
+        if base_p95 and p95 and p95 > p95_factor * base_p95:
+            return cur
+        if prev and cur["throughput_rps"] < prev["throughput_rps"] * (1 + gain):
+            return cur
+    return None
+
+
+def print_report(result: Dict, baseline: Optional[Dict] = None) -> None:
+    base_steps = {(s["mode"], s.get("users"), s.get("rate")): s for s in (baseline or {}).get("steps", [])}
+    for step in result["steps"]:
+        load = f"users={step['users']}" if step["mode"] == "closed" else f"rate={step['rate']}/s"
+        print(f"\n[{step['mode']}] {load}: {step['throughput_rps']} req/s, "
+              f"errors {step['error_rate']:.2%} ({step['requests']} requests)")
+        before = base_steps.get((step["mode"], step.get("users"), step.get("rate")))
+        for stage, lat in step["latency"].items():
+            line = f"    {stage:<7} p50={lat['p50_ms']:>8} p95={lat['p95_ms']:>8} p99={lat['p99_ms']:>8} ms"
+            if before and stage in before["latency"]:
+                delta = lat["p95_ms"] - before["latency"][stage]["p95_ms"]
+                line += f"   (p95 {delta:+.2f} ms vs baseline)"
+            print(line)
+        if before:
+            print(f"    throughput {step['throughput_rps'] - before['throughput_rps']:+.2f} req/s vs baseline")
+    sat = result.get("saturation")
+    if sat:
+        where = f"users={sat['users']}" if sat["mode"] == "closed" else f"rate={sat['rate']}/s"
+        print(f"\nSaturation point: {where}")
+    else:
+        print("\nSaturation point: not reached")
+
+
+# ---------- setup ----------
+
+def prepare_local_milvus(db_path: str, model, dim: int, public_pdf: str, managers_pdf: str) -> MilvusClient:
+    """Open a Milvus Lite database and ingest the demo PDFs if the collections are new."""
+    client = MilvusClient(db_path)
+    for role, pdf_path in (("Employee", public_pdf), ("Manager", managers_pdf)):
+        name = COLLECTION_MAP[role]
+        is_new = not client.has_collection(name)
+        ensure_collection(client, name, dim)
+        if is_new:
+            ingest_pdf_to_collection(client, name, pdf_path, offering_id="offering_xyz", model=model)
+        client.load_collection(name)
+    return client
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--mode", choices=["closed", "open"], default="closed")
+    p.add_argument("--users", default="10,30,60", help="closed loop: comma-separated user counts to sweep")
+    p.add_argument("--rates", default="5,10,20,40", help="open loop: comma-separated arrival rates (req/s)")
+    p.add_argument("--manager-share", type=float, default=10 / 60, help="fraction of managers in the role mix")
+    p.add_argument("--think", type=float, default=1.0, help="closed loop: mean think time (s)")
+    p.add_argument("--duration", type=float, default=30.0, help="seconds per step")
+    p.add_argument("--max-workers", type=int, default=64, help="open loop: worker threads")
+    p.add_argument("--top-k", type=int, default=5)
+    p.add_argument("--questions", help="file with one question per line")
+    p.add_argument("--embedder", choices=["model", "stub"], default="model")
+    p.add_argument("--embed-batching", action="store_true",
+                   help="route query embeddings through the shared micro-batcher (config.EMBED_BATCHING)")
+    p.add_argument("--llm-latency", type=float, default=0.8, help="stub LLM mean latency (s)")
+    p.add_argument("--llm-jitter", type=float, default=0.2)
+    p.add_argument("--db", default="./loadtest_milvus.db", help="Milvus Lite database file")
+    p.add_argument("--public-pdf", default="./data/offerings_public.pdf")
+    p.add_argument("--managers-pdf", default="./data/offerings_managers_only.pdf")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", help="write results JSON here")
+    p.add_argument("--compare", help="baseline results JSON to diff against")
+    args = p.parse_args(argv)
+
+    if args.embedder == "model":
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+    else:
+        model = StubEmbedder()
+    dim = model.encode(["ping"], convert_to_numpy=True).shape[1]
+
+    questions = DEFAULT_QUESTIONS
+    if args.questions:
+        with open(args.questions) as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    client = prepare_local_milvus(args.db, model, dim, args.public_pdf, args.managers_pdf)
+    batcher = None
+    if args.embed_batching:
+        batcher = EmbeddingBatcher(model, **{k: v for k, v in EMBED_BATCHING.items() if k != "enabled"})
+
+    ctx = {
+        "client": client,
+        "model": batcher or model,
+        "llm_fn": make_stub_llm(args.llm_latency, args.llm_jitter),
+        "questions": questions,
+        "manager_share": args.manager_share,
+        "top_k": args.top_k,
+        "seed": args.seed,
+    }
+
+    steps = []
+    if args.mode == "closed":
+        for users in [int(u) for u in args.users.split(",")]:
+            steps.append(run_closed_loop(ctx, users, args.duration, args.think))
+    else:
+        for rate in [float(r) for r in args.rates.split(",")]:
+            steps.append(run_open_loop(ctx, rate, args.duration, args.max_workers))
+
+    result = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "steps": steps,
+        "saturation": find_saturation(steps),
+    }
+    if batcher is not None:
+        result["embed_batcher"] = batcher.metrics()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
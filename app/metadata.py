@@ -0,0 +1,145 @@
+# metadata.py
+"""
+Cached collection metadata (schema, vector and scalar indexes, load state).
+
+describe_collection / describe_index / get_load_state are fetched once per
+collection and kept until a DDL operation in this process invalidates them
+(create / drop / alias switch / load / release call invalidate_metadata).
+Searches take the vector field, metric, storage type and output fields
+from here instead of asking the server or assuming COSINE.
+"""
+import threading
+import time
+from typing import Dict, List, Optional
+
+from pymilvus import MilvusClient
+
+from quantization import VECTOR_STORAGE_TYPES
+
+
+_STORAGE_BY_TYPE = {dtype: storage for storage, dtype in VECTOR_STORAGE_TYPES.items()}
+_INDEX_INFO_KEYS = {
+    "index_type", "metric_type", "field_name", "index_name", "total_rows",
+    "indexed_rows", "pending_index_rows", "state", "index_state_fail_reason", "params",
+}
+
+# Milvus error code for searching a released collection
+COLLECTION_NOT_LOADED = 101
+
+_CACHE: Dict[tuple, Dict] = {}
+_LOCK = threading.Lock()
+stats = {"hits": 0, "fetches": 0, "invalidations": 0}
+
+
+def index_build_params(info: Dict) -> Dict:
+    """Build params (e.g. nlist, M) of a describe_index result, as strings."""
+    params = {k: str(v) for k, v in info.items() if k not in _INDEX_INFO_KEYS}
+    params.update({k: str(v) for k, v in (info.get("params") or {}).items()})
+    return params
+
+
+def _key(client: MilvusClient, collection_name: str) -> tuple:
+    # server URI + database: every client of the same database shares the
+    # entries (the connection alias, _using, is per client in pymilvus 3)
+    config = getattr(client, "_config", None)
+    if config is None:  # older pymilvus: alias per connection
+        return (getattr(client, "_using", ""), "", collection_name)
+    return (config.uri, config.db_name or "default", collection_name)
+
+
+def _fetch(client: MilvusClient, collection_name: str) -> Dict:
+    desc = client.describe_collection(collection_name)
+    fields = {f["name"]: f for f in desc["fields"]}
+    vector_field = next(
+        (name for name, f in fields.items() if f["type"] in _STORAGE_BY_TYPE), None
+    )
+
+    index, scalar_indexes = {}, {}
+    for index_name in client.list_indexes(collection_name):
+        info = client.describe_index(collection_name, index_name=index_name)
+        field = info.get("field_name", vector_field)
+        if field == vector_field:
+            index = index or info
+        elif field in fields:
+            scalar_indexes[field] = info.get("index_type")
+
+    state = client.get_load_state(collection_name).get("state")
+    return {
+        "collection_name": collection_name,
+        "physical_name": desc.get("collection_name") or collection_name,
+        "fields": list(fields),
+        "scalar_fields": [
+            name for name, f in fields.items() if name != vector_field and not f.get("is_primary")
+        ],
+        "vector_field": vector_field,
+        "vector_storage": _STORAGE_BY_TYPE.get(fields[vector_field]["type"]) if vector_field else None,
+        "dim": int(fields[vector_field]["params"]["dim"]) if vector_field else None,
+        "index_type": index.get("index_type"),
+        "metric_type": index.get("metric_type"),
+        "index_params": index_build_params(index),
+        "scalar_indexes": scalar_indexes,
+        "loaded": getattr(state, "name", str(state)) == "Loaded",
+        "fetched_at": time.time(),
+    }
+
+
+def collection_meta(client: MilvusClient, collection_name: str) -> Dict:
+    """Metadata of an existing collection (or alias); cached until invalidated."""
+    key = _key(client, collection_name)
+    meta = _CACHE.get(key)
+    if meta is not None:
+        stats["hits"] += 1
+        return meta
+    meta = _fetch(client, collection_name)
+    with _LOCK:
+        _CACHE[key] = meta
+        stats["fetches"] += 1
+    return meta
+
+
+def collection_exists(client: MilvusClient, collection_name: str) -> bool:
+    if _key(client, collection_name) in _CACHE:
+        stats["hits"] += 1
+        return True
+    return client.has_collection(collection_name)
+
+
+def ensure_loaded(client: MilvusClient, collection_name: str) -> Dict:
+    """Load the collection once if the cached state says it is not loaded."""
+    meta = collection_meta(client, collection_name)
+    if not meta["loaded"]:
+        client.load_collection(collection_name)
+        meta["loaded"] = True
+    return meta
+
+
+def invalidate_metadata(collection_name: Optional[str] = None) -> None:
+    """Forget one collection (and anything cached under an alias of it), or everything."""
+    with _LOCK:
+        if collection_name is None:
+            _CACHE.clear()
+        else:
+            for key in [k for k, m in _CACHE.items()
+                        if collection_name in (k[-1], m["physical_name"])]:
+                del _CACHE[key]
+        stats["invalidations"] += 1
+
+
+def default_search_params(index_type: Optional[str], limit: int) -> Dict:
+    """Search params for an untuned index."""
+    if index_type == "HNSW":
+        return {"ef": max(64, limit)}
+    if index_type == "DISKANN":
+        return {"search_list": max(64, limit)}
+    if index_type and "IVF" in index_type:
+        return {"nprobe": 10}
+    return {}
+
+
+def output_fields_for(meta: Dict, wanted: List[str]) -> List[str]:
+    """The wanted fields that exist in the collection."""
+    return [f for f in wanted if f in meta["fields"]]
+
+
+def metrics() -> Dict:
+    return {**stats, "collections": sorted({k[-1] for k in _CACHE})}
@@ -2,6 +2,7 @@ import os
 from pymilvus import MilvusClient
 from typing import List
 from typing import Optional
+from metadata import invalidate_metadata
 from ibm_cloud_sdk_core.authenticators import IAMAuthenticator
 #from ibm_watsonxdata.watsonx_data_v2 import ibm_watsonxdata
 #from ibm_watsonxdata.watsonx_data_v2 import WatsonxDataV2
@@ -24,6 +25,7 @@ def drop_milvus_collections(
         try:
             if client.has_collection(name):
                 client.drop_collection(name)
+                invalidate_metadata(name)
                 print(f"[Milvus] Dropped collection '{name}'")
             else:
                 print(f"[Milvus] Collection '{name}' does not exist")
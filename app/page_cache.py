@@ -0,0 +1,230 @@
+# page_cache.py
+"""
+Persistent cache of text extracted from PDF pages.
+
+pypdf text extraction is the slow part of ingestion, and it gives the same
+text every time for an unchanged file. PageTextCache keeps it in a local
+SQLite file:
+
+  documents  (file sha256, extractor version)             -> page count
+  pages      (file sha256, page index, extractor version) -> fingerprint,
+                                                             compressed text
+
+An unchanged file is served by its content hash, without opening it with
+pypdf. A changed file is opened and each page is fingerprinted: a hash of
+its content stream and of its fully resolved resources (fonts with their
+encodings, ToUnicode maps and embedded programs, XObjects, ...). A page
+whose fingerprint was already extracted (in an earlier version of the
+file, or any other file) reuses that text; only the others are extracted.
+Since the fingerprint covers everything extract_text reads, identical
+fingerprints decode to identical text. Bump EXTRACTOR_VERSION when the
+extraction itself changes.
+
+    cache = PageTextCache("./page_cache/pages.sqlite")
+    text, offsets = cache.load_text("data/offerings_public.pdf")
+    chunks = chunk_text(text, max_tokens=128, overlap=10)  # no re-parsing
+"""
+import bisect
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import pypdf
+from pypdf import PdfReader
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
+
+from text_store import _LOOKUP_CHUNK, compress_text, decompress_text, codec_name
+
+
+EXTRACTOR_VERSION = f"pypdf-{pypdf.__version__}/1"
+
+_CACHES: Dict[str, "PageTextCache"] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _feed(h, obj, seen: Dict) -> None:
+    # hash a PDF object tree, resolving references (each object once); a
+    # repeated object is hashed as its visit order, not its object number,
+    # so renumbering objects (e.g. when a file is rewritten) changes nothing
+    if isinstance(obj, IndirectObject):
+        ref = (obj.idnum, obj.generation)
+        if ref in seen:
+            h.update(f"R{seen[ref]}".encode())
+            return
+        seen[ref] = len(seen)
+        obj = obj.get_object()
+    if isinstance(obj, DictionaryObject):
+        h.update(b"<<")
+        for key in sorted(obj):
+            if key == "/Parent":
+                continue
+            h.update(str(key).encode())
+            _feed(h, obj.raw_get(key), seen)
+        h.update(b">>")
+        if isinstance(obj, StreamObject):
+            h.update(obj.get_data())
+    elif isinstance(obj, ArrayObject):
+        h.update(b"[")
+        for item in obj:
+            _feed(h, item, seen)
+        h.update(b"]")
+    else:
+        h.update(repr(obj).encode())
+
+
+def page_fingerprint(page) -> str:
+    """Hash of everything the page's text is extracted from: content stream and resources."""
+    h = hashlib.sha256()
+    contents = page.get_contents()
+    h.update(contents.get_data() if contents is not None else b"")
+    _feed(h, page.raw_get("/Resources") if "/Resources" in page else None, {})
+    h.update(repr(page.get("/Rotate", 0)).encode())
+    return h.hexdigest()
+
+
+def page_of(offsets: List[int], char_pos: int) -> int:
+    """Page index of a character position in the joined text."""
+    return bisect.bisect_right(offsets, char_pos) - 1
+
+
+class PageTextCache:
+    def __init__(self, path: str, level: int = 3):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.level = level
+        self.counters = {"file_hits": 0, "page_hits": 0, "pages_extracted": 0, "extract_s": 0.0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(pages)")]
+        if columns and "fingerprint" not in columns:
+            # cache from an older layout: start over
+            self._conn.execute("DROP TABLE pages")
+            self._conn.execute("DROP TABLE IF EXISTS documents")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " file_hash TEXT NOT NULL,"
+            " page_index INTEGER NOT NULL,"
+            " extractor TEXT NOT NULL,"
+            " fingerprint TEXT NOT NULL,"
+            " body BLOB NOT NULL,"
+            " PRIMARY KEY (file_hash, page_index, extractor))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_fingerprint ON pages (fingerprint, extractor)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " file_hash TEXT NOT NULL,"
+            " extractor TEXT NOT NULL,"
+            " n_pages INTEGER NOT NULL,"
+            " path TEXT,"
+            " cached_at REAL,"
+            " PRIMARY KEY (file_hash, extractor))"
+        )
+        self._conn.commit()
+
+    def _cached_file(self, digest: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT n_pages FROM documents WHERE file_hash = ? AND extractor = ?",
+                (digest, EXTRACTOR_VERSION),
+            ).fetchone()
+            if row is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT page_index, body FROM pages WHERE file_hash = ? AND extractor = ? ORDER BY page_index",
+                (digest, EXTRACTOR_VERSION),
+            ).fetchall()
+        if len(rows) != row[0]:
+            return None
+        return [decompress_text(body) for _, body in rows]
+
+    def _by_fingerprint(self, fingerprints: List[str]) -> Dict[str, str]:
+        rows = []
+        with self._lock:
+            for start in range(0, len(fingerprints), _LOOKUP_CHUNK):
+                chunk = fingerprints[start:start + _LOOKUP_CHUNK]
+                rows.extend(self._conn.execute(
+                    f"SELECT fingerprint, body FROM pages WHERE extractor = ?"
+                    f" AND fingerprint IN ({','.join('?' * len(chunk))})",
+                    [EXTRACTOR_VERSION, *chunk],
+                ).fetchall())
+        return {fp: decompress_text(body) for fp, body in rows}
+
+    def load_pages(self, pdf_path: str) -> List[str]:
+        """Text of every page, from the cache where possible."""
+        digest = file_hash(pdf_path)
+        cached = self._cached_file(digest)
+        if cached is not None:
+            self.counters["file_hits"] += 1
+            return cached
+
+        # new or changed file: extract only pages whose fingerprint we have not seen
+        reader = PdfReader(pdf_path)
+        fingerprints = [page_fingerprint(page) for page in reader.pages]
+        known = self._by_fingerprint(sorted(set(fingerprints)))
+        self.counters["page_hits"] += sum(1 for fp in fingerprints if fp in known)
+        texts = []
+        t0 = time.perf_counter()
+        for page, fp in zip(reader.pages, fingerprints):
+            if fp not in known:
+                known[fp] = page.extract_text() or ""
+                self.counters["pages_extracted"] += 1
+            texts.append(known[fp])
+        self.counters["extract_s"] += time.perf_counter() - t0
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                [
+                    (digest, i, EXTRACTOR_VERSION, fp, compress_text(t, self.level))
+                    for i, (fp, t) in enumerate(zip(fingerprints, texts))
+                ],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)",
+                (digest, EXTRACTOR_VERSION, len(texts), pdf_path, time.time()),
+            )
+            self._conn.commit()
+        return texts
+
+    def load_text(self, pdf_path: str) -> Tuple[str, List[int]]:
+        """The text load_pdf_text returns (pages joined by newlines) and each page's start offset."""
+        pages = self.load_pages(pdf_path)
+        offsets, pos = [], 0
+        for text in pages:
+            offsets.append(pos)
+            pos += len(text) + 1
+        return "\n".join(pages), offsets
+
+    def stats(self) -> Dict:
+        with self._lock:
+            n_docs = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            n_pages, size = self._conn.execute("SELECT COUNT(*), SUM(LENGTH(body)) FROM pages").fetchone()
+        return {
+            "path": self.path,
+            "extractor": EXTRACTOR_VERSION,
+            "codec": codec_name(),
+            "documents": n_docs,
+            "pages": n_pages,
+            "compressed_bytes": size or 0,
+            **{k: round(v, 3) if isinstance(v, float) else v for k, v in self.counters.items()},
+        }
+
+
+def open_page_cache(path: str, level: int = 3) -> PageTextCache:
+    """Process-wide cache per file."""
+    with _CACHES_LOCK:
+        if path not in _CACHES:
+            _CACHES[path] = PageTextCache(path, level)
+        return _CACHES[path]
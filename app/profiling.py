@@ -0,0 +1,130 @@
+# profiling.py
+"""
+On-demand profiling of a single request.
+
+profile_call(fn) runs fn (e.g. an answer_question call) under cProfile and
+tracemalloc and returns its result plus a report: the hottest functions by
+own time, the allocation peak and top allocation sites, and a stage
+timeline (encode, Milvus search, result handling, prompt building, ...)
+derived from the profile. The raw profile is included in pstats format for
+download (open with `python -m pstats` or snakeviz).
+
+Nothing here is imported or active unless profiling is requested, so
+normal requests pay no overhead. Only the calling thread is profiled: work
+done in other threads (e.g. the embedding batcher) shows up as waiting time
+in the stage that called it.
+"""
+import cProfile
+import marshal
+import os
+import pstats
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# stage -> (source file, function) whose cumulative time is the stage, in request order
+STAGE_FUNCTIONS = [
+    ("metadata", ("metadata.py", "_fetch")),
+    ("encode", ("rag_backend.py", "embed_and_keep")),
+    ("milvus_search", ("milvus_client.py", "search")),
+    ("rescore", ("quantization.py", "rescore_hits")),
+    ("expand_parents", ("small_to_big.py", "expand_to_parents")),
+    ("fetch_texts", ("text_store.py", "fill_texts")),
+    ("cache_lookup", ("answer_cache.py", "lookup")),
+    ("build_prompt", ("rag_backend.py", "build_prompt")),
+]
+_SEARCH_STAGES = ("encode", "milvus_search", "rescore", "expand_parents", "fetch_texts")
+
+
+def _time(stats: pstats.Stats, filename: str, function: str, own: bool = False) -> float:
+    # cumulative (or own) seconds of every function with that name in that file
+    return sum(
+        tt if own else ct for (file, _, func), (_, _, tt, ct, _) in stats.stats.items()
+        if func == function and os.path.basename(file) == filename
+    )
+
+
+def hot_functions(stats: pstats.Stats, top_n: int = 15) -> List[Dict]:
+    rows = sorted(stats.stats.items(), key=lambda kv: kv[1][2], reverse=True)[:top_n]
+    return [
+        {
+            "function": func,
+            "where": f"{os.path.basename(file)}:{line}",
+            "calls": nc,
+            "own_ms": round(tt * 1000, 3),
+            "cumulative_ms": round(ct * 1000, 3),
+        }
+        for (file, line, func), (_, nc, tt, ct, _) in rows
+    ]
+
+
+def stage_timeline(stats: pstats.Stats, timings: Optional[Dict] = None, wall_ms: Optional[float] = None) -> List[Dict]:
+    """
+    Sequential stages with start offsets (ms). "result_handling" is
+    semantic_search's own code (parsing hits) plus the range cut-off; "llm"
+    comes from the request's own timings minus prompt building; "other" is
+    whatever is left of wall_ms (journal, scheduler, profiler overhead).
+    """
+    durations = {stage: _time(stats, *where) * 1000 for stage, where in STAGE_FUNCTIONS}
+    durations["result_handling"] = (
+        _time(stats, "rag_backend.py", "semantic_search", own=True)
+        + _time(stats, "range_search.py", "apply_range")
+    ) * 1000
+    if timings and "llm" in timings:
+        durations["llm"] = max(timings["llm"] - durations["build_prompt"], 0.0)
+    if wall_ms is not None:
+        durations["other"] = max(wall_ms - sum(durations.values()), 0.0)
+
+    order = ["metadata", *_SEARCH_STAGES, "result_handling", "cache_lookup", "build_prompt", "llm", "other"]
+    timeline, start = [], 0.0
+    for stage in order:
+        ms = durations.get(stage, 0.0)
+        if ms > 0:
+            timeline.append({"stage": stage, "start_ms": round(start, 3), "duration_ms": round(ms, 3)})
+            start += ms
+    return timeline
+
+
+def profile_call(fn: Callable[[], Dict], top_n: int = 15, trace_memory: bool = True) -> Tuple[Dict, Dict]:
+    """Run fn under cProfile (+ tracemalloc) and return (result, report)."""
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    elif trace_memory:
+        tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+
+    t0 = time.perf_counter()
+    try:
+        result = profiler.runcall(fn)
+    finally:
+        wall_ms = (time.perf_counter() - t0) * 1000
+        memory = None
+        if trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:top_n]
+            memory = {
+                "peak_kb": round(peak / 1024, 1),
+                "retained_kb": round(current / 1024, 1),
+                "top_allocations": [
+                    {
+                        "where": f"{os.path.basename(s.traceback[0].filename)}:{s.traceback[0].lineno}",
+                        "size_kb": round(s.size / 1024, 1),
+                        "blocks": s.count,
+                    }
+                    for s in top
+                ],
+            }
+            if started_tracing:
+                tracemalloc.stop()
+
+    stats = pstats.Stats(profiler)  # takes the profiler's stats over
+    report = {
+        "wall_ms": round(wall_ms, 3),
+        "hot_functions": hot_functions(stats, top_n),
+        "timeline": stage_timeline(stats, result.get("timings") if isinstance(result, dict) else None, wall_ms),
+        "memory": memory,
+        "pstats": marshal.dumps(stats.stats),  # same format as Profile.dump_stats
+    }
+    return result, report
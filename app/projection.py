@@ -0,0 +1,177 @@
+# projection.py
+"""
+Learned dimensionality reduction (PCA / whitening) for stored vectors.
+
+A projection is fitted once per collection on a sample of chunk embeddings,
+saved as `<projection_dir>/<collection>.npz`, and applied to both chunk and
+query embeddings as a single affine map: x @ weights + bias.
+"""
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+_PROJECTION_CACHE: Dict[str, tuple] = {}
+
+
+def fit_projection(
+    embeddings,
+    n_components: int,
+    whiten: bool = False,
+    max_samples: Optional[int] = None,
+    seed: int = 0,
+    min_samples: Optional[int] = None,
+) -> Dict:
+    """
+    Fit a PCA projection (optionally whitened) on embeddings, using a random
+    sample of at most `max_samples` rows.
+
+    Raises ValueError with fewer than min_samples rows (never less than
+    n_components + 1): n centered samples only span n - 1 axes, and the
+    missing axes would project everything to the same point.
+    """
+    x = np.asarray(embeddings, dtype=np.float32)
+    if max_samples and len(x) > max_samples:
+        rng = np.random.default_rng(seed)
+        x = x[rng.choice(len(x), size=max_samples, replace=False)]
+    n, dim = x.shape
+    if not 0 < n_components <= dim:
+        raise ValueError(f"n_components must be in 1..{dim}, got {n_components}")
+    # centering removes one degree of freedom: n samples span n - 1 axes
+    min_samples = max(min_samples or 0, n_components + 1)
+    if n < min_samples:
+        raise ValueError(
+            f"Need at least {min_samples} embeddings to fit a {n_components}-dim projection, got {n}"
+        )
+
+    mean = x.mean(axis=0)
+    # right singular vectors of the centered data = principal axes
+    _, s, vt = np.linalg.svd(x - mean, full_matrices=False)
+    variance = (s ** 2) / (n - 1)
+    weights = vt[:n_components].T.copy()
+    if whiten:
+        weights /= np.sqrt(np.maximum(variance[:n_components], 1e-12))
+
+    return {
+        "weights": weights.astype(np.float32),
+        "bias": (-mean @ weights).astype(np.float32),
+        "explained_variance_ratio": float(variance[:n_components].sum() / max(variance.sum(), 1e-12)),
+        "whiten": whiten,
+        "n_samples": n,
+    }
+
+
+def apply_projection(embeddings, projection: Dict) -> np.ndarray:
+    """Project embeddings (n, dim) -> (n, n_components) with one matmul."""
+    x = np.asarray(embeddings, dtype=np.float32)
+    return x @ projection["weights"] + projection["bias"]
+
+
+def projection_path(projection_dir: str, collection_name: str) -> str:
+    return os.path.join(projection_dir, f"{collection_name}.npz")
+
+
+def save_projection(projection_dir: str, collection_name: str, projection: Dict) -> str:
+    os.makedirs(projection_dir, exist_ok=True)
+    path = projection_path(projection_dir, collection_name)
+    np.savez(
+        path,
+        weights=projection["weights"],
+        bias=projection["bias"],
+        explained_variance_ratio=projection["explained_variance_ratio"],
+        whiten=projection["whiten"],
+        n_samples=projection.get("n_samples", 0),
+    )
+    _PROJECTION_CACHE.pop(path, None)
+    return path
+
+
+def load_projection(projection_dir: Optional[str], collection_name: str) -> Optional[Dict]:
+    """
+    Load the collection's projection, or None if the collection stores
+    full-width vectors. Cached per file until it changes on disk.
+    """
+    if not projection_dir:
+        return None
+    path = projection_path(projection_dir, collection_name)
+    if not os.path.exists(path):
+        return None
+
+    mtime = os.path.getmtime(path)
+    cached = _PROJECTION_CACHE.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with np.load(path) as data:
+        projection = {
+            "weights": data["weights"],
+            "bias": data["bias"],
+            "explained_variance_ratio": float(data["explained_variance_ratio"]),
+            "whiten": bool(data["whiten"]),
+            "n_samples": int(data["n_samples"]) if "n_samples" in data else 0,
+        }
+    _PROJECTION_CACHE[path] = (mtime, projection)
+    return projection
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+
+def recall_vs_dimension(
+    embeddings,
+    queries=None,
+    dims: Sequence[int] = (64, 128, 192, 256),
+    top_k: int = 5,
+    whiten: bool = False,
+    n_pseudo_queries: int = 100,
+    seed: int = 0,
+) -> List[Dict]:
+    """
+    Recall@k of cosine search after projecting to each candidate dimension,
+    against exact full-width cosine search.
+
+    Without `queries`, a random sample of the corpus is used as
+    pseudo-queries (each one's own row is excluded from its results).
+    """
+    docs = np.asarray(embeddings, dtype=np.float32)
+    exclude_self = queries is None
+    if exclude_self:
+        rng = np.random.default_rng(seed)
+        q_idx = rng.choice(len(docs), size=min(n_pseudo_queries, len(docs)), replace=False)
+        qs = docs[q_idx]
+    else:
+        qs = np.asarray(queries, dtype=np.float32)
+
+    def top_ids(q, d):
+        scores = _normalize(q) @ _normalize(d).T
+        if exclude_self:
+            scores[np.arange(len(q_idx)), q_idx] = -np.inf
+        return np.argsort(-scores, axis=1)[:, :top_k]
+
+    truth = top_ids(qs, docs)
+    full_dim = docs.shape[1]
+    report = []
+    for dim in dims:
+        if dim > full_dim or dim >= len(docs):
+            continue
+        proj = fit_projection(docs, dim, whiten=whiten)
+        found = top_ids(apply_projection(qs, proj), apply_projection(docs, proj))
+        hits = sum(len(set(t) & set(f)) for t, f in zip(truth.tolist(), found.tolist()))
+        report.append({
+            "dim": dim,
+            "recall": hits / max(truth.size, 1),
+            "explained_variance_ratio": proj["explained_variance_ratio"],
+            "memory_ratio": dim / full_dim,
+        })
+    return report
+
+
+def format_dimension_report(report: List[Dict]) -> str:
+    lines = [f"{'dim':>5}  {'recall':>7}  {'variance':>8}  {'memory':>6}"]
+    for r in report:
+        lines.append(
+            f"{r['dim']:>5}  {r['recall']:>7.3f}  {r['explained_variance_ratio']:>8.3f}  {r['memory_ratio']:>6.2f}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,204 @@
+# quantization.py
+"""
+Compact vector storage for Milvus collections.
+
+Embeddings can be stored as FLOAT16 / BFLOAT16 (2x smaller than float32)
+or as sign-quantized BINARY vectors searched with HAMMING (32x smaller).
+Over-fetched candidates can then be rescored against the float32 query.
+
+Rescoring only uses what is stored. float16 / bfloat16 keep nearly the
+full precision, so it recovers close to float32 ranking. Binary vectors
+keep only the signs: the rescore compares the float32 query with the +/-1
+sign vectors, which ranks better than HAMMING on the query's signs but is
+not a full-precision rescore. Check measure_recall's recall_rescored before
+relying on binary storage.
+"""
+from typing import Dict, List
+
+import numpy as np
+from pymilvus import DataType
+
+
+VECTOR_STORAGE_TYPES = {
+    "float32": DataType.FLOAT_VECTOR,
+    "float16": DataType.FLOAT16_VECTOR,
+    "bfloat16": DataType.BFLOAT16_VECTOR,
+    "binary": DataType.BINARY_VECTOR,
+}
+
+# bytes needed to store one vector component (binary packs 8 per byte)
+BYTES_PER_COMPONENT = {
+    "float32": 4.0,
+    "float16": 2.0,
+    "bfloat16": 2.0,
+    "binary": 1.0 / 8,
+}
+
+
+def vector_datatype(storage: str) -> DataType:
+    """Milvus vector field type for the given storage mode."""
+    if storage not in VECTOR_STORAGE_TYPES:
+        raise ValueError(
+            f"Unknown vector storage '{storage}', expected one of {list(VECTOR_STORAGE_TYPES)}"
+        )
+    return VECTOR_STORAGE_TYPES[storage]
+
+
+def index_spec(storage: str) -> Dict[str, str]:
+    """Index type and metric that match the stored vector type."""
+    vector_datatype(storage)
+    if storage == "binary":
+        return {"index_type": "BIN_FLAT", "metric_type": "HAMMING"}
+    return {"index_type": "FLAT", "metric_type": "COSINE"}
+
+
+def _to_bfloat16(arr: np.ndarray) -> np.ndarray:
+    """Round float32 -> bfloat16 (kept as uint16 bit patterns)."""
+    bits = np.ascontiguousarray(arr, dtype=np.float32).view(np.uint32)
+    # round-to-nearest-even on the 16 dropped mantissa bits
+    bits = bits + (0x7FFF + ((bits >> 16) & 1))
+    return (bits >> 16).astype(np.uint16)
+
+
+def quantize_embeddings(embeddings, storage: str) -> List:
+    """
+    Convert float embeddings to the Milvus-ready representation of `storage`.
+
+    float32 -> List[List[float]] (unchanged)
+    float16 / bfloat16 -> one little-endian bytes blob per row
+    binary -> sign bits packed into bytes (dim / 8 bytes per row)
+    """
+    vector_datatype(storage)
+    arr = np.asarray(embeddings, dtype=np.float32)
+    if arr.ndim == 1:
+        arr = arr[None, :]
+
+    if storage == "float32":
+        return arr.tolist()
+    if storage == "float16":
+        packed = arr.astype("<f2")
+    elif storage == "bfloat16":
+        packed = _to_bfloat16(arr).astype("<u2")
+    else:
+        if arr.shape[1] % 8:
+            raise ValueError(f"Binary vectors need dim divisible by 8, got {arr.shape[1]}")
+        packed = np.packbits(arr > 0, axis=1)
+    return [row.tobytes() for row in packed]
+
+
+def decode_vectors(raw_vectors: List, storage: str, dim: int) -> np.ndarray:
+    """
+    Decode vectors returned by Milvus (bytes or float lists) into float32.
+
+    Binary vectors decode to +/-1 so that the float32 query can be scored
+    against them asymmetrically.
+    """
+    rows = []
+    for raw in raw_vectors:
+        # pymilvus wraps bytes-typed vectors in a single-element list
+        if isinstance(raw, list) and len(raw) == 1 and isinstance(raw[0], bytes):
+            raw = raw[0]
+        if not isinstance(raw, bytes):
+            rows.append(np.asarray(raw, dtype=np.float32))
+            continue
+        buf = np.frombuffer(raw, dtype=np.uint8)
+        if storage == "float16":
+            rows.append(buf.view("<f2").astype(np.float32))
+        elif storage == "bfloat16":
+            rows.append((buf.view("<u2").astype(np.uint32) << 16).view(np.float32))
+        elif storage == "binary":
+            bits = np.unpackbits(buf)[:dim]
+            rows.append(bits.astype(np.float32) * 2.0 - 1.0)
+        else:
+            rows.append(buf.view("<f4"))
+    if not rows:
+        return np.zeros((0, dim), dtype=np.float32)
+    return np.vstack(rows)
+
+
+def _cosine_scores(query_vec: np.ndarray, doc_vecs: np.ndarray) -> np.ndarray:
+    q = query_vec / (np.linalg.norm(query_vec) or 1.0)
+    norms = np.linalg.norm(doc_vecs, axis=1)
+    norms[norms == 0] = 1.0
+    return (doc_vecs @ q) / norms
+
+
+def rescore_hits(query_vec, hits: List[Dict], storage: str, top_k: int) -> List[Dict]:
+    """
+    Rerank over-fetched hits by cosine between the float32 query and the
+    stored (decoded) candidate vectors. Each hit needs a "vector" key; it is
+    removed from the returned hits.
+
+    For binary storage the candidates decode to +/-1 sign vectors, so this
+    is an asymmetric rerank (full-precision query, 1-bit documents), not a
+    full-precision one, and the scores are not the float32 cosines.
+    """
+    if not hits:
+        return hits
+    q = np.asarray(query_vec, dtype=np.float32)
+    docs = decode_vectors([h["vector"] for h in hits], storage, dim=q.shape[0])
+    scores = _cosine_scores(q, docs)
+    order = np.argsort(-scores)[:top_k]
+
+    out = []
+    for i in order:
+        h = {k: v for k, v in hits[i].items() if k != "vector"}
+        h["score"] = float(scores[i])
+        out.append(h)
+    return out
+
+
+def measure_recall(
+    embeddings,
+    queries,
+    storage: str,
+    top_k: int = 5,
+    rescore_factor: int = 4,
+) -> Dict:
+    """
+    Offline recall@k of a storage mode against exact float32 cosine search.
+
+    Runs brute force in numpy on a sample of corpus embeddings and query
+    embeddings, with and without rescoring of `top_k * rescore_factor`
+    candidates. Also reports memory per vector and the compression ratio.
+    """
+    docs = np.asarray(embeddings, dtype=np.float32)
+    qs = np.asarray(queries, dtype=np.float32)
+    dim = docs.shape[1]
+    k = min(top_k, len(docs))
+    fetch = min(k * max(rescore_factor, 1), len(docs))
+
+    docs_n = docs / np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+    qs_n = qs / np.maximum(np.linalg.norm(qs, axis=1, keepdims=True), 1e-12)
+    truth = np.argsort(-(qs_n @ docs_n.T), axis=1)[:, :k]
+
+    stored = decode_vectors(quantize_embeddings(docs, storage), storage, dim)
+    if storage == "binary":
+        # hamming distance on sign bits == ranking by agreement with query signs
+        q_bits = np.where(qs > 0, 1.0, -1.0).astype(np.float32)
+        approx = q_bits @ stored.T
+    else:
+        stored_n = stored / np.maximum(np.linalg.norm(stored, axis=1, keepdims=True), 1e-12)
+        approx = qs_n @ stored_n.T
+    candidates = np.argsort(-approx, axis=1)[:, :fetch]
+
+    hits_plain = 0
+    hits_rescored = 0
+    for qi in range(len(qs)):
+        true_set = set(truth[qi].tolist())
+        hits_plain += len(true_set & set(candidates[qi, :k].tolist()))
+        cand = candidates[qi]
+        rescored = cand[np.argsort(-_cosine_scores(qs[qi], stored[cand]))][:k]
+        hits_rescored += len(true_set & set(rescored.tolist()))
+
+    total = max(len(qs) * k, 1)
+    bytes_per_vector = dim * BYTES_PER_COMPONENT[storage]
+    return {
+        "storage": storage,
+        "top_k": k,
+        "rescore_factor": rescore_factor,
+        "recall": hits_plain / total,
+        "recall_rescored": hits_rescored / total,
+        "bytes_per_vector": bytes_per_vector,
+        "compression": (dim * BYTES_PER_COMPONENT["float32"]) / bytes_per_vector,
+    }
@@ -0,0 +1,293 @@
+# query_journal.py
+"""
+Opt-in query journal and replay tool.
+
+QueryJournal appends one JSON line per answer_question call (role,
+question, top_k, collection, filters, search params, per-stage timings in ms,
+result keys, cache hit, error) to a size-rotated file; requests slower than
+`slow_ms` are flagged with "slow": true. Results are journaled by
+passage_key (source label + text hash), not by primary key: auto_id keys
+change whenever a collection is rebuilt, so they could not be compared
+across a reindex or against another deployment.
+
+Run as a script to replay a journal against any backend configuration, at
+the original pace (--speed 1), faster (--speed 10) or back to back
+(--speed 0), and compare latency and results with the capture.
+
+Examples (from the repo root):
+    python app/query_journal.py journal/queries.jsonl --embedder stub --speed 0
+    python app/query_journal.py journal/queries.jsonl --speed 5 --slow-only --out replay.json
+"""
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+
+def passage_key(passage: Dict) -> str:
+    """Stable identity of a returned passage: its source label and a hash of its text."""
+    digest = hashlib.sha1((passage.get("text") or "").encode("utf-8")).hexdigest()[:12]
+    return f"{passage.get('source')}@{digest}"
+
+
+class QueryJournal:
+    def __init__(self, path: str, slow_ms: float = 2000.0, max_bytes: int = 10_000_000, backups: int = 5):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.slow_ms = slow_ms
+        self.stats = {"recorded": 0, "slow": 0, "errors": 0}
+        # RotatingFileHandler does the locking and the path -> path.1 -> ... rotation
+        self._logger = logging.getLogger(f"query_journal.{os.path.abspath(path)}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        if not self._logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(handler)
+
+    def record(self, entry: Dict) -> None:
+        entry["slow"] = entry.get("timings_ms", {}).get("total", 0.0) >= self.slow_ms
+        self.stats["recorded"] += 1
+        self.stats["slow"] += entry["slow"]
+        self.stats["errors"] += "error" in entry
+        if entry["slow"]:
+            print(f"[Journal] Slow request ({entry['timings_ms']['total']:.0f} ms): "
+                  f"{entry['role']} / {entry['question'][:60]!r}")
+        self._logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def capture(
+        self,
+        fn: Callable[[], Dict],
+        role: str,
+        question: str,
+        top_k: int,
+        collection_name,
+        filters: Optional[Dict] = None,
+    ) -> Dict:
+        """Run fn (an answer_question call), journal it and return its result."""
+        entry = {
+            "ts": time.time(),
+            "role": role,
+            "question": question,
+            "top_k": top_k,
+            "collection_name": collection_name,
+            **({"filters": filters} if filters else {}),
+        }
+        t0 = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            entry["timings_ms"] = {"total": round((time.perf_counter() - t0) * 1000, 3)}
+            entry["error"] = f"{type(e).__name__}: {e}"
+            self.record(entry)
+            raise
+        entry.update({
+            "search_params": result.get("search_params"),
+            "timings_ms": {**result.get("timings", {}), "total": round((time.perf_counter() - t0) * 1000, 3)},
+            "result_keys": [passage_key(p) for p in result["passages"]],
+            "cache_hit": result.get("cache_hit", False),
+            "context_words": result.get("context_words"),
+        })
+        self.record(entry)
+        return result
+
+
+def journal_files(path: str) -> List[str]:
+    """The journal and its rotated backups, oldest first."""
+    backups = [p for p in glob.glob(glob.escape(path) + ".*") if p.rsplit(".", 1)[1].isdigit()]
+    backups.sort(key=lambda p: int(p.rsplit(".", 1)[1]), reverse=True)
+    return backups + ([path] if os.path.exists(path) else [])
+
+
+def read_journal(path: str) -> Iterator[Dict]:
+    for file in journal_files(path):
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+# ---------- replay ----------
+
+def replay(entries: List[Dict], run_fn: Callable[[Dict], Dict], speed: float = 1.0, max_workers: int = 16) -> List[Dict]:
+    """
+    Re-run journal entries through run_fn(entry) -> answer_question result,
+    keeping their original spacing divided by `speed` (0 = back to back).
+    """
+    outcomes: List[Dict] = []
+    lock = threading.Lock()
+
+    def job(entry: Dict, scheduled: float):
+        out = {"question": entry["question"], "role": entry["role"], "original_ms": entry["timings_ms"].get("total")}
+        t0 = time.perf_counter()
+        try:
+            result = run_fn(entry)
+            out["timings_ms"] = {**result.get("timings", {}), "total": round((time.perf_counter() - t0) * 1000, 3)}
+            out["queue_ms"] = round((t0 - scheduled) * 1000, 3)
+            out["hits"] = len(result["passages"])
+            out["context_words"] = result.get("context_words")
+            old, new = set(entry.get("result_keys") or []), {passage_key(p) for p in result["passages"]}
+            out["result_overlap"] = round(len(old & new) / len(old), 4) if old else None
+        except Exception as e:
+            out["error"] = f"{type(e).__name__}: {e}"
+        with lock:
+            outcomes.append(out)
+
+    if not entries:
+        return outcomes
+    start = time.perf_counter()
+    first_ts = entries[0]["ts"]
+    with ThreadPoolExecutor(max_workers=max_workers if speed else 1) as pool:
+        for entry in entries:
+            scheduled = start + ((entry["ts"] - first_ts) / speed if speed else 0.0)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(job, entry, max(scheduled, start))
+    return outcomes
+
+
+def compare(entries: List[Dict], outcomes: List[Dict]) -> Dict:
+    def pct(values, p):
+        return round(float(np.percentile(values, p)), 2) if values else None
+
+    original = [e["timings_ms"]["total"] for e in entries if "total" in e.get("timings_ms", {})]
+    replayed = [o["timings_ms"]["total"] for o in outcomes if "timings_ms" in o]
+    overlaps = [o["result_overlap"] for o in outcomes if o.get("result_overlap") is not None]
+    original_hits = [len(e.get("result_keys") or []) for e in entries]
+    replayed_hits = [o["hits"] for o in outcomes if "hits" in o]
+    original_words = [e["context_words"] for e in entries if e.get("context_words") is not None]
+    replayed_words = [o["context_words"] for o in outcomes if o.get("context_words") is not None]
+    return {
+        "requests": len(entries),
+        "errors": sum("error" in o for o in outcomes),
+        "original_ms": {"p50": pct(original, 50), "p95": pct(original, 95), "max": pct(original, 100)},
+        "replayed_ms": {"p50": pct(replayed, 50), "p95": pct(replayed, 95), "max": pct(replayed, 100)},
+        "mean_result_overlap": round(float(np.mean(overlaps)), 4) if overlaps else None,
+        "mean_hits": {
+            "original": round(float(np.mean(original_hits)), 2) if original_hits else None,
+            "replayed": round(float(np.mean(replayed_hits)), 2) if replayed_hits else None,
+        },
+        "mean_context_words": {
+            "original": round(float(np.mean(original_words)), 1) if original_words else None,
+            "replayed": round(float(np.mean(replayed_words)), 1) if replayed_words else None,
+        },
+    }
+
+
+def main(argv=None):
+    from pymilvus import MilvusClient
+
+    from config import COLLECTION_MAP
+    from loadtest import StubEmbedder, make_stub_llm, prepare_local_milvus
+    from rag_backend import SearchOptions, answer_question
+
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("journal", help="journal file (rotated backups next to it are included)")
+    p.add_argument("--speed", type=float, default=1.0, help="1 = original pace, 10 = 10x faster, 0 = back to back")
+    p.add_argument("--slow-only", action="store_true", help="replay only requests flagged slow")
+    p.add_argument("--limit", type=int, help="replay at most this many requests")
+    p.add_argument("--max-workers", type=int, default=16)
+    p.add_argument("--uri", help="Milvus URI (default: local Milvus Lite database --db)")
+    p.add_argument("--token", default="")
+    p.add_argument("--db", default="./loadtest_milvus.db")
+    p.add_argument("--public-pdf", default="./data/offerings_public.pdf")
+    p.add_argument("--managers-pdf", default="./data/offerings_managers_only.pdf")
+    p.add_argument("--embedder", choices=["model", "stub"], default="model")
+    p.add_argument("--llm-latency", type=float, default=0.0, help="stub LLM mean latency (s); 0 = no LLM")
+    p.add_argument("--top-k", type=int, help="override the captured top_k")
+    p.add_argument("--vector-storage", default="float32")
+    p.add_argument("--rescore-factor", type=int, default=0)
+    p.add_argument("--tuning-dir")
+    p.add_argument("--projection-dir")
+    p.add_argument("--consistency", help="consistency level for searches")
+    p.add_argument("--range-threshold", type=float, help="range search: worst score kept (see range_search.py)")
+    p.add_argument("--range-rescore-threshold", type=float, help="range search: worst cosine kept after rescoring")
+    p.add_argument("--range-max-gap", type=float, help="range search: stop at a score gap this large")
+    p.add_argument("--parent-store", help="small-to-big: parent window store (enables expansion)")
+    p.add_argument("--window", type=int, default=1, help="small-to-big: units around each matched child (-1 = whole parent)")
+    p.add_argument("--fetch-factor", type=int, default=4, help="small-to-big: children retrieved per passage")
+    p.add_argument("--routing-dir", help="fan-out roles: centroid summaries to route with (enables routing)")
+    p.add_argument("--probes", type=int, default=2, help="fan-out roles: collections searched per query")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", help="write per-request outcomes and the summary as JSON")
+    args = p.parse_args(argv)
+    random.seed(args.seed)
+
+    entries = [e for e in read_journal(args.journal) if "error" not in e and (e.get("slow") or not args.slow_only)]
+    entries.sort(key=lambda e: e["ts"])
+    if args.limit:
+        entries = entries[:args.limit]
+    print(f"[Replay] {len(entries)} requests from {args.journal}")
+
+    if args.embedder == "model":
+        from warmup import get_model
+        model = get_model("sentence-transformers/all-MiniLM-L6-v2")
+    else:
+        model = StubEmbedder()
+    if args.uri:
+        client = MilvusClient(uri=args.uri, token=args.token)
+    else:
+        dim = model.encode(["ping"], convert_to_numpy=True).shape[1]
+        client = prepare_local_milvus(args.db, model, dim, args.public_pdf, args.managers_pdf)
+    range_search = None
+    if any(v is not None for v in (args.range_threshold, args.range_rescore_threshold, args.range_max_gap)):
+        range_search = {
+            "threshold": args.range_threshold,
+            "rescore_threshold": args.range_rescore_threshold,
+            "max_gap": args.range_max_gap,
+        }
+    small_to_big, parent_store = None, None
+    if args.parent_store:
+        from text_store import open_text_store
+        parent_store = open_text_store(args.parent_store)
+        small_to_big = {
+            "enabled": True, "fetch_factor": args.fetch_factor, "window": None if args.window < 0 else args.window,
+        }
+    routing = {"enabled": True, "probes": args.probes} if args.routing_dir else None
+    llm_fn = make_stub_llm(args.llm_latency, args.llm_latency / 4) if args.llm_latency else None
+
+    def run_fn(entry: Dict) -> Dict:
+        return answer_question(
+            client, entry["question"], entry["role"],
+            embed_fn=lambda texts: model.encode(texts, convert_to_numpy=True).tolist(),
+            collection_map={**COLLECTION_MAP, entry["role"]: entry["collection_name"]},
+            top_k=args.top_k or entry["top_k"],
+            options=SearchOptions(
+                vector_storage=args.vector_storage,
+                rescore_factor=args.rescore_factor,
+                projection_dir=args.projection_dir,
+                tuning_dir=args.tuning_dir,
+                consistency_level=args.consistency,
+                filters=entry.get("filters"),
+                range_search=range_search,
+                small_to_big=small_to_big,
+                parent_store=parent_store,
+                routing=routing,
+                routing_dir=args.routing_dir,
+            ),
+            llm_fn=llm_fn,
+        )
+
+    outcomes = replay(entries, run_fn, speed=args.speed, max_workers=args.max_workers)
+    summary = compare(entries, outcomes)
+    print(json.dumps(summary, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"config": vars(args), "summary": summary, "outcomes": outcomes}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
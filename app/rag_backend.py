@@ -1,8 +1,28 @@
 # rag_backend.py
-from pymilvus import connections, Collection, MilvusClient, DataType
-from typing import List, Dict
+from pymilvus import connections, Collection, MilvusClient, DataType, MilvusException
+from typing import List, Dict, Iterable, Optional
+from dataclasses import dataclass
 from pypdf import PdfReader
 import time
+import asyncio
+import json
+import random
+
+from quantization import vector_datatype, index_spec, quantize_embeddings, rescore_hits
+from projection import fit_projection, apply_projection, save_projection, load_projection
+from dedup import DEFAULT_DEDUP, find_near_duplicates, load_dedup_state, record_dedup_ingest, remap_dedup_ids
+from tuning import load_tuned_params
+from singleflight import coalesce_key
+from consistency import consistency_kwargs, read_timestamps, write_token
+from reindex import resolve_collection
+from metadata import collection_meta, collection_exists, ensure_loaded, invalidate_metadata, \
+    default_search_params, output_fields_for, COLLECTION_NOT_LOADED
+from filters import SCALAR_INDEXES, compile_filter, filter_fields
+from range_search import range_params, apply_range, higher_is_better
+from small_to_big import (
+    DEFAULT_SMALL_TO_BIG, build_hierarchy, child_label, chunk_source, store_parents, expand_to_parents,
+)
+from routing import DEFAULT_ROUTING, route_collections, update_summary
 
 # def connect_milvus(MILVUS_HOST, MILVUS_PORT,MILVUS_API_KEY) -> MilvusClient:
 #     if not (MILVUS_HOST and MILVUS_PORT and MILVUS_API_KEY):
@@ -63,35 +83,218 @@ def connect_milvus(MILVUS_HOST, MILVUS_PORT, MILVUS_API_KEY) -> MilvusClient:
 def get_collection(collection_name: str) -> Collection:
     return Collection(collection_name)
 
+@dataclass
+class SearchOptions:
+    """
+    Retrieval settings shared by semantic_search, search_collections and
+    answer_question. Search and text options are described on
+    semantic_search, routing and per-collection state on search_collections.
+    """
+    vector_storage: str = "float32"
+    rescore_factor: int = 0
+    consistency_level: Optional[str] = None
+    read_token: object = None
+    filters: Optional[Dict] = None
+    range_search: Optional[Dict] = None
+    small_to_big: Optional[Dict] = None
+    text_store: object = None
+    parent_store: object = None
+    load_scheduler: object = None
+    projection_dir: Optional[str] = None
+    tuning_dir: Optional[str] = None
+    routing: Optional[Dict] = None
+    routing_dir: Optional[str] = None
+
+
 def semantic_search(
     client: MilvusClient, 
     collection_name: str, 
     query: str, 
     embed_fn, 
-    top_k: int = 5):
+    top_k: int = 5,
+    options: Optional[SearchOptions] = None,
+    projection: Optional[Dict] = None,
+    search_params: Optional[Dict] = None):
+    """
+    Search one collection with the given SearchOptions (defaults if None).
+    For compact storage (float16/bfloat16/binary) set rescore_factor > 0 to over-fetch top_k * rescore_factor candidates and
+    rerank them against the full-precision query vector. Candidates are
+    scored from their stored vectors, so for binary storage (sign bits
+    only) this is not a full-precision rescore; see quantization.py.
+
+    projection: the collection's PCA projection (see projection.py), applied
+    to the query embedding when the collection stores reduced vectors.
+
+    search_params: index search params (e.g. tuned by tuning.py); defaults
+    to a setting for the collection's index type.
+
+    Vector field, metric, storage type and available output fields come
+    from the cached collection metadata (metadata.py); vector_storage is
+    only a fallback.
+
+    consistency_level: "Strong" / "Session" / "Bounded" / "Eventually"
+    (None = collection default). read_token: write token returned by
+    ingest_pdf_to_collection; the search then sees at least that write.
+
+    text_store: ChunkTextStore for collections created without a text field;
+    texts of the final hits are fetched from it in one lookup.
+
+    filters: structured filter (see filters.py), e.g. {"offering_ids":
+    ["offering_xyz"], "source_prefixes": ["./data/offerings_public.pdf"]};
+    applied by Milvus as a pre-filter during the ANN search.
+
+    range_search: score-threshold settings (see range_search.py); top_k
+    becomes a cap, hits below the threshold or after a large score gap are
+    dropped. threshold / best are in the collection's metric and pushed to
+    Milvus as radius / range_filter; rescored hits are then cut by
+    rescore_threshold (a cosine similarity).
+
+    load_scheduler: optional LoadScheduler; records the query and loads the
+    collection on demand (it releases idle ones in the background).
+
+    small_to_big / parent_store: for collections ingested in small-to-big
+    mode (see small_to_big.py), top_k * fetch_factor child chunks are
+    retrieved and expanded to at most top_k parent windows from parent_store.
+    """
+    options = options or SearchOptions()
+    vector_storage, rescore_factor = options.vector_storage, options.rescore_factor
+    filters, range_search, load_scheduler = options.filters, options.range_search, options.load_scheduler
+    small_to_big, parent_store, text_store = options.small_to_big, options.parent_store, options.text_store
+    expand = bool(small_to_big and small_to_big.get("enabled") and parent_store is not None)
+    if expand:
+        small_to_big = {**DEFAULT_SMALL_TO_BIG, **small_to_big}
+        passages, top_k = top_k, top_k * small_to_big["fetch_factor"]
+    if load_scheduler is not None:
+        meta = load_scheduler.ensure_loaded(client, collection_name)
+    else:
+        meta = ensure_loaded(client, collection_name)
+    missing = [f for f in filter_fields(filters) if f not in meta["fields"]]
+    if missing:
+        raise ValueError(f"Collection '{collection_name}' has no field(s) {missing} to filter on.")
+    expr = compile_filter(filters)
+    vector_storage = meta["vector_storage"] or vector_storage
+    vector_field = meta["vector_field"] or "embedding"
+    metric_type = meta["metric_type"] or index_spec(vector_storage)["metric_type"]
+
     q_emb = embed_fn([query])  # [[...]]
-    res = client.search(
-        collection_name=collection_name,
-        data=q_emb,
-        anns_field="embedding",
-        limit=top_k,
-        search_params={"metric_type": "COSINE", "params": {"nprobe": 10}},
-        output_fields=["text", "source"],
-    )
+    if projection is not None:
+        q_emb = apply_projection(q_emb, projection).tolist()
+    rescore = rescore_factor > 0 and vector_storage != "float32"
+    limit = top_k * rescore_factor if rescore else top_k
+    output_fields = output_fields_for(meta, ["text", "source"]) + ([vector_field] if rescore else [])
+    params = search_params if search_params is not None else default_search_params(meta["index_type"], limit)
+    if range_search:
+        params = {**params, **range_params(metric_type, range_search)}
+
+    def search():
+        return client.search(
+            collection_name=collection_name,
+            data=quantize_embeddings(q_emb, vector_storage),
+            anns_field=vector_field,
+            limit=limit,
+            search_params={"metric_type": metric_type, "params": params},
+            output_fields=output_fields,
+            filter=expr,
+            **consistency_kwargs(collection_name, options.consistency_level, options.read_token),
+        )
+
+    try:
+        res = search()
+    except MilvusException as e:
+        if e.code != COLLECTION_NOT_LOADED:
+            raise
+        # released behind the cache's back: refresh, load and retry once
+        invalidate_metadata(collection_name)
+        if load_scheduler is not None:
+            load_scheduler.ensure_loaded(client, collection_name, count=False)
+        else:
+            ensure_loaded(client, collection_name)
+        res = search()
 
     hits = res[0] if res else []
     out = []
     for h in hits:
         # depending on pymilvus version, fields may be in h["entity"] or h["fields"]
         entity = h.get("entity") or h.get("fields") or {}
-        out.append({
+        hit = {
+            "id": h.get("id"),
             "text": entity.get("text"),
             "source": entity.get("source"),
-            "score": h.get("distance") or h.get("score"),
-        })
+            "score": h.get("distance") if h.get("distance") is not None else h.get("score"),
+        }
+        if rescore:
+            hit["vector"] = entity.get(vector_field)
+        out.append(hit)
+
+    if rescore:
+        out = rescore_hits(q_emb[0], out, vector_storage, top_k)
+    if range_search:
+        out = apply_range(out, metric_type, range_search, rescored=rescore)
+    if expand:
+        out = expand_to_parents(out, parent_store, meta["physical_name"], passages, small_to_big["window"])
+    if text_store is not None and "text" not in meta["fields"]:
+        text_store.fill_texts(meta["physical_name"], [h for h in out if "children" not in h])
     return out
 
 
+def search_collections(
+    client: MilvusClient,
+    collection_names: List[str],
+    query: str,
+    embed_fn,
+    top_k: int = 5,
+    options: Optional[SearchOptions] = None):
+    """
+    Search several collections with one query embedding and merge the hits
+    (best top_k overall, each tagged with its "collection").
+
+    routing: settings (see routing.DEFAULT_ROUTING); when enabled, only the
+    `probes` collections whose centroid summaries (under routing_dir) best
+    match the query are searched, with a full fan-out when routing is not
+    confident. Otherwise every collection is searched.
+
+    Per-collection projection and tuned params are loaded like in
+    answer_question (from projection_dir / tuning_dir); the other options go
+    to semantic_search. The collections
+    are assumed to share an embedding model and metric (scores are merged
+    as they are).
+
+    Returns (hits, route) where route is route_collections()'s result.
+    """
+    options = options or SearchOptions()
+    vectors = embed_fn([query])
+    state_names = [resolve_collection(client, name) for name in collection_names]
+    routing = {**DEFAULT_ROUTING, **(options.routing or {})}
+    if routing["enabled"]:
+        route = route_collections(
+            vectors[0], collection_names, options.routing_dir,
+            probes=routing["probes"], min_score=routing["min_score"], state_names=state_names,
+        )
+    else:
+        route = {"selected": list(collection_names), "scores": {}, "fallback": "disabled"}
+
+    out, metric_type = [], None
+    for name, state_name in zip(collection_names, state_names):
+        if name not in route["selected"]:
+            continue
+        tuned = load_tuned_params(options.tuning_dir, state_name, collection_meta(client, state_name))
+        hits = semantic_search(
+            client, name, query, lambda texts: vectors, top_k=top_k, options=options,
+            projection=load_projection(options.projection_dir, state_name),
+            search_params=tuned["params"] if tuned else None,
+        )
+        if metric_type is None:
+            meta = collection_meta(client, name)
+            rescored = options.rescore_factor > 0 and meta["vector_storage"] != "float32"
+            metric_type = "COSINE" if rescored else meta["metric_type"] or "COSINE"
+        out.extend({**h, "collection": name} for h in hits)
+
+    better = higher_is_better(metric_type or "COSINE")
+    missing = float("-inf") if better else float("inf")  # hits without a score go last
+    out.sort(key=lambda h: missing if h["score"] is None else h["score"], reverse=better)
+    return out[:top_k], route
+
+
 # def semantic_search(
 #     collection_name: str,
 #     query: str,
@@ -158,16 +361,159 @@ def call_llm(prompt: str) -> str:
 #     # return {"answer": answer, "passages": passages}
 #     return {"answer": "123", "passages": passages}
 
+def _flight_key(role: str, question: str, top_k: int, options: SearchOptions) -> tuple:
+    # requests share a computation only if every option that changes the answer matches
+    key = coalesce_key(role, question, top_k)
+    if options.read_token:
+        # only share with requests that need the same freshness
+        key += read_timestamps(options.read_token)
+    if options.filters:
+        key += (compile_filter(options.filters),)
+    for settings in (options.range_search, options.small_to_big, options.routing):
+        key += (json.dumps(settings, sort_keys=True, default=str) if settings else None,)
+    return key
+
+
 def answer_question(
     client: MilvusClient, 
     question: str, 
     role: str, 
     embed_fn, 
     collection_map, 
-    top_k: int = 5):
+    top_k: int = 5,
+    options: Optional[SearchOptions] = None,
+    llm_fn=None,
+    answer_cache=None,
+    single_flight=None,
+    journal=None):
+    """
+    Retrieve passages for the role's collection and, if llm_fn is given,
+    generate the answer from build_prompt(...). Without llm_fn the answer is
+    still the placeholder.
+
+    options: SearchOptions for the retrieval (see semantic_search and
+    search_collections); tuned search params under options.tuning_dir are
+    used automatically when present.
+    answer_cache: optional SemanticAnswerCache; a similar earlier question
+    from the same role with the same retrieved passages reuses its answer.
+    single_flight: optional SingleFlight; concurrent identical requests
+    (same role, normalized question, top_k and options) share one computation.
+    journal: optional QueryJournal; the request, its stage timings and
+    result keys are appended to it.
+
+    A role may map to a list of collections; the query is then searched in
+    the collections picked by routing (see search_collections) and the
+    result carries the "route" taken.
+
+    The result also carries "timings" (ms per stage), the "search_params"
+    that were used and "context_words" (words of passage text in the prompt).
+    """
+    options = options or SearchOptions()
+    if journal is not None:
+        return journal.capture(
+            lambda: answer_question(
+                client, question, role, embed_fn, collection_map, top_k=top_k, options=options,
+                llm_fn=llm_fn, answer_cache=answer_cache, single_flight=single_flight,
+            ),
+            role=role, question=question, top_k=top_k, collection_name=collection_map[role],
+            filters=options.filters,
+        )
+
+    if single_flight is not None:
+        result = single_flight.do(
+            _flight_key(role, question, top_k, options),
+            lambda: answer_question(
+                client, question, role, embed_fn, collection_map, top_k=top_k, options=options,
+                llm_fn=llm_fn, answer_cache=answer_cache,
+            ),
+        )
+        return dict(result)
+
     collection_name = collection_map[role]
-    passages = semantic_search(client, collection_name, question, embed_fn, top_k=top_k)
-    return {"answer": "123", "passages": passages}
+    fan_out = not isinstance(collection_name, str)
+    tuned, route = None, None
+
+    query_embedding = {}
+    timings = {}
+
+    def embed_and_keep(texts):
+        t0 = time.perf_counter()
+        vectors = embed_fn(texts)
+        timings["embed"] = time.perf_counter() - t0
+        query_embedding["vector"] = vectors[0]
+        return vectors
+
+    t_search = time.perf_counter()
+    if fan_out:
+        collection_name = tuple(collection_name)
+        passages, route = search_collections(
+            client, list(collection_name), question, embed_and_keep, top_k=top_k, options=options,
+        )
+    else:
+        # state files are per physical collection when collection_name is an alias
+        state_name = resolve_collection(client, collection_name)
+        tuned = load_tuned_params(options.tuning_dir, state_name, collection_meta(client, state_name))
+        passages = semantic_search(
+            client, collection_name, question, embed_and_keep, top_k=top_k, options=options,
+            projection=load_projection(options.projection_dir, state_name),
+            search_params=tuned["params"] if tuned else None,
+        )
+    timings["search"] = time.perf_counter() - t_search - timings.get("embed", 0.0)
+
+    def result(answer, cache_hit):
+        return {
+            "answer": answer,
+            "passages": passages,
+            "cache_hit": cache_hit,
+            "search_params": tuned["params"] if tuned else None,
+            "context_words": sum(len((p["text"] or "").split()) for p in passages),
+            "route": route,
+            "timings": {stage: round(s * 1000, 3) for stage, s in timings.items()},
+        }
+
+    if answer_cache is not None:
+        t0 = time.perf_counter()
+        cached = answer_cache.lookup(role, query_embedding["vector"], passages)
+        timings["cache_lookup"] = time.perf_counter() - t0
+        if cached is not None:
+            return result(cached["answer"], True)
+
+    t0 = time.perf_counter()
+    if llm_fn is None:
+        answer = "123"
+    else:
+        answer = llm_fn(build_prompt(question, passages, role))
+    timings["llm"] = time.perf_counter() - t0
+
+    if answer_cache is not None:
+        answer_cache.store(role, collection_name, question, query_embedding["vector"], passages, answer)
+    return result(answer, False)
+
+
+async def answer_question_async(
+    client: MilvusClient,
+    question: str,
+    role: str,
+    embed_fn,
+    collection_map,
+    top_k: int = 5,
+    async_single_flight=None,
+    **kwargs):
+    """
+    Async variant of answer_question (runs it in a worker thread).
+    async_single_flight: optional AsyncSingleFlight to coalesce identical
+    concurrent requests on the event loop.
+    """
+    def run():
+        return asyncio.to_thread(
+            answer_question, client, question, role, embed_fn, collection_map, top_k=top_k, **kwargs
+        )
+
+    if async_single_flight is None:
+        return await run()
+    key = _flight_key(role, question, top_k, kwargs.get("options") or SearchOptions())
+    result = await async_single_flight.do(key, run)
+    return dict(result)
 
 
 def prep_embedding(embed_fn, collection_map):
@@ -180,13 +526,43 @@ def prep_embedding(embed_fn, collection_map):
     }
 
 
-def ensure_collection(client: MilvusClient, collection_name: str, dim: int):
+# bytes of chunk text a collection's VARCHAR text field holds (without a text store)
+TEXT_MAX_LENGTH = 2048
+
+
+def ensure_collection(
+    client: MilvusClient,
+    collection_name: str,
+    dim: int,
+    vector_storage: str = "float32",
+    index_type: Optional[str] = None,
+    index_params: Optional[Dict] = None,
+    store_text: bool = True,
+    scalar_indexes: Optional[Dict[str, str]] = None,
+    mmap_fields: Iterable[str] = (),
+):
     """
     Create collection if it does not exist, then create a simple FLAT index
-    on the embedding field (works well on IBM Milvus).
+    on the embedding field (works well on IBM Milvus) and scalar indexes on
+    offering_id and source for filtered searches.
+
+    vector_storage: "float32" (default), "float16", "bfloat16" or "binary".
+    Binary vectors get a BIN_FLAT index with the HAMMING metric.
+    index_type / index_params: override the FLAT default (e.g. "IVF_FLAT",
+    {"nlist": 1024}); search params for it can be tuned with tuning.py.
+    store_text: False leaves out the text field (chunk text then lives in a
+    text_store.ChunkTextStore).
+    scalar_indexes: {field: index type}, default filters.SCALAR_INDEXES; an
+    existing collection gets the ones it is missing.
+    mmap_fields: fields served memory-mapped from disk instead of held in
+    query-node memory (e.g. ["text", "embedding"]; for embedding also its
+    index). Applies to new collections; use a reindex for existing ones.
     """
-    if client.has_collection(collection_name):
+    mmap_fields = set(mmap_fields)
+    scalar_indexes = SCALAR_INDEXES if scalar_indexes is None else scalar_indexes
+    if collection_exists(client, collection_name):
         print(f"Collection '{collection_name}' already exists.")
+        ensure_scalar_indexes(client, collection_name, scalar_indexes)
         return
 
     # 1. Define schema
@@ -207,16 +583,19 @@ def ensure_collection(client: MilvusClient, collection_name: str, dim: int):
         max_length=256,
     )
 
-    schema.add_field(
-        field_name="text",
-        datatype=DataType.VARCHAR,
-        max_length=2048,
-    )
+    if store_text:
+        schema.add_field(
+            field_name="text",
+            datatype=DataType.VARCHAR,
+            max_length=TEXT_MAX_LENGTH,
+            **({"mmap_enabled": True} if "text" in mmap_fields else {}),
+        )
 
     schema.add_field(
         field_name="embedding",
-        datatype=DataType.FLOAT_VECTOR,
+        datatype=vector_datatype(vector_storage),
         dim=dim,
+        **({"mmap_enabled": True} if "embedding" in mmap_fields else {}),
     )
 
     schema.add_field(
@@ -231,22 +610,53 @@ def ensure_collection(client: MilvusClient, collection_name: str, dim: int):
         collection_name=collection_name,
         schema=schema,
     )
-    print(f"Created collection '{collection_name}'.")
+    print(f"Created collection '{collection_name}'" + (f" (mmap: {sorted(mmap_fields)})." if mmap_fields else "."))
 
     # 3. Create index on embedding field
-    index_params = client.prepare_index_params()
-    index_params.add_index(
+    spec = index_spec(vector_storage)
+    index_type = index_type or spec["index_type"]
+    milvus_index_params = client.prepare_index_params()
+    milvus_index_params.add_index(
         field_name="embedding",
-        index_type="FLAT",      # safe + supported everywhere
-        metric_type="COSINE",   # good for sentence-transformers
-        # no extra params needed for FLAT
+        index_type=index_type,            # FLAT / BIN_FLAT: safe + supported everywhere
+        metric_type=spec["metric_type"],  # COSINE for float vectors, HAMMING for binary
+        params={**(index_params or {}),   # no extra params needed for FLAT
+                **({"mmap.enabled": "true"} if "embedding" in mmap_fields else {})},
     )
+    for field, scalar_index_type in scalar_indexes.items():
+        milvus_index_params.add_index(field_name=field, index_type=scalar_index_type, index_name=field)
 
     client.create_index(
         collection_name=collection_name,
-        index_params=index_params,
+        index_params=milvus_index_params,
     )
-    print(f"Created FLAT index on '{collection_name}.embedding'.")
+    invalidate_metadata(collection_name)
+    print(f"Created {index_type} index on '{collection_name}.embedding' ({vector_storage}).")
+    if scalar_indexes:
+        print(f"Created scalar indexes on '{collection_name}': {scalar_indexes}")
+
+
+def ensure_scalar_indexes(
+    client: MilvusClient,
+    collection_name: str,
+    scalar_indexes: Optional[Dict[str, str]] = None,
+) -> List[str]:
+    """Create the scalar indexes a collection is missing; returns the indexed fields."""
+    scalar_indexes = SCALAR_INDEXES if scalar_indexes is None else scalar_indexes
+    meta = collection_meta(client, collection_name)
+    missing = {
+        field: index_type for field, index_type in scalar_indexes.items()
+        if field in meta["fields"] and field not in meta["scalar_indexes"]
+    }
+    if not missing:
+        return []
+    milvus_index_params = client.prepare_index_params()
+    for field, index_type in missing.items():
+        milvus_index_params.add_index(field_name=field, index_type=index_type, index_name=field)
+    client.create_index(collection_name=collection_name, index_params=milvus_index_params)
+    invalidate_metadata(collection_name)
+    print(f"Created scalar indexes on '{collection_name}': {missing}")
+    return list(missing)
 
 
 
@@ -257,34 +667,162 @@ def ingest_pdf_to_collection(
     pdf_path: str,
     offering_id: str,
     model,
+    vector_storage: str = "float32",
+    reduce_dim: int = 0,
+    projection_dir: Optional[str] = None,
+    pca_sample_size: int = 10000,
+    pca_whiten: bool = False,
+    pca_min_samples: Optional[int] = None,
+    dedup: Optional[Dict] = None,
+    dedup_dir: Optional[str] = None,
+    text_store=None,
+    small_to_big: Optional[Dict] = None,
+    parent_store=None,
+    page_cache=None,
+    routing_dir: Optional[str] = None,
+    routing_centroids: int = DEFAULT_ROUTING["n_centroids"],
+    chunking: Optional[Dict] = None,
 ):
-    """Load a PDF, chunk it, embed, and insert into the given collection (with debug prints)."""
+    """
+    Load a PDF, chunk it, embed, and insert into the given collection (with debug prints).
+
+    With reduce_dim > 0 the embeddings are projected to reduce_dim dimensions.
+    The projection is fitted on the first ingest into the collection and saved
+    under projection_dir; later ingests reuse it. The first ingest must
+    bring at least pca_min_samples chunks (default 4 * reduce_dim), else it
+    raises; use reproject_collection() to refit on all rows once the
+    collection has grown.
+
+    dedup: per-collection near-duplicate settings (see dedup.DEFAULT_DEDUP).
+    When enabled, duplicate chunks are dropped before embedding and logged
+    under dedup_dir with the row they duplicate.
+
+    text_store: ChunkTextStore to keep chunk text in instead of Milvus (the
+    collection must have been created with store_text=False).
+
+    small_to_big: settings (see small_to_big.DEFAULT_SMALL_TO_BIG); when
+    enabled, sentence-level child chunks are embedded and their parent
+    windows are stored in parent_store (a ChunkTextStore).
+
+    page_cache: PageTextCache to read extracted page text from, so
+    re-ingesting an unchanged PDF (e.g. with other chunk sizes) skips pypdf.
+
+    chunking: chunk_text settings ({"max_tokens", "overlap"}, see
+    DEFAULT_CHUNKING) for flat (non small-to-big) chunks.
+
+    routing_dir: when given, the new chunk embeddings are folded into the
+    collection's routing summary (routing_centroids k-means centroids, see
+    routing.py) used to route fan-out queries.
+
+    Returns a write token (see consistency.write_token) to pass as
+    read_token to searches that must see the new rows, or None if nothing
+    was inserted.
+    """
     print(f"\nIngesting '{pdf_path}' into collection '{collection_name}' for offering_id='{offering_id}'")
     t0 = time.time()
+    state_name = resolve_collection(client, collection_name)  # physical name behind an alias
 
     # 1. Read PDF
     print("  [1] Reading PDF...")
-    full_text = load_pdf_text(pdf_path)
+    full_text = load_pdf_text(pdf_path, page_cache)
     print(f"      PDF length (chars): {len(full_text)}")
 
     # 2. Chunk
     print("  [2] Chunking text...")
-    chunks = chunk_text(full_text, max_tokens=256, overlap=20)
-    print(f"      Number of chunks: {len(chunks)}")
+    small_to_big = {**DEFAULT_SMALL_TO_BIG, **(small_to_big or {})}
+    if small_to_big["enabled"]:
+        if parent_store is None:
+            raise ValueError("small_to_big needs a parent_store to keep the parent windows in.")
+        parents = build_hierarchy(full_text, small_to_big["parent_tokens"], small_to_big["child_tokens"])
+        chunks = [unit for units in parents for unit in units]
+        labels = [child_label(p, c) for p, units in enumerate(parents) for c in range(len(units))]
+        print(f"      Number of chunks: {len(chunks)} children in {len(parents)} parent windows")
+    else:
+        chunking = {**DEFAULT_CHUNKING, **(chunking or {})}
+        chunks = chunk_text(full_text, max_tokens=chunking["max_tokens"], overlap=chunking["overlap"])
+        labels = list(range(len(chunks)))
+        print(f"      Number of chunks: {len(chunks)}")
     if len(chunks) == 0:
         print("      WARNING: no chunks produced, skipping insert.")
-        return
+        return None
+
+    # 2b. Near-duplicate elimination
+    chunk_ids = list(range(len(chunks)))
+    cached_embeddings = {}
+    dedup = {**DEFAULT_DEDUP, **(dedup or {})}
+    if dedup["enabled"]:
+        if not dedup_dir:
+            raise ValueError("dedup needs a dedup_dir to store its state in.")
+        print("  [2b] Removing near-duplicate chunks...")
+        dedup_state = load_dedup_state(dedup_dir, state_name)
+        dedup_result = find_near_duplicates(
+            chunks,
+            existing=dedup_state,
+            embed_fn=lambda texts: embed_chunks(model, texts),
+            threshold=dedup["threshold"],
+            cosine_threshold=dedup["cosine_threshold"],
+            num_perm=dedup["num_perm"],
+            bands=dedup["bands"],
+            shingle_size=dedup["shingle_size"],
+            max_bucket_compare=dedup["max_bucket_compare"],
+        )
+        chunk_ids = dedup_result["keep"]
+        cached_embeddings = dedup_result["embeddings"]
+        print(f"      Dropped {len(dedup_result['duplicates'])} near-duplicates, {len(chunk_ids)} chunks left")
+        if not chunk_ids:
+            print("      WARNING: every chunk is a duplicate, skipping insert.")
+            record_dedup_ingest(
+                dedup_dir, state_name, dedup_state, dedup_result,
+                kept_ids=[], kept_sources=[], kept_embeddings=[],
+                chunk_sources=[chunk_source(pdf_path, label) for label in labels],
+            )
+            return None
 
     # 3. Embeddings
     print("  [3] Embedding chunks...")
     t_embed_start = time.time()
-    embeddings = embed_chunks(model, chunks)
-    print(f"      Generated {len(embeddings)} embeddings in {time.time() - t_embed_start:.2f} s")
+    to_embed = [i for i in chunk_ids if i not in cached_embeddings]
+    fresh = dict(zip(to_embed, embed_chunks(model, [chunks[i] for i in to_embed]))) if to_embed else {}
+    embeddings = [cached_embeddings[i] if i in cached_embeddings else fresh[i] for i in chunk_ids]
+    model_embeddings = embeddings
+    print(f"      Generated {len(fresh)} embeddings in {time.time() - t_embed_start:.2f} s")
+    if reduce_dim:
+        if not projection_dir:
+            raise ValueError("reduce_dim needs a projection_dir to store the projection in.")
+        projection = load_projection(projection_dir, state_name)
+        if projection is None:
+            min_samples = pca_min_samples or 4 * reduce_dim
+            if len(embeddings) < min_samples:
+                raise ValueError(
+                    f"Only {len(embeddings)} chunks to fit a {reduce_dim}-dim projection for "
+                    f"'{collection_name}' (need {min_samples}); ingest a larger first document "
+                    f"or lower reduce_dim."
+                )
+            projection = fit_projection(
+                embeddings, reduce_dim, whiten=pca_whiten, max_samples=pca_sample_size,
+                min_samples=min_samples,
+            )
+            path = save_projection(projection_dir, state_name, projection)
+            print(f"      Fitted PCA projection to {reduce_dim} dims "
+                  f"(explained variance {projection['explained_variance_ratio']:.3f}) -> {path}")
+        elif projection["weights"].shape[1] != reduce_dim:
+            raise ValueError(
+                f"Stored projection for '{collection_name}' has {projection['weights'].shape[1]} dims, "
+                f"expected {reduce_dim}."
+            )
+        embeddings = apply_projection(embeddings, projection).tolist()
+    if vector_storage != "float32":
+        embeddings = quantize_embeddings(embeddings, vector_storage)
+        print(f"      Quantized embeddings to {vector_storage}")
 
     # 4. Build rows
     print("  [4] Building insert payload...")
     #rows = build_insert_payload(offering_id, chunks, embeddings)
-    rows = build_insert_payload(offering_id, chunks, embeddings, source=pdf_path)
+    kept_chunks = [chunks[i] for i in chunk_ids]
+    rows = build_insert_payload(
+        offering_id, kept_chunks, embeddings, source=pdf_path, chunk_ids=[labels[i] for i in chunk_ids],
+        include_text=text_store is None,
+    )
 
     print(f"      Rows to insert: {len(rows)}")
 
@@ -298,6 +836,28 @@ def ingest_pdf_to_collection(
         # timeout=60,
     )
     print(f"      Insert done in {time.time() - t_ins_start:.2f} s")
+    token = write_token(collection_name, res)
+    if text_store is not None:
+        text_store.put_many(state_name, res["ids"], kept_chunks)
+        print(f"      Stored {len(kept_chunks)} chunk texts in {text_store.path}")
+    if small_to_big["enabled"]:
+        store_parents(parent_store, state_name, pdf_path, parents)
+        print(f"      Stored {len(parents)} parent windows in {parent_store.path}")
+    if routing_dir:
+        summary = update_summary(routing_dir, state_name, model_embeddings, routing_centroids)
+        print(f"      Updated routing summary ({len(summary['centroids'])} centroids) in {routing_dir}")
+
+    if dedup["enabled"]:
+        record_dedup_ingest(
+            dedup_dir,
+            state_name,
+            dedup_state,
+            dedup_result,
+            kept_ids=list(res["ids"]),
+            kept_sources=[r["source"] for r in rows],
+            kept_embeddings=model_embeddings if dedup["cosine_threshold"] is not None else [],
+            chunk_sources=[chunk_source(pdf_path, label) for label in labels],
+        )
     print(f"  [✓] Ingestion completed in {time.time() - t0:.2f} s")
 
     # Optional: print a tiny summary of res
@@ -305,10 +865,128 @@ def ingest_pdf_to_collection(
         print("      Insert response keys:", list(res.keys()))
     except Exception:
         pass
+    return token
 
 
-def load_pdf_text(pdf_path: str) -> str:
-    """Read PDF and return the full concatenated text."""
+def _iterate_rows(client: MilvusClient, collection_name: str, meta: Dict, text_store, batch_size: int, expr: str = ""):
+    # batches of rows (id + scalars + text), texts filled from text_store if needed
+    state_name = meta["physical_name"]
+    iterator = client.query_iterator(
+        collection_name=collection_name, batch_size=batch_size, filter=expr,
+        output_fields=output_fields_for(meta, ["offering_id", "text", "source"]),
+    )
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            if text_store is not None and "text" not in meta["fields"]:
+                text_store.fill_texts(state_name, batch)
+            yield batch
+    finally:
+        iterator.close()
+
+
+def reproject_collection(
+    client: MilvusClient,
+    collection_name: str,
+    model,
+    projection_dir: str,
+    reduce_dim: Optional[int] = None,
+    pca_sample_size: int = 10000,
+    pca_whiten: bool = False,
+    pca_min_samples: Optional[int] = None,
+    text_store=None,
+    dedup_dir: Optional[str] = None,
+    batch_size: int = 1000,
+) -> Dict:
+    """
+    Refit the collection's PCA projection on its rows and rewrite their
+    vectors with upsert. Stored vectors are already projected, so the chunk
+    texts (from the text field or text_store) are embedded again, batch by
+    batch: a first pass fits on a sample of at most pca_sample_size rows, a
+    second pass re-embeds, projects and upserts each batch. reduce_dim
+    defaults to the collection's stored dim; pca_min_samples to 4 * reduce_dim.
+
+    Servers that assign new auto_id keys on upsert return them; the text
+    store rows and dedup state (keyed by primary key) are moved to the new
+    ids. Parent windows and routing summaries are not keyed by id.
+
+    Searches running during the rewrite mix old and new vectors; run it
+    in a quiet period. Returns the row count, the fit quality, the
+    projection path, the number of remapped ids and a write token.
+    """
+    meta = ensure_loaded(client, collection_name)
+    state_name = meta["physical_name"]
+    vector_storage = meta["vector_storage"] or "float32"
+    reduce_dim = reduce_dim or meta["dim"]
+    min_samples = pca_min_samples or 4 * reduce_dim
+
+    # pass 1: reservoir sample of texts to fit on
+    rng = random.Random(0)
+    sample: List[str] = []
+    n_rows, max_id = 0, None
+    for batch in _iterate_rows(client, collection_name, meta, text_store, batch_size):
+        for row in batch:
+            if len(sample) < pca_sample_size:
+                sample.append(row.get("text") or "")
+            else:
+                j = rng.randint(0, n_rows)
+                if j < pca_sample_size:
+                    sample[j] = row.get("text") or ""
+            n_rows += 1
+            max_id = row["id"] if max_id is None else max(max_id, row["id"])
+    if n_rows < min_samples:
+        raise ValueError(
+            f"'{collection_name}' has {n_rows} rows; refitting a {reduce_dim}-dim projection "
+            f"needs {min_samples} (pca_min_samples)."
+        )
+    print(f"[Reproject] Fitting on {len(sample)} of {n_rows} rows of '{collection_name}'...")
+    projection = fit_projection(
+        embed_chunks(model, sample), reduce_dim, whiten=pca_whiten, min_samples=min(min_samples, len(sample)),
+    )
+    del sample
+
+    # pass 2: rewrite batch by batch; rows upserted under new ids (> max_id) are not revisited
+    remapped: Dict[int, int] = {}
+    result = None
+    for batch in _iterate_rows(client, collection_name, meta, text_store, batch_size, expr=f"id <= {max_id}"):
+        texts = [r.get("text") or "" for r in batch]
+        vectors = apply_projection(embed_chunks(model, texts), projection).tolist()
+        if vector_storage != "float32":
+            vectors = quantize_embeddings(vectors, vector_storage)
+        result = client.upsert(
+            collection_name=collection_name,
+            data=[
+                {**{k: v for k, v in r.items() if k in meta["fields"]}, "embedding": v}
+                for r, v in zip(batch, vectors)
+            ],
+        )
+        moved = {int(r["id"]): int(new) for r, new in zip(batch, result.get("ids") or []) if int(new) != int(r["id"])}
+        if moved and text_store is not None and "text" not in meta["fields"]:
+            text_store.put_many(state_name, moved.values(), [t for r, t in zip(batch, texts) if int(r["id"]) in moved])
+            text_store.delete_many(state_name, moved.keys())
+        remapped.update(moved)
+    if remapped and dedup_dir:
+        remap_dedup_ids(dedup_dir, state_name, remapped)
+
+    path = save_projection(projection_dir, state_name, projection)
+    print(f"[Reproject] Refitted projection on {n_rows} rows "
+          f"(explained variance {projection['explained_variance_ratio']:.3f}, "
+          f"{len(remapped)} ids reassigned) -> {path}")
+    return {
+        "rows": n_rows,
+        "explained_variance_ratio": projection["explained_variance_ratio"],
+        "path": path,
+        "remapped_ids": len(remapped),
+        "token": write_token(collection_name, result),
+    }
+
+
+def load_pdf_text(pdf_path: str, page_cache=None) -> str:
+    """Read PDF and return the full concatenated text (via page_cache if given)."""
+    if page_cache is not None:
+        return page_cache.load_text(pdf_path)[0]
     reader = PdfReader(pdf_path)
     pages_text = []
     for page in reader.pages:
@@ -316,6 +994,9 @@ def load_pdf_text(pdf_path: str) -> str:
         pages_text.append(text)
     return "\n".join(pages_text)
 
+DEFAULT_CHUNKING = {"max_tokens": 256, "overlap": 20}
+
+
 def chunk_text(text: str, max_tokens: int = 256, overlap: int = 20) -> list[str]:
     """
     Simple, safe chunking:
@@ -378,25 +1059,33 @@ def embed_chunks(model, chunks: List[str]) -> List[List[float]]:
 def build_insert_payload(
     offering_id: str,
     chunks: List[str],
-    embeddings: List[List[float]],
+    embeddings: List,
     source: str,
+    chunk_ids: Optional[List] = None,
+    include_text: bool = True,
 ) -> List[Dict]:
     """
     Build Milvus insert payload: one dict per row, with fields matching schema.
+    chunk_ids keeps the original chunk positions (or small-to-big labels) in
+    `source` when some chunks were dropped (e.g. as duplicates). include_text=False leaves the text
+    out (it goes to an external text store).
     """
     assert len(chunks) == len(embeddings), "Chunks and embeddings length mismatch"
+    if chunk_ids is None:
+        chunk_ids = list(range(len(chunks)))
 
     rows = []
-    for i, (chunk, emb) in enumerate(zip(chunks, embeddings)):
-        rows.append(
-            {
-                # 'id' is auto_id=True, so we do NOT provide it
-                "offering_id": offering_id,
-                "text": chunk,
-                "embedding": emb,
-                "source": f"{source}#chunk={i}",
-            }
-        )
+    for i, chunk, emb in zip(chunk_ids, chunks, embeddings):
+        row = {
+            # 'id' is auto_id=True, so we do NOT provide it
+            "offering_id": offering_id,
+            "text": chunk,
+            "embedding": emb,
+            "source": chunk_source(source, i),
+        }
+        if not include_text:
+            del row["text"]
+        rows.append(row)
 
     return rows
 
@@ -0,0 +1,113 @@
+# range_search.py
+"""
+Score-threshold (range) search with an adaptive cut-off.
+
+Instead of always returning top_k hits, a range search returns at most
+top_k hits that are better than a threshold, and then stops at the first
+large score gap, so a precise question yields one or two passages and a
+broad one still gets up to top_k.
+
+Settings (a dict, see config.RANGE_SEARCH):
+    threshold  worst score kept, in the collection's metric: minimum
+               similarity for COSINE / IP, maximum distance for L2 / HAMMING
+               (bits). A number, or a dict per metric, e.g.
+               {"COSINE": 0.3, "HAMMING": 120}; a metric missing from the
+               dict gets no threshold
+    best       optional best score kept (e.g. to drop exact self-matches),
+               a number or a dict per metric like threshold
+    rescore_threshold
+               minimum cosine similarity kept after rescoring (compact
+               storage with a rescore factor); None = no cut-off
+    max_gap    stop at the first gap between consecutive scores >= max_gap
+               (None = no gap cut-off)
+    min_hits   the gap cut-off never leaves fewer hits than this
+
+threshold / best always filter in the stored metric (pushed to Milvus as
+radius / range_filter). Rescored hits carry cosine similarities against the
+float32 query instead, which a HAMMING or L2 threshold cannot be compared
+with, so they are cut by rescore_threshold; max_gap then applies to those
+cosine scores.
+"""
+from typing import Dict, List, Optional
+
+
+# metrics where a larger score is a better match
+SIMILARITY_METRICS = ("COSINE", "IP")
+DISTANCE_METRICS = ("L2", "HAMMING", "JACCARD")
+
+_SETTINGS_PER_METRIC = ("threshold", "best")
+
+DEFAULT_RANGE = {"threshold": None, "best": None, "rescore_threshold": None, "max_gap": None, "min_hits": 1}
+
+
+def higher_is_better(metric_type: str) -> bool:
+    if metric_type in SIMILARITY_METRICS:
+        return True
+    if metric_type in DISTANCE_METRICS:
+        return False
+    raise ValueError(f"Unsupported metric '{metric_type}' for range search")
+
+
+def settings_for_metric(metric_type: str, settings: Dict) -> Dict:
+    """
+    Settings with threshold / best resolved for metric_type. A HAMMING
+    threshold below 1 bit (a similarity-scale value such as 0.3) is
+    rejected: it would only keep exact matches.
+    """
+    higher_is_better(metric_type)
+    out = {**DEFAULT_RANGE, **settings}
+    for key in _SETTINGS_PER_METRIC:
+        if isinstance(out[key], dict):
+            out[key] = out[key].get(metric_type)
+    if metric_type == "HAMMING" and out["threshold"] is not None and out["threshold"] < 1:
+        raise ValueError(
+            f"Range threshold {out['threshold']} is below 1 bit for a HAMMING collection "
+            f"(it looks like a similarity); set a bit count, e.g. threshold={{'HAMMING': 120}}."
+        )
+    return out
+
+
+def range_params(metric_type: str, settings: Dict) -> Dict:
+    """
+    radius / range_filter search params. Milvus keeps
+    radius < score <= range_filter for similarities and
+    range_filter <= distance < radius for distances, so the threshold is
+    the radius in both cases.
+    """
+    settings = settings_for_metric(metric_type, settings)
+    params = {}
+    if settings.get("threshold") is not None:
+        params["radius"] = settings["threshold"]
+    if settings.get("best") is not None:
+        params["range_filter"] = settings["best"]
+    return params
+
+
+def apply_range(hits: List[Dict], metric_type: str, settings: Dict, rescored: bool = False) -> List[Dict]:
+    """
+    Keep hits within the threshold, then cut at the first score gap of at
+    least max_gap. Hits must be sorted best first (as search returns them).
+    rescored: the scores are cosine rescores, cut at rescore_threshold.
+    """
+    settings = settings_for_metric(metric_type, settings)
+    if rescored:
+        metric_type = "COSINE"
+        threshold, best = settings["rescore_threshold"], None
+    else:
+        threshold, best = settings["threshold"], settings["best"]
+    better = higher_is_better(metric_type)
+
+    def within(score: float) -> bool:
+        if better:
+            return (threshold is None or score > threshold) and (best is None or score <= best)
+        return (threshold is None or score < threshold) and (best is None or score >= best)
+
+    kept = [h for h in hits if h.get("score") is not None and within(h["score"])]
+
+    max_gap: Optional[float] = settings["max_gap"]
+    if max_gap is None:
+        return kept
+    for i in range(max(settings["min_hits"], 1), len(kept)):
+        if abs(kept[i - 1]["score"] - kept[i]["score"]) >= max_gap:
+            return kept[:i]
+    return kept
@@ -0,0 +1,424 @@
+# reindex.py
+"""
+Blue/green reindexing behind Milvus collection aliases.
+
+The names in COLLECTION_MAP are aliases. Each reindex builds a new physical
+collection `<alias>__v<N>` while the alias keeps serving the current one,
+validates it (row count, recall of its index on a sample of stored rows,
+optionally shadow queries against the live version), and only then
+repoints the alias with alter_alias, which is atomic. The previous target
+is kept so the switch can be rolled back.
+
+Per-collection state files (projection, dedup, tuning) are keyed by the
+physical name; use resolve_collection() to map an alias to it.
+"""
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from pymilvus import MilvusClient
+
+from quantization import decode_vectors
+from tuning import sample_pseudo_queries, exact_ground_truth, row_count, vector_dim, describe_vector_index
+from consistency import consistency_kwargs
+from metadata import collection_meta, ensure_loaded, invalidate_metadata
+
+
+VERSION_SEP = "__v"
+LEGACY_VERSION = 0  # a pre-alias collection is renamed to <alias>__v0
+
+def versioned_name(alias: str, version: int) -> str:
+    return f"{alias}{VERSION_SEP}{version}"
+
+
+def list_versions(client: MilvusClient, alias: str) -> List[int]:
+    pattern = re.compile(re.escape(alias + VERSION_SEP) + r"(\d+)$")
+    matches = (pattern.match(name) for name in client.list_collections())
+    return sorted(int(m.group(1)) for m in matches if m)
+
+
+def is_alias(client: MilvusClient, name: str) -> bool:
+    return name in client.list_aliases().get("aliases", [])
+
+
+def resolve_collection(client: MilvusClient, name: str, refresh: bool = False) -> str:
+    """Physical collection behind `name` (itself if it is not an alias), from the metadata cache."""
+    if refresh:
+        invalidate_metadata(name)
+    try:
+        return collection_meta(client, name)["physical_name"]
+    except Exception:
+        return name  # not created yet
+
+
+# ---------- history (for rollback) ----------
+
+def _history_path(reindex_dir: str, alias: str) -> str:
+    return os.path.join(reindex_dir, f"{alias}.json")
+
+
+def load_history(reindex_dir: str, alias: str) -> Dict:
+    path = _history_path(reindex_dir, alias)
+    if not os.path.exists(path):
+        return {"alias": alias, "current": None, "previous": [], "events": []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_history(reindex_dir: str, history: Dict) -> None:
+    os.makedirs(reindex_dir, exist_ok=True)
+    with open(_history_path(reindex_dir, history["alias"]), "w") as f:
+        json.dump(history, f, indent=2)
+
+
+# ---------- build / validate / compare ----------
+
+def build_version(client: MilvusClient, alias: str, build_fn: Callable[[str], None]) -> str:
+    """
+    Create the next version of `alias`. build_fn(physical_name) must create,
+    index, load and fill the collection (e.g. ensure_collection + ingest).
+    """
+    existing = list_versions(client, alias)
+    name = versioned_name(alias, (existing[-1] if existing else 0) + 1)
+    print(f"[Reindex] Building '{name}' for alias '{alias}'...")
+    t0 = time.perf_counter()
+    build_fn(name)
+    print(f"[Reindex] Built '{name}' in {time.perf_counter() - t0:.1f} s")
+    return name
+
+
+def sample_recall(
+    client: MilvusClient,
+    collection_name: str,
+    vector_storage: str = "float32",
+    top_k: int = 5,
+    n_queries: int = 50,
+    search_params: Optional[Dict] = None,
+) -> float:
+    """recall@top_k of the collection's index for stored rows used as queries."""
+    index = describe_vector_index(client, collection_name)
+    metric_type = index.get("metric_type", "COSINE")
+    sample = sample_pseudo_queries(client, collection_name, n_queries)
+    if not sample["raw"]:
+        return 0.0
+    queries = decode_vectors(sample["raw"], vector_storage, vector_dim(client, collection_name))
+    truth = exact_ground_truth(
+        client, collection_name, queries,
+        "IP" if metric_type == "HAMMING" else metric_type,
+        vector_storage, top_k, sample["ids"],
+    )
+    res = client.search(
+        collection_name=collection_name,
+        data=sample["raw"],
+        anns_field="embedding",
+        limit=top_k + 1,
+        search_params={"metric_type": metric_type, "params": search_params or {}},
+        **consistency_kwargs(collection_name, "Strong"),
+    )
+    hits = 0
+    for qi, q_hits in enumerate(res):
+        found = [h["id"] for h in q_hits if h["id"] != sample["ids"][qi]][:top_k]
+        hits += len(set(found) & set(truth[qi]))
+    return hits / max(sum(len(t) for t in truth), 1)
+
+
+def validate_version(
+    client: MilvusClient,
+    candidate: str,
+    baseline: Optional[str] = None,
+    min_count_ratio: float = 0.9,
+    min_recall: float = 0.9,
+    vector_storage: str = "float32",
+    top_k: int = 5,
+    n_queries: int = 50,
+    search_params: Optional[Dict] = None,
+) -> Dict:
+    """
+    Checks before a cutover: the candidate is not empty, has at least
+    min_count_ratio of the baseline's rows, and its index reaches min_recall.
+    """
+    rows = row_count(client, candidate)
+    baseline_rows = row_count(client, baseline) if baseline else None
+    recall = sample_recall(client, candidate, vector_storage, top_k, n_queries, search_params) if rows else 0.0
+
+    reasons = []
+    if rows == 0:
+        reasons.append("candidate is empty")
+    if baseline_rows and rows < baseline_rows * min_count_ratio:
+        reasons.append(f"{rows} rows < {min_count_ratio:.0%} of baseline {baseline_rows}")
+    if rows and recall < min_recall:
+        reasons.append(f"recall@{top_k} {recall:.3f} < {min_recall}")
+    return {
+        "ok": not reasons,
+        "candidate": candidate,
+        "baseline": baseline,
+        "rows": rows,
+        "baseline_rows": baseline_rows,
+        "recall": round(recall, 4),
+        "reasons": reasons,
+    }
+
+
+def shadow_compare(
+    baseline: str,
+    candidate: str,
+    questions: List[str],
+    search_fn: Callable[[str, str], List[Dict]],
+    top_k: int = 5,
+) -> Dict:
+    """
+    Run the same questions against both versions. search_fn(collection_name,
+    question) returns hits with a "source" field; overlap (share of the
+    baseline's top-k also returned by the candidate) is measured on sources
+    because ids differ between collections.
+    """
+    latency = {"baseline": [], "candidate": []}
+    overlaps = []
+    for q in questions:
+        sources = {}
+        for side, name in (("baseline", baseline), ("candidate", candidate)):
+            t0 = time.perf_counter()
+            hits = search_fn(name, q)[:top_k]
+            latency[side].append((time.perf_counter() - t0) * 1000)
+            sources[side] = {h.get("source") for h in hits}
+        overlaps.append(len(sources["baseline"] & sources["candidate"]) / max(len(sources["baseline"]), 1))
+
+    def pct(values, p):
+        return round(float(np.percentile(values, p)), 2) if values else None
+
+    return {
+        "questions": len(questions),
+        "overlap_at_k": round(float(np.mean(overlaps)), 4) if overlaps else None,
+        "min_overlap_at_k": round(float(np.min(overlaps)), 4) if overlaps else None,
+        "latency_ms": {
+            side: {"p50": pct(values, 50), "p95": pct(values, 95)} for side, values in latency.items()
+        },
+    }
+
+
+# ---------- cutover / rollback ----------
+
+def switch_alias(
+    client: MilvusClient,
+    alias: str,
+    target: str,
+    reindex_dir: str,
+    note: Optional[Dict] = None,
+    replace_legacy: bool = False,
+    on_legacy_rename: Optional[Callable[[str, str], None]] = None,
+) -> Optional[str]:
+    """
+    Point `alias` at `target` and return the previous target.
+
+    A plain collection named like the alias (created before aliases were
+    used) blocks the alias; with replace_legacy=True it is renamed to
+    <alias>__v0 and kept as the previous version, so it can be rolled back
+    to and is garbage-collected like any other version.
+    on_legacy_rename(old, new) is called after that rename to move
+    per-collection state (keyed by physical name). The one-time migration
+    has a short window in which the name resolves to nothing.
+    """
+    previous = None
+    if is_alias(client, alias):
+        previous = resolve_collection(client, alias, refresh=True)
+        client.alter_alias(collection_name=target, alias=alias)
+    else:
+        if client.has_collection(alias):
+            if not replace_legacy:
+                raise ValueError(
+                    f"'{alias}' is a collection, not an alias; pass replace_legacy=True to replace it."
+                )
+            previous = versioned_name(alias, LEGACY_VERSION)
+            client.rename_collection(alias, previous)
+            invalidate_metadata(alias)
+            invalidate_metadata(previous)
+            if on_legacy_rename is not None:
+                on_legacy_rename(alias, previous)
+        client.create_alias(collection_name=target, alias=alias)
+    invalidate_metadata(alias)
+
+    history = load_history(reindex_dir, alias)
+    if previous:
+        history["previous"].append(previous)
+    history["current"] = target
+    history["events"].append({
+        "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "action": "switch",
+        "from": previous,
+        "to": target,
+        **({"note": note} if note else {}),
+    })
+    _save_history(reindex_dir, history)
+    print(f"[Reindex] Alias '{alias}': {previous} -> {target}")
+    return previous
+
+
+def rollback(client: MilvusClient, alias: str, reindex_dir: str) -> str:
+    """Point `alias` back at the version it served before the last switch."""
+    history = load_history(reindex_dir, alias)
+    while history["previous"]:
+        target = history["previous"].pop()
+        if client.has_collection(target):
+            break
+    else:
+        raise ValueError(f"No previous version of '{alias}' left to roll back to.")
+
+    current = resolve_collection(client, alias, refresh=True)
+    ensure_loaded(client, target)  # may have been released (e.g. by the legacy rename)
+    client.alter_alias(collection_name=target, alias=alias)
+    invalidate_metadata(alias)
+    history["current"] = target
+    history["events"].append({
+        "at": time.strftime("%Y-%m-%dT%H:%M:%S"), "action": "rollback", "from": current, "to": target,
+    })
+    _save_history(reindex_dir, history)
+    print(f"[Reindex] Alias '{alias}' rolled back: {current} -> {target}")
+    return target
+
+
+def drop_old_versions(client: MilvusClient, alias: str, reindex_dir: str, keep: int = 2) -> List[str]:
+    """Drop versions other than the current one and the newest keep-1 previous ones."""
+    history = load_history(reindex_dir, alias)
+    protected = {history["current"], *history["previous"][-(keep - 1):]} if keep > 1 else {history["current"]}
+    dropped = []
+    for version in list_versions(client, alias):
+        name = versioned_name(alias, version)
+        if name not in protected:
+            client.drop_collection(name)
+            invalidate_metadata(name)
+            dropped.append(name)
+    history["previous"] = [p for p in history["previous"] if p not in dropped]
+    _save_history(reindex_dir, history)
+    return dropped
+
+
+def drop_alias_and_versions(client: MilvusClient, alias: str, reindex_dir: Optional[str] = None) -> List[str]:
+    """Remove the alias and every version behind it (used by "Drop collections")."""
+    if is_alias(client, alias):
+        client.drop_alias(alias)
+    invalidate_metadata(alias)
+    dropped = []
+    for version in list_versions(client, alias):
+        name = versioned_name(alias, version)
+        client.drop_collection(name)
+        invalidate_metadata(name)
+        dropped.append(name)
+    if reindex_dir and os.path.exists(_history_path(reindex_dir, alias)):
+        os.remove(_history_path(reindex_dir, alias))
+    return dropped
+
+
+def reindex(
+    client: MilvusClient,
+    alias: str,
+    build_fn: Callable[[str], None],
+    reindex_dir: str,
+    shadow_questions: Optional[List[str]] = None,
+    search_fn: Optional[Callable[[str, str], List[Dict]]] = None,
+    min_overlap: Optional[float] = None,
+    replace_legacy: bool = False,
+    on_legacy_rename: Optional[Callable[[str, str], None]] = None,
+    keep_versions: int = 2,
+    on_step: Optional[Callable[[str], None]] = None,
+    **validate_kwargs,
+) -> Dict:
+    """
+    Build, validate, (optionally) shadow-compare and switch one alias.
+    Nothing is switched if a check fails; the candidate is kept for
+    inspection. Returns a report of every step.
+
+    on_step: called with the name of each step as it starts (progress).
+    """
+    step = on_step or (lambda name: None)
+    baseline = resolve_collection(client, alias, refresh=True) if client.has_collection(alias) else None
+    step("building")
+    candidate = build_version(client, alias, build_fn)
+    report = {"alias": alias, "baseline": baseline, "candidate": candidate, "switched": False}
+
+    step("validating")
+    report["validation"] = validate_version(client, candidate, baseline, **validate_kwargs)
+    if not report["validation"]["ok"]:
+        print(f"[Reindex] '{candidate}' failed validation: {report['validation']['reasons']}")
+        return report
+
+    if baseline and shadow_questions and search_fn is not None:
+        step("shadow comparing")
+        report["shadow"] = shadow_compare(
+            baseline, candidate, shadow_questions, search_fn, validate_kwargs.get("top_k", 5)
+        )
+        if min_overlap is not None and report["shadow"]["overlap_at_k"] < min_overlap:
+            print(f"[Reindex] Shadow overlap {report['shadow']['overlap_at_k']} < {min_overlap}, not switching")
+            return report
+
+    step("switching")
+    switch_alias(
+        client, alias, candidate, reindex_dir,
+        note={"validation": report["validation"], "shadow": report.get("shadow")},
+        replace_legacy=replace_legacy,
+        on_legacy_rename=on_legacy_rename,
+    )
+    report["switched"] = True
+    report["dropped"] = drop_old_versions(client, alias, reindex_dir, keep=keep_versions)
+    return report
+
+
+# ---------- background jobs ----------
+
+class ReindexJob:
+    """Progress of a background reindex, read by the UI while it runs."""
+
+    def __init__(self, aliases: List[str]):
+        self.aliases = list(aliases)
+        self.steps: Dict[str, str] = {alias: "queued" for alias in self.aliases}
+        self.reports: Dict[str, Dict] = {}
+        self.errors: Dict[str, str] = {}
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.done = threading.Event()
+
+    def set_step(self, alias: str, step: str) -> None:
+        self.steps[alias] = step
+        print(f"[Reindex] {alias}: {step}")
+
+    @property
+    def running(self) -> bool:
+        return not self.done.is_set()
+
+    def summary(self) -> Dict:
+        end = self.finished_at or time.time()
+        return {
+            "running": self.running,
+            "elapsed_s": round(end - self.started_at, 1),
+            "steps": dict(self.steps),
+            "errors": dict(self.errors),
+        }
+
+
+def start_reindex_job(
+    aliases: List[str],
+    run_fn: Callable[[str, Callable[[str], None]], Dict],
+) -> ReindexJob:
+    """
+    Reindex the aliases one after another in a background thread and return
+    the job right away. run_fn(alias, on_step) does one alias, normally by
+    calling reindex(..., on_step=on_step), and returns its report.
+    """
+    job = ReindexJob(aliases)
+
+    def run():
+        for alias in job.aliases:
+            try:
+                job.reports[alias] = run_fn(alias, lambda step, alias=alias: job.set_step(alias, step))
+                job.set_step(alias, "switched" if job.reports[alias]["switched"] else "not switched")
+            except Exception as e:
+                job.errors[alias] = f"{type(e).__name__}: {e}"
+                job.set_step(alias, "failed")
+        job.finished_at = time.time()
+        job.done.set()
+
+    threading.Thread(target=run, name="reindex", daemon=True).start()
+    return job
@@ -0,0 +1,197 @@
+# routing.py
+"""
+Centroid-based routing for queries that may search many collections.
+
+Every ingest folds the new chunk embeddings into a small k-means summary of
+the collection (n_centroids unit vectors with the number of chunks behind
+each), saved as `<routing_dir>/<collection>.npz`. Summaries live in the
+embedding model's space (before any PCA projection or quantization), so
+collections with different storage settings can be compared.
+
+At query time route_collections() scores the query against the centroids
+of every candidate with one matrix product and keeps the `probes`
+collections with the best-matching centroid; only those are searched.
+It falls back to searching everything when it cannot route with
+confidence:
+  - a candidate without a summary (ingested before routing was enabled)
+    is always searched;
+  - if no candidate has a summary, or the best centroid score is below
+    min_score, every candidate is searched.
+"""
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+DEFAULT_ROUTING = {
+    "enabled": False,
+    "n_centroids": 8,   # k-means centroids kept per collection
+    "probes": 2,        # collections searched per query
+    "min_score": None,  # best centroid cosine below this -> full fan-out
+}
+
+_SUMMARY_CACHE: Dict[str, tuple] = {}
+_STACK_CACHE: Dict[tuple, tuple] = {}
+
+
+def role_collections(target) -> List[str]:
+    """COLLECTION_MAP value (one name or a list of names) as a list."""
+    return [target] if isinstance(target, str) else list(target)
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+
+def fit_centroids(
+    embeddings,
+    n_centroids: int,
+    weights=None,
+    iterations: int = 20,
+    seed: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Weighted spherical k-means. Returns (centroids, counts): unit-norm
+    centroids and the total weight assigned to each.
+    """
+    x = _normalize(np.asarray(embeddings, dtype=np.float32))
+    w = np.ones(len(x), dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+    k = min(n_centroids, len(x))
+    rng = np.random.default_rng(seed)
+
+    # k-means++ seeding on cosine distance
+    centroids = [x[rng.choice(len(x), p=w / w.sum())]]
+    for _ in range(1, k):
+        dist = np.maximum(1.0 - (x @ np.asarray(centroids).T).max(axis=1), 0.0) * w
+        if dist.sum() <= 0:
+            break
+        centroids.append(x[rng.choice(len(x), p=dist / dist.sum())])
+    centroids = np.asarray(centroids)
+
+    for _ in range(iterations):
+        assign = (x @ centroids.T).argmax(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x * w[:, None])
+        updated = _normalize(sums)
+        empty = np.linalg.norm(sums, axis=1) == 0
+        updated[empty] = centroids[empty]
+        if np.allclose(updated, centroids, atol=1e-6):
+            break
+        centroids = updated
+
+    assign = (x @ centroids.T).argmax(axis=1)
+    counts = np.bincount(assign, weights=w, minlength=len(centroids)).astype(np.float32)
+    keep = counts > 0
+    return centroids[keep].astype(np.float32), counts[keep]
+
+
+def summary_path(routing_dir: str, collection_name: str) -> str:
+    return os.path.join(routing_dir, f"{collection_name}.npz")
+
+
+def load_summary(routing_dir: Optional[str], collection_name: str) -> Optional[Dict]:
+    """The collection's summary, or None. Cached per file until it changes on disk."""
+    if not routing_dir:
+        return None
+    path = summary_path(routing_dir, collection_name)
+    if not os.path.exists(path):
+        return None
+
+    mtime = os.path.getmtime(path)
+    cached = _SUMMARY_CACHE.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with np.load(path) as data:
+        summary = {"centroids": data["centroids"], "counts": data["counts"]}
+    _SUMMARY_CACHE[path] = (mtime, summary)
+    return summary
+
+
+def update_summary(routing_dir: str, collection_name: str, embeddings, n_centroids: int = 8) -> Dict:
+    """
+    Fold new chunk embeddings into the collection's summary: the stored
+    centroids (weighted by their counts) and the new vectors are clustered
+    again, so the summary stays n_centroids vectors however often it grows.
+    """
+    new = np.asarray(embeddings, dtype=np.float32)
+    summary = load_summary(routing_dir, collection_name)
+    if summary is not None:
+        points = np.vstack([summary["centroids"], _normalize(new)])
+        weights = np.concatenate([summary["counts"], np.ones(len(new), dtype=np.float32)])
+    else:
+        points, weights = new, None
+    centroids, counts = fit_centroids(points, n_centroids, weights=weights)
+
+    os.makedirs(routing_dir, exist_ok=True)
+    path = summary_path(routing_dir, collection_name)
+    np.savez(path, centroids=centroids, counts=counts)
+    _SUMMARY_CACHE.pop(path, None)
+    return {"centroids": centroids, "counts": counts}
+
+
+def drop_summary(routing_dir: Optional[str], collection_name: str) -> None:
+    if not routing_dir:
+        return
+    path = summary_path(routing_dir, collection_name)
+    _SUMMARY_CACHE.pop(path, None)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _stacked(routing_dir: str, state_names: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    # all candidates' centroids in one matrix + the owning candidate of each row
+    summaries = {n: load_summary(routing_dir, n) for n in state_names}
+    known = [n for n in state_names if summaries[n] is not None]
+    key = (routing_dir, tuple((n, _SUMMARY_CACHE[summary_path(routing_dir, n)][0]) for n in known))
+    cached = _STACK_CACHE.get(key)
+    if cached is None:
+        if len(_STACK_CACHE) > 64:
+            _STACK_CACHE.clear()
+        matrix = np.vstack([summaries[n]["centroids"] for n in known]) if known else np.zeros((0, 0), np.float32)
+        owner = np.concatenate(
+            [np.full(len(summaries[n]["centroids"]), i) for i, n in enumerate(known)]
+        ) if known else np.zeros(0, dtype=int)
+        cached = _STACK_CACHE[key] = (matrix, owner, known)
+    return cached
+
+
+def route_collections(
+    query_embedding,
+    collection_names: Sequence[str],
+    routing_dir: Optional[str],
+    probes: int = 2,
+    min_score: Optional[float] = None,
+    state_names: Optional[Sequence[str]] = None,
+) -> Dict:
+    """
+    Pick the collections to search. state_names are the names the
+    summaries are stored under (physical collections behind aliases),
+    parallel to collection_names.
+
+    Returns {"selected": [...], "scores": {name: best centroid cosine},
+    "fallback": None | "no_summaries" | "below_min_score"}.
+    """
+    names = list(collection_names)
+    states = list(state_names or names)
+    if len(names) <= probes:
+        return {"selected": names, "scores": {}, "fallback": None}
+
+    matrix, owner, known = _stacked(routing_dir, states)
+    if not known:
+        return {"selected": names, "scores": {}, "fallback": "no_summaries"}
+
+    q = _normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+    best = np.full(len(known), -np.inf, dtype=np.float32)
+    np.maximum.at(best, owner, matrix @ q)
+    by_state = dict(zip(known, best.tolist()))
+    scores = {n: round(by_state[s], 4) for n, s in zip(names, states) if s in by_state}
+
+    if min_score is not None and max(scores.values()) < min_score:
+        return {"selected": names, "scores": scores, "fallback": "below_min_score"}
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:probes]
+    unsummarized = [n for n, s in zip(names, states) if s not in by_state]
+    selected = [n for n in names if n in ranked or n in unsummarized]
+    return {"selected": selected, "scores": scores, "fallback": None}
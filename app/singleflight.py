@@ -0,0 +1,131 @@
+# singleflight.py
+"""
+Request coalescing ("single-flight") for identical concurrent calls.
+
+The first caller for a key runs the computation; callers arriving while it
+is in flight wait for it and get the same result (or exception). Waiting is
+bounded: after `max_wait_s` a follower gives up and runs the call itself.
+SingleFlight is for threads, AsyncSingleFlight for asyncio code.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+def coalesce_key(role: str, question: str, top_k: int) -> tuple:
+    """Requests are identical if role, normalized question and top_k match."""
+    return (role, " ".join(question.lower().split()), top_k)
+
+
+class _FlightMetrics:
+    def __init__(self, max_tracked_keys: int):
+        self.max_tracked_keys = max_tracked_keys
+        self._metrics_lock = threading.Lock()
+        self._per_key: "OrderedDict[Hashable, Dict]" = OrderedDict()
+        self.totals = {"executed": 0, "shared": 0, "timeouts": 0, "errors": 0}
+
+    def _record(self, key: Hashable, outcome: str, wait_s: float = 0.0) -> None:
+        with self._metrics_lock:
+            self.totals[outcome] += 1
+            m = self._per_key.pop(key, None) or {
+                "executed": 0, "shared": 0, "timeouts": 0, "errors": 0, "max_wait_s": 0.0,
+            }
+            m[outcome] += 1
+            m["max_wait_s"] = max(m["max_wait_s"], round(wait_s, 4))
+            self._per_key[key] = m  # most recently used last
+            while len(self._per_key) > self.max_tracked_keys:
+                self._per_key.popitem(last=False)
+
+    def metrics(self, top: int = 10) -> Dict:
+        with self._metrics_lock:
+            busiest = sorted(self._per_key.items(), key=lambda kv: -kv[1]["shared"])[:top]
+            calls = self.totals["executed"] + self.totals["shared"]
+            return {
+                **self.totals,
+                "coalesced_ratio": round(self.totals["shared"] / calls, 4) if calls else 0.0,
+                "top_keys": [{"key": list(k) if isinstance(k, tuple) else k, **m} for k, m in busiest],
+            }
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(_FlightMetrics):
+    def __init__(self, max_wait_s: float = 30.0, max_tracked_keys: int = 1000):
+        super().__init__(max_tracked_keys)
+        self.max_wait_s = max_wait_s
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], object]):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    self._calls.pop(key, None)
+                call.done.set()
+            self._record(key, "errors" if call.error else "executed")
+            if call.error:
+                raise call.error
+            return call.result
+
+        t0 = time.perf_counter()
+        if not call.done.wait(self.max_wait_s):
+            self._record(key, "timeouts", time.perf_counter() - t0)
+            return fn()
+        self._record(key, "shared", time.perf_counter() - t0)
+        if call.error:
+            raise call.error
+        return call.result
+
+
+class AsyncSingleFlight(_FlightMetrics):
+    def __init__(self, max_wait_s: float = 30.0, max_tracked_keys: int = 1000):
+        super().__init__(max_tracked_keys)
+        self.max_wait_s = max_wait_s
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[object]]):
+        future = self._futures.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            # avoid "exception was never retrieved" when nobody was waiting
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._futures[key] = future
+            try:
+                result = await fn()
+            except BaseException as e:
+                future.set_exception(e)
+                self._record(key, "errors")
+                raise
+            finally:
+                self._futures.pop(key, None)
+            future.set_result(result)
+            self._record(key, "executed")
+            return result
+
+        t0 = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), self.max_wait_s)
+        except asyncio.TimeoutError:
+            self._record(key, "timeouts", time.perf_counter() - t0)
+            return await fn()
+        self._record(key, "shared", time.perf_counter() - t0)
+        return result
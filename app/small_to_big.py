@@ -0,0 +1,165 @@
+# small_to_big.py
+"""
+Small-to-big (parent window) retrieval.
+
+Ingest splits the text into sentence-level child units (at most
+child_tokens words) grouped into parent windows (at most parent_tokens
+words). Only the children are embedded, so matching is precise. Each child
+row's source, "<pdf>#chunk=<parent>&child=<unit>", doubles as the reference
+to its parent. Parent bodies (their child units) are kept in a
+ChunkTextStore under "<collection>#parents".
+
+At query time top_k * fetch_factor children are retrieved and expanded to
+at most top_k deduplicated parents, in the order of their best child.
+window=None returns the whole parent, window=w only the matched units plus
+w neighbours on each side, which is usually enough context at a fraction of
+the prompt size.
+"""
+import hashlib
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+DEFAULT_SMALL_TO_BIG = {
+    "enabled": False,
+    "parent_tokens": 256,  # words per parent window
+    "child_tokens": 48,    # words per embedded child unit
+    "fetch_factor": 4,     # children retrieved per requested passage
+    "window": 1,           # units around each matched child; None = whole parent
+}
+
+CHILD_SEP = "&child="
+_SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+|\n+")
+
+
+def split_sentences(text: str) -> List[str]:
+    return [" ".join(s.split()) for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+def _units(sentences: List[str], max_words: int) -> List[str]:
+    """Pack sentences into units of at most max_words (long sentences are split)."""
+    units, current = [], []
+    for sentence in sentences:
+        words = sentence.split()
+        while len(words) > max_words:  # over-long sentence: hard split
+            if current:
+                units.append(" ".join(current))
+                current = []
+            units.append(" ".join(words[:max_words]))
+            words = words[max_words:]
+        if current and len(current) + len(words) > max_words:
+            units.append(" ".join(current))
+            current = []
+        current.extend(words)
+    if current:
+        units.append(" ".join(current))
+    return units
+
+
+def build_hierarchy(text: str, parent_tokens: int = 256, child_tokens: int = 48) -> List[List[str]]:
+    """Parents as lists of child units; a parent never splits a unit."""
+    parents, current, words = [], [], 0
+    for unit in _units(split_sentences(text), child_tokens):
+        n = len(unit.split())
+        if current and words + n > parent_tokens:
+            parents.append(current)
+            current, words = [], 0
+        current.append(unit)
+        words += n
+    if current:
+        parents.append(current)
+    return parents
+
+
+def chunk_source(source: str, label) -> str:
+    """A row's source: the document and its chunk label ("<pdf>#chunk=<label>")."""
+    return f"{source}#chunk={label}"
+
+
+def child_label(parent_index: int, child_index: int) -> str:
+    """Chunk label used in the row's source ("<pdf>#chunk=<label>")."""
+    return f"{parent_index}{CHILD_SEP}{child_index}"
+
+
+def split_child_source(source: Optional[str]) -> Tuple[Optional[str], Optional[int]]:
+    """(parent source, unit index) of a child row's source; (None, None) for flat chunks."""
+    if not source or CHILD_SEP not in source:
+        return None, None
+    parent, child = source.rsplit(CHILD_SEP, 1)
+    return parent, int(child)
+
+
+def parent_id(parent_source: str) -> int:
+    # stable positive int64 key for the text store
+    return int.from_bytes(hashlib.blake2b(parent_source.encode("utf-8"), digest_size=8).digest(), "big") >> 1
+
+
+def parents_namespace(collection_name: str) -> str:
+    return f"{collection_name}#parents"
+
+
+def store_parents(parent_store, collection_name: str, source: str, parents: List[List[str]]) -> int:
+    sources = [chunk_source(source, p) for p in range(len(parents))]
+    return parent_store.put_many(
+        parents_namespace(collection_name),
+        [parent_id(s) for s in sources],
+        [json.dumps(units, ensure_ascii=False) for units in parents],
+    )
+
+
+def expand_to_parents(
+    hits: List[Dict],
+    parent_store,
+    collection_name: str,
+    top_k: int,
+    window: Optional[int] = 1,
+) -> List[Dict]:
+    """
+    Replace child hits by their parents (deduplicated, best child first,
+    at most top_k). Hits that are not children, or whose parent is not in
+    the store, are kept as they are.
+    """
+    groups: Dict[str, Dict] = {}
+    order: List[Tuple[str, object]] = []
+    for h in hits:
+        parent_source, unit = split_child_source(h.get("source"))
+        if parent_source is None:
+            order.append(("hit", h))
+            continue
+        if parent_source not in groups:
+            groups[parent_source] = {"score": h.get("score"), "units": set(), "hit": h}
+            order.append(("parent", parent_source))
+        groups[parent_source]["units"].add(unit)
+
+    bodies = parent_store.get_many(
+        parents_namespace(collection_name), [parent_id(s) for s in groups]
+    ) if groups else {}
+
+    out = []
+    for kind, item in order:
+        if len(out) == top_k:
+            break
+        if kind == "hit":
+            out.append(item)
+            continue
+        group = groups[item]
+        body = bodies.get(parent_id(item))
+        if body is None:
+            out.append(group["hit"])
+            continue
+        units = json.loads(body)
+        if window is None:
+            keep = range(len(units))
+        else:
+            keep = sorted({
+                i for u in group["units"] for i in range(u - window, u + window + 1) if 0 <= i < len(units)
+            })
+        out.append({
+            "id": parent_id(item),
+            "text": " ".join(units[i] for i in keep),
+            "source": item,
+            "score": group["score"],
+            "children": sorted(group["units"]),
+        })
+    return out
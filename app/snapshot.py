@@ -0,0 +1,377 @@
+# snapshot.py
+"""
+Export / import Milvus collections as Parquet snapshots.
+
+A snapshot is a directory with `manifest.json` and `part-NNNNN.parquet`
+files (columns: id, offering_id, text, source, embedding). Float vectors
+are stored as a fixed-size list<float32> column, compact vectors
+(float16 / bfloat16 / binary) as fixed-size binary. Restoring inserts the
+stored vectors directly, so nothing has to be re-embedded. Collections
+that keep their text in a text_store.ChunkTextStore are exported with the
+text filled in from it and restored into it.
+
+The manifest also records how the vectors were produced (dim and vector
+storage read from the collection's schema, reduced dimension, index) and
+the snapshot carries the collection's PCA projection (projection.npz) if
+it has one, so queries against the restored collection are encoded the
+same way as the stored vectors.
+
+Side state is carried when its location is given: the dedup state
+(dedup.npz, its row ids remapped to the new ids on import), the routing
+summary (routing.npz) and small-to-big parent windows (parents.parquet).
+manifest["state"] lists what the snapshot holds; manifest["not_included"]
+names the state that was not exported, which a restore does not have.
+"""
+import json
+import os
+import shutil
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pymilvus import MilvusClient
+
+from quantization import BYTES_PER_COMPONENT
+from rag_backend import TEXT_MAX_LENGTH, ensure_collection
+from reindex import resolve_collection, drop_alias_and_versions
+from projection import load_projection, projection_path, save_projection
+from tuning import describe_vector_index, row_count
+from metadata import collection_exists, ensure_loaded, index_build_params, invalidate_metadata
+from dedup import dedup_state_path, remap_dedup_ids
+from routing import summary_path
+from small_to_big import parents_namespace
+
+
+SNAPSHOT_FIELDS = ["id", "offering_id", "text", "source", "embedding"]
+MANIFEST_NAME = "manifest.json"
+PROJECTION_NAME = "projection.npz"
+DEDUP_NAME = "dedup.npz"
+ROUTING_NAME = "routing.npz"
+PARENTS_NAME = "parents.parquet"
+_PARENTS_SCHEMA = pa.schema([("id", pa.int64()), ("body", pa.string())])
+
+
+def _arrow_schema(dim: int, vector_storage: str) -> pa.Schema:
+    if vector_storage == "float32":
+        vector_type = pa.list_(pa.float32(), dim)
+    else:
+        vector_type = pa.binary(int(dim * BYTES_PER_COMPONENT[vector_storage]))
+    return pa.schema([
+        ("id", pa.int64()),
+        ("offering_id", pa.string()),
+        ("text", pa.string()),
+        ("source", pa.string()),
+        ("embedding", vector_type),
+    ])
+
+
+def _unwrap_vector(v):
+    # pymilvus returns bytes-typed vectors as a single-element list
+    if isinstance(v, list) and len(v) == 1 and isinstance(v[0], bytes):
+        return v[0]
+    return v
+
+
+def _batch_to_table(rows: List[Dict], schema: pa.Schema, dim: int, vector_storage: str) -> pa.Table:
+    vectors = [_unwrap_vector(r["embedding"]) for r in rows]
+    if vector_storage == "float32":
+        flat = np.asarray(vectors, dtype=np.float32).reshape(-1)
+        embedding = pa.FixedSizeListArray.from_arrays(pa.array(flat, type=pa.float32()), dim)
+    else:
+        embedding = pa.array(vectors, type=schema.field("embedding").type)
+
+    return pa.Table.from_arrays(
+        [
+            pa.array([r["id"] for r in rows], type=pa.int64()),
+            pa.array([r.get("offering_id") for r in rows], type=pa.string()),
+            pa.array([r.get("text") for r in rows], type=pa.string()),
+            pa.array([r.get("source") for r in rows], type=pa.string()),
+            embedding,
+        ],
+        schema=schema,
+    )
+
+
+def _copy_if_exists(src: Optional[str], dst: str) -> bool:
+    if src is None or not os.path.exists(src):
+        return False
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    shutil.copyfile(src, dst)
+    return True
+
+
+def export_collection(
+    client: MilvusClient,
+    collection_name: str,
+    out_dir: str,
+    batch_size: int = 1000,
+    rows_per_file: int = 100_000,
+    compression: str = "zstd",
+    text_store=None,
+    projection_dir: Optional[str] = None,
+    dedup_dir: Optional[str] = None,
+    routing_dir: Optional[str] = None,
+    parent_store=None,
+) -> Dict:
+    """
+    Stream a collection to Parquet with a query iterator, batch by batch.
+
+    Memory stays bounded by one batch; files are rotated every
+    `rows_per_file` rows. Returns the manifest that is also written to
+    `<out_dir>/manifest.json`. The vector dim and type come from the
+    collection's schema.
+
+    projection_dir / dedup_dir / routing_dir / parent_store: where the
+    collection's projection, dedup state, routing summary and parent windows
+    are kept; they are copied into the snapshot.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    meta = ensure_loaded(client, collection_name)
+    dim, vector_storage = meta["dim"], meta["vector_storage"]
+    schema = _arrow_schema(dim, vector_storage)
+    physical_name = meta["physical_name"]
+    t0 = time.time()
+
+    iterator = client.query_iterator(
+        collection_name=collection_name,
+        batch_size=batch_size,
+        filter="",
+        output_fields=[f for f in SNAPSHOT_FIELDS if text_store is None or f != "text"],
+    )
+
+    files = []
+    writer = None
+    rows_in_file = 0
+    total = 0
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+
+            if writer is None or rows_in_file >= rows_per_file:
+                if writer is not None:
+                    writer.close()
+                name = f"part-{len(files):05d}.parquet"
+                files.append(name)
+                writer = pq.ParquetWriter(os.path.join(out_dir, name), schema, compression=compression)
+                rows_in_file = 0
+
+            if text_store is not None:
+                text_store.fill_texts(physical_name, batch)
+            writer.write_table(_batch_to_table(batch, schema, dim, vector_storage))
+            rows_in_file += len(batch)
+            total += len(batch)
+            print(f"[Snapshot] Exported {total} rows from '{collection_name}'", end="\r")
+    finally:
+        iterator.close()
+        if writer is not None:
+            writer.close()
+
+    projection = load_projection(projection_dir, physical_name)
+    if projection is not None:
+        shutil.copyfile(projection_path(projection_dir, physical_name), os.path.join(out_dir, PROJECTION_NAME))
+    index = describe_vector_index(client, physical_name)
+
+    state, not_included = {}, []
+    if dedup_dir is None:
+        not_included.append("dedup")
+    elif _copy_if_exists(dedup_state_path(dedup_dir, physical_name), os.path.join(out_dir, DEDUP_NAME)):
+        state["dedup"] = DEDUP_NAME
+    if routing_dir is None:
+        not_included.append("routing")
+    elif _copy_if_exists(summary_path(routing_dir, physical_name), os.path.join(out_dir, ROUTING_NAME)):
+        state["routing"] = ROUTING_NAME
+    if parent_store is None:
+        not_included.append("parents")
+    else:
+        n_parents = 0
+        with pq.ParquetWriter(os.path.join(out_dir, PARENTS_NAME), _PARENTS_SCHEMA, compression=compression) as w:
+            for rows in parent_store.iter_collection(parents_namespace(physical_name)):
+                w.write_table(pa.Table.from_pylist([{"id": i, "body": b} for i, b in rows], schema=_PARENTS_SCHEMA))
+                n_parents += len(rows)
+        if n_parents:
+            state["parents"] = PARENTS_NAME
+        else:
+            os.remove(os.path.join(out_dir, PARENTS_NAME))
+
+    manifest = {
+        "collection_name": collection_name,
+        "dim": dim,
+        "vector_storage": vector_storage,
+        "reduce_dim": dim if projection is not None else 0,
+        "model_dim": int(projection["weights"].shape[0]) if projection is not None else dim,
+        "projection": PROJECTION_NAME if projection is not None else None,
+        "index": {
+            "index_type": index.get("index_type"),
+            "metric_type": index.get("metric_type"),
+            "params": index_build_params(index),
+        },
+        "state": state,
+        "not_included": not_included,
+        "num_rows": total,
+        "files": files,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"\n[Snapshot] Exported {total} rows from '{collection_name}' "
+          f"to {len(files)} file(s) in {time.time() - t0:.2f} s")
+    return manifest
+
+
+def read_manifest(snapshot_dir: str) -> Dict:
+    with open(os.path.join(snapshot_dir, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def _text_max_length(client: MilvusClient, collection_name: str) -> int:
+    for field in client.describe_collection(collection_name)["fields"]:
+        if field["name"] == "text":
+            return int(field["params"]["max_length"])
+    return TEXT_MAX_LENGTH
+
+
+def _long_texts(snapshot_dir: str, manifest: Dict, limit: int):
+    """(longest text in UTF-8 bytes, number of texts over `limit`) in the snapshot."""
+    longest, n_long = 0, 0
+    for name in manifest["files"]:
+        for batch in pq.ParquetFile(os.path.join(snapshot_dir, name)).iter_batches(columns=["text"]):
+            lengths = pc.fill_null(pc.binary_length(batch.column("text")), 0).to_numpy()
+            if len(lengths):
+                longest = max(longest, int(lengths.max()))
+                n_long += int((lengths > limit).sum())
+    return longest, n_long
+
+
+def import_collection(
+    client: MilvusClient,
+    collection_name: str,
+    snapshot_dir: str,
+    batch_size: int = 1000,
+    text_store=None,
+    projection_dir: Optional[str] = None,
+    overwrite: bool = False,
+    dedup_dir: Optional[str] = None,
+    routing_dir: Optional[str] = None,
+    parent_store=None,
+) -> int:
+    """
+    Restore a snapshot into `collection_name` with batched inserts.
+
+    The collection is created with the snapshot's dim, vector storage and
+    index if it does not exist. An existing collection that already has
+    rows is refused (importing would duplicate them) unless overwrite=True,
+    which drops it (an alias with all its versions) and recreates it from
+    the manifest. Primary keys are auto_id, so rows get new ids; the
+    original ones only stay in the Parquet files. With text_store the texts
+    go there, keyed by the new ids. Without a text store the texts go to
+    the collection's VARCHAR text field; a snapshot with longer texts (e.g.
+    exported from a text-store collection) is refused before anything is
+    dropped or inserted.
+
+    projection_dir: where to restore the snapshot's PCA projection; needed
+    when the snapshot has one. dedup_dir / routing_dir / parent_store:
+    where to restore the side state the snapshot carries (skipped when not
+    given; the dedup state is remapped to the new ids).
+    """
+    manifest = read_manifest(snapshot_dir)
+    vector_storage = manifest["vector_storage"]
+    state = manifest.get("state", {})
+    if manifest.get("projection") and not projection_dir:
+        raise ValueError(
+            f"Snapshot '{snapshot_dir}' stores {manifest['dim']}-dim projected vectors; "
+            "pass projection_dir to restore its projection."
+        )
+    exists = collection_exists(client, collection_name)
+    has_rows = exists and row_count(client, collection_name) > 0
+    if text_store is None:
+        kept = exists and not has_rows
+        text_limit = _text_max_length(client, collection_name) if kept else TEXT_MAX_LENGTH
+        longest, n_long = _long_texts(snapshot_dir, manifest, text_limit)
+        if n_long:
+            raise ValueError(
+                f"Snapshot '{snapshot_dir}' has {n_long} text(s) longer than the text field's "
+                f"{text_limit} bytes (longest {longest}); restore it with a text store."
+            )
+    if has_rows:
+        if not overwrite:
+            raise ValueError(
+                f"Collection '{collection_name}' already has rows; pass overwrite=True to replace it."
+            )
+        for name in drop_alias_and_versions(client, collection_name) + [collection_name]:
+            if client.has_collection(name):
+                client.drop_collection(name)
+            invalidate_metadata(name)
+            if text_store is not None:
+                text_store.delete_collection(name)
+        print(f"[Snapshot] Dropped '{collection_name}' to restore it")
+
+    index = manifest.get("index") or {}
+    ensure_collection(
+        client, collection_name, manifest["dim"], vector_storage=vector_storage,
+        index_type=index.get("index_type"), index_params=index.get("params") or None,
+        store_text=text_store is None,
+    )
+    physical_name = resolve_collection(client, collection_name, refresh=True)
+    if manifest.get("projection"):
+        projection = load_projection(snapshot_dir, os.path.splitext(manifest["projection"])[0])
+        save_projection(projection_dir, physical_name, projection)
+    t0 = time.time()
+
+    total = 0
+    id_map: Dict[int, int] = {}
+    for name in manifest["files"]:
+        parquet = pq.ParquetFile(os.path.join(snapshot_dir, name))
+        columns = ["id", "offering_id", "text", "source", "embedding"]
+        for batch in parquet.iter_batches(batch_size=batch_size, columns=columns):
+            if vector_storage == "float32":
+                vectors = (
+                    batch.column("embedding").flatten().to_numpy(zero_copy_only=False)
+                    .reshape(len(batch), manifest["dim"]).tolist()
+                )
+            else:
+                vectors = batch.column("embedding").to_pylist()
+
+            rows = [
+                {"offering_id": o, "text": t, "source": s, "embedding": v}
+                for o, t, s, v in zip(
+                    batch.column("offering_id").to_pylist(),
+                    batch.column("text").to_pylist(),
+                    batch.column("source").to_pylist(),
+                    vectors,
+                )
+            ]
+            if text_store is None:
+                res = client.insert(collection_name=collection_name, data=rows)
+            else:
+                texts = [r.pop("text") for r in rows]
+                res = client.insert(collection_name=collection_name, data=rows)
+                text_store.put_many(physical_name, res["ids"], texts)
+            if dedup_dir and "dedup" in state:
+                id_map.update(zip(batch.column("id").to_pylist(), res["ids"]))
+            total += len(rows)
+            print(f"[Snapshot] Imported {total}/{manifest['num_rows']} rows into '{collection_name}'", end="\r")
+
+    if dedup_dir and "dedup" in state:
+        _copy_if_exists(os.path.join(snapshot_dir, state["dedup"]), dedup_state_path(dedup_dir, physical_name))
+        remap_dedup_ids(dedup_dir, physical_name, id_map)
+    if routing_dir and "routing" in state:
+        _copy_if_exists(os.path.join(snapshot_dir, state["routing"]), summary_path(routing_dir, physical_name))
+    if parent_store is not None and "parents" in state:
+        for batch in pq.ParquetFile(os.path.join(snapshot_dir, state["parents"])).iter_batches(batch_size=batch_size):
+            parent_store.put_many(
+                parents_namespace(physical_name), batch.column("id").to_pylist(), batch.column("body").to_pylist(),
+            )
+    skipped = [k for k, given in (("dedup", dedup_dir), ("routing", routing_dir), ("parents", parent_store))
+               if k in state and not given]
+    missing = manifest.get("not_included", [])
+    if skipped or missing:
+        print(f"[Snapshot] Side state not restored: {sorted(set(skipped + missing))}")
+
+    print(f"\n[Snapshot] Imported {total} rows into '{collection_name}' in {time.time() - t0:.2f} s")
+    return total
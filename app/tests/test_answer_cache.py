@@ -0,0 +1,46 @@
+import answer_cache
+from answer_cache import SemanticAnswerCache
+
+PASSAGES = [{"id": 2, "text": "b"}, {"id": 1, "text": "a"}]
+
+
+def test_passage_key_ignores_order():
+    assert SemanticAnswerCache.passage_key(PASSAGES) == SemanticAnswerCache.passage_key(PASSAGES[::-1])
+    assert SemanticAnswerCache.passage_key([{"source": "x.pdf#3"}]) == ("x.pdf#3",)
+
+
+def test_hit_needs_similar_question_and_same_passages():
+    cache = SemanticAnswerCache(threshold=0.9)
+    cache.store("Employee", "c", "what is travelflex?", [1.0, 0.0], PASSAGES, "an answer")
+
+    hit = cache.lookup("Employee", [0.99, 0.05], PASSAGES[::-1])
+    assert hit["answer"] == "an answer" and hit["similarity"] > 0.9
+    assert cache.lookup("Employee", [0.0, 1.0], PASSAGES) is None           # different question
+    assert cache.lookup("Employee", [1.0, 0.0], PASSAGES[:1]) is None       # different passages
+    assert cache.lookup("Manager", [1.0, 0.0], PASSAGES) is None            # other role
+    assert cache.metrics()["hits"] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = SemanticAnswerCache(ttl_s=60)
+    cache.store("Employee", "c", "q", [1.0, 0.0], PASSAGES, "an answer")
+
+    now[0] += 59
+    assert cache.lookup("Employee", [1.0, 0.0], PASSAGES) is not None
+    now[0] += 2
+    assert cache.lookup("Employee", [1.0, 0.0], PASSAGES) is None
+    assert cache.stats["expired"] == 1 and len(cache) == 0
+
+
+def test_lru_eviction_and_invalidation():
+    cache = SemanticAnswerCache(max_entries=2, ttl_s=None)
+    cache.store("Employee", "c1", "q1", [1.0, 0.0], PASSAGES, "a1")
+    cache.store("Employee", ("c1", "c2"), "q2", [0.0, 1.0], PASSAGES, "a2")
+    cache.store("Manager", "c3", "q3", [1.0, 0.0], PASSAGES, "a3")
+    assert len(cache) == 2 and cache.stats["evictions"] == 1
+
+    assert cache.invalidate("c2") == 1  # fan-out entries are built on a tuple of collections
+    assert cache.invalidate() == 1
+    assert len(cache) == 0
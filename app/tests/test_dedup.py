@@ -0,0 +1,54 @@
+import numpy as np
+
+from dedup import (
+    band_keys, find_near_duplicates, load_dedup_state, lsh_candidates, minhash_signatures,
+    record_dedup_ingest, remap_dedup_ids,
+)
+
+BASE = "the travel insurance covers lost luggage delayed flights and medical costs abroad for every member"
+
+
+def test_minhash_estimates_jaccard():
+    sigs = minhash_signatures([BASE, BASE, "completely unrelated words about a tender for office chairs"])
+    assert (sigs[0] == sigs[1]).all()
+    assert (sigs[0] == sigs[2]).mean() < 0.2
+
+
+def test_lsh_compares_all_prior_members_up_to_the_cap():
+    sigs = np.zeros((5, 8), dtype=np.uint32)  # every row in the same buckets
+    assert lsh_candidates(sigs, bands=4)[4] == {0, 1, 2, 3}
+    assert lsh_candidates(sigs, bands=4, max_bucket_compare=2)[4] == {0, 1}
+    assert set(lsh_candidates(sigs, bands=4, start=3)) == {3, 4}
+
+
+def test_band_keys_match_only_equal_bands():
+    sigs = np.array([[1, 2, 3, 4], [1, 2, 9, 9]], dtype=np.uint32)
+    keys = band_keys(sigs, bands=2)
+    assert keys.shape == (2, 2)
+    assert keys[0, 0] == keys[1, 0] and keys[0, 1] != keys[1, 1]
+
+
+def test_duplicates_within_a_batch():
+    chunks = [BASE, "a tender for office chairs and desks in the head office building", BASE + " too"]
+    result = find_near_duplicates(chunks, threshold=0.5, cosine_threshold=None)
+    assert result["keep"] == [0, 1]
+    assert result["duplicates"][0]["chunk"] == 2
+    assert result["duplicates"][0]["canonical_chunk"] == 0
+
+
+def test_duplicates_against_stored_state(tmp_path):
+    first = find_near_duplicates([BASE], cosine_threshold=None)
+    state = record_dedup_ingest(
+        str(tmp_path), "c", load_dedup_state(str(tmp_path), "c"), first,
+        kept_ids=[101], kept_sources=["a.pdf#1"], kept_embeddings=[], chunk_sources=["a.pdf#1"],
+    )
+    state = load_dedup_state(str(tmp_path), "c")
+    assert state["ids"] == [101] and state["band_keys"].shape == (1, 16)
+
+    second = find_near_duplicates([BASE, "something new about car rental prices"], existing=state,
+                                  cosine_threshold=None)
+    assert second["keep"] == [1]
+    assert second["duplicates"][0]["canonical_row"] == 0
+
+    assert remap_dedup_ids(str(tmp_path), "c", {101: 202}) == 1
+    assert load_dedup_state(str(tmp_path), "c")["ids"] == [202]
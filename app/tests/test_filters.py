@@ -0,0 +1,35 @@
+import pytest
+
+from filters import compile_filter, filter_fields
+
+
+def test_empty_filter_is_no_filter():
+    assert compile_filter(None) == ""
+    assert compile_filter({}) == ""
+    assert compile_filter({"offering_ids": []}) == ""
+
+
+def test_single_and_many_offering_ids():
+    assert compile_filter({"offering_ids": "offering_xyz"}) == 'offering_id == "offering_xyz"'
+    assert compile_filter({"offering_ids": ["a", "b"]}) == 'offering_id in ["a", "b"]'
+
+
+def test_keys_are_and_ed_and_prefixes_or_ed():
+    expr = compile_filter({"offering_ids": ["a"], "source_prefixes": ["x.pdf", "y.pdf"]})
+    assert expr == 'offering_id == "a" and (source like "x.pdf%" or source like "y.pdf%")'
+
+
+def test_values_are_escaped():
+    assert compile_filter({"offering_ids": ['a"b\\c']}) == 'offering_id == "a\\"b\\\\c"'
+    # LIKE wildcards in a prefix are literal
+    assert compile_filter({"source_prefixes": ["50%_off"]}) == '(source like "50\\\\%\\\\_off%")'
+
+
+def test_unknown_key_is_rejected():
+    with pytest.raises(ValueError):
+        compile_filter({"offering": ["a"]})
+
+
+def test_filter_fields():
+    assert filter_fields({"offering_ids": ["a"], "source_prefixes": []}) == ["offering_id"]
+    assert filter_fields(None) == []
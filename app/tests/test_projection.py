@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from projection import apply_projection, fit_projection, load_projection, save_projection
+
+RNG = np.random.default_rng(0)
+# 200 points on a 3-dim subspace of a 12-dim space, plus a little noise
+DATA = (RNG.standard_normal((200, 3)) @ RNG.standard_normal((3, 12)) + 0.01 * RNG.standard_normal((200, 12)) + 5.0)
+
+
+def test_fit_captures_the_subspace():
+    projection = fit_projection(DATA, n_components=3)
+    assert projection["weights"].shape == (12, 3)
+    assert projection["explained_variance_ratio"] > 0.99
+
+    reduced = apply_projection(DATA, projection)
+    assert reduced.shape == (200, 3)
+    assert np.allclose(reduced.mean(axis=0), 0.0, atol=1e-3)  # the bias centers the data
+
+
+def test_whitening_gives_unit_variance():
+    reduced = apply_projection(DATA, fit_projection(DATA, n_components=3, whiten=True))
+    assert np.allclose(reduced.var(axis=0, ddof=1), 1.0, atol=1e-2)
+
+
+def test_too_few_samples_is_rejected():
+    with pytest.raises(ValueError):
+        fit_projection(DATA[:3], n_components=3)
+    with pytest.raises(ValueError):
+        fit_projection(DATA[:20], n_components=3, min_samples=50)
+    with pytest.raises(ValueError):
+        fit_projection(DATA, n_components=13)
+
+
+def test_save_and_load(tmp_path):
+    projection = fit_projection(DATA, n_components=2, max_samples=100)
+    assert projection["n_samples"] == 100
+    save_projection(str(tmp_path), "c", projection)
+    loaded = load_projection(str(tmp_path), "c")
+    assert np.array_equal(apply_projection(DATA, loaded), apply_projection(DATA, projection))
+    assert load_projection(str(tmp_path), "missing") is None
+    assert load_projection(None, "c") is None
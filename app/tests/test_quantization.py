@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from quantization import decode_vectors, quantize_embeddings, rescore_hits
+
+RNG = np.random.default_rng(0)
+EMB = RNG.standard_normal((4, 16)).astype(np.float32)
+
+
+def test_float32_is_unchanged():
+    assert np.array_equal(decode_vectors(quantize_embeddings(EMB, "float32"), "float32", 16), EMB)
+
+
+@pytest.mark.parametrize("storage, rtol", [("float16", 1e-3), ("bfloat16", 1e-2)])
+def test_half_precision_round_trip(storage, rtol):
+    raw = quantize_embeddings(EMB, storage)
+    assert all(len(r) == 16 * 2 for r in raw)
+    assert np.allclose(decode_vectors(raw, storage, 16), EMB, rtol=rtol, atol=1e-6)
+
+
+def test_binary_keeps_signs():
+    raw = quantize_embeddings(EMB, "binary")
+    assert all(len(r) == 2 for r in raw)
+    decoded = decode_vectors([[r] for r in raw], "binary", 16)  # pymilvus wraps bytes in a list
+    assert np.array_equal(decoded, np.where(EMB > 0, 1.0, -1.0))
+
+
+def test_binary_needs_dim_divisible_by_8():
+    with pytest.raises(ValueError):
+        quantize_embeddings(np.ones((1, 12)), "binary")
+
+
+def test_unknown_storage_is_rejected():
+    with pytest.raises(ValueError):
+        quantize_embeddings(EMB, "int4")
+
+
+def test_rescore_reorders_by_full_precision_cosine():
+    raw = quantize_embeddings(EMB, "float16")
+    hits = [{"id": i, "score": 0.0, "vector": raw[i]} for i in range(4)]
+    out = rescore_hits(EMB[2], hits, "float16", top_k=2)
+    assert out[0]["id"] == 2 and out[0]["score"] == pytest.approx(1.0, abs=1e-3)
+    assert len(out) == 2 and "vector" not in out[0]
@@ -0,0 +1,50 @@
+import pytest
+
+from range_search import apply_range, range_params
+
+
+def hits(*scores):
+    return [{"id": i, "score": s} for i, s in enumerate(scores)]
+
+
+def scores(kept):
+    return [h["score"] for h in kept]
+
+
+def test_similarity_threshold_and_best():
+    kept = apply_range(hits(1.0, 0.8, 0.4, 0.2), "COSINE", {"threshold": 0.3, "best": 0.99})
+    assert scores(kept) == [0.8, 0.4]
+
+
+def test_distance_threshold_keeps_zero_distance():
+    kept = apply_range(hits(0.0, 0.5, 1.5), "L2", {"threshold": 1.0})
+    assert scores(kept) == [0.0, 0.5]
+
+
+def test_gap_cut_off_respects_min_hits():
+    settings = {"threshold": 0.1, "max_gap": 0.2, "min_hits": 1}
+    assert scores(apply_range(hits(0.9, 0.85, 0.5, 0.45), "COSINE", settings)) == [0.9, 0.85]
+    settings["min_hits"] = 3
+    assert scores(apply_range(hits(0.9, 0.85, 0.5, 0.45), "COSINE", settings)) == [0.9, 0.85, 0.5, 0.45]
+
+
+def test_per_metric_threshold():
+    settings = {"threshold": {"COSINE": 0.3, "HAMMING": 120}}
+    assert range_params("COSINE", settings) == {"radius": 0.3}
+    assert range_params("HAMMING", settings) == {"radius": 120}
+    assert range_params("L2", settings) == {}
+
+
+def test_similarity_threshold_on_hamming_is_rejected():
+    with pytest.raises(ValueError):
+        apply_range(hits(3), "HAMMING", {"threshold": 0.3})
+
+
+def test_rescored_hits_use_rescore_threshold():
+    settings = {"threshold": {"HAMMING": 120}, "rescore_threshold": 0.5}
+    kept = apply_range(hits(0.9, 0.6, 0.4), "HAMMING", settings, rescored=True)
+    assert scores(kept) == [0.9, 0.6]
+
+
+def test_hits_without_score_are_dropped():
+    assert apply_range([{"id": 1, "score": None}], "COSINE", {}) == []
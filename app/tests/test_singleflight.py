@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight, coalesce_key
+
+
+def test_coalesce_key_normalizes_the_question():
+    assert coalesce_key("Employee", "  What is  TravelFlex? ", 5) == coalesce_key("Employee", "what is travelflex?", 5)
+    assert coalesce_key("Employee", "q", 5) != coalesce_key("Manager", "q", 5)
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight(max_wait_s=5)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "answer"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+    follower.start()
+    time.sleep(0.2)  # let the follower queue behind the in-flight call
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert results == ["answer", "answer"]
+    assert len(calls) == 1
+    assert flight.metrics()["shared"] == 1
+
+
+def test_errors_reach_the_caller_and_are_counted():
+    flight = SingleFlight()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        flight.do("k", fail)
+    assert flight.metrics()["errors"] == 1
+    assert flight.do("k", lambda: 42) == 42  # a failed call is not cached
+
+
+def test_async_followers_share_the_result():
+    flight = AsyncSingleFlight(max_wait_s=5)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", compute) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["answer"] * 3
+    assert len(calls) == 1
+    assert flight.metrics()["shared"] == 2
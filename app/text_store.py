@@ -0,0 +1,162 @@
+# text_store.py
+"""
+Chunk text kept outside Milvus.
+
+With a text store, collections hold only ids, vectors and filterable
+scalars; the chunk text lives in a local SQLite file, compressed per row,
+and is fetched in one bulk lookup for the final hits of a search. There is
+no VARCHAR length limit on the text.
+
+Compression is zstd when the optional `zstandard` package is installed,
+zlib otherwise; each row records its codec, so files stay readable either
+way.
+"""
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+
+_ZSTD, _ZLIB = b"z", b"d"
+
+# SQLite limits the number of "?" placeholders per statement
+_LOOKUP_CHUNK = 500
+
+_STORES: Dict[str, "ChunkTextStore"] = {}
+_STORES_LOCK = threading.Lock()
+
+
+# ---------- codec (shared with page_cache.py) ----------
+
+def compress_text(text: str, level: int = 3) -> bytes:
+    raw = (text or "").encode("utf-8")
+    if zstandard is not None:
+        return _ZSTD + zstandard.ZstdCompressor(level=level).compress(raw)
+    return _ZLIB + zlib.compress(raw, min(level * 2, 9))
+
+
+def decompress_text(body: bytes) -> str:
+    codec, payload = body[:1], body[1:]
+    if codec == _ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Row is zstd-compressed; install 'zstandard' to read it.")
+        return zstandard.ZstdDecompressor().decompress(payload).decode("utf-8")
+    return zlib.decompress(payload).decode("utf-8")
+
+
+def codec_name() -> str:
+    return "zstd" if zstandard is not None else "zlib"
+
+
+class ChunkTextStore:
+    def __init__(self, path: str, level: int = 3):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.level = level
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " collection TEXT NOT NULL,"
+            " id INTEGER NOT NULL,"
+            " body BLOB NOT NULL,"
+            " PRIMARY KEY (collection, id))"
+        )
+        self._conn.commit()
+
+    def put_many(self, collection_name: str, ids: Iterable[int], texts: Iterable[str]) -> int:
+        rows = [(collection_name, int(i), compress_text(t, self.level)) for i, t in zip(ids, texts)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+        return len(rows)
+
+    def get_many(self, collection_name: str, ids: List[int]) -> Dict[int, str]:
+        """{id: text} for the ids that are present."""
+        out = {}
+        ids = [int(i) for i in ids]
+        with self._lock:
+            for start in range(0, len(ids), _LOOKUP_CHUNK):
+                chunk = ids[start:start + _LOOKUP_CHUNK]
+                cursor = self._conn.execute(
+                    f"SELECT id, body FROM chunks WHERE collection = ? AND id IN ({','.join('?' * len(chunk))})",
+                    [collection_name, *chunk],
+                )
+                out.update(cursor.fetchall())
+        return {i: decompress_text(body) for i, body in out.items()}
+
+    def fill_texts(self, collection_name: str, hits: List[Dict], id_field: str = "id") -> List[Dict]:
+        """Set hit["text"] for every hit, in one lookup."""
+        texts = self.get_many(collection_name, [h[id_field] for h in hits])
+        for h in hits:
+            h["text"] = texts.get(int(h[id_field]))
+        return hits
+
+    def iter_collection(self, collection_name: str, batch_size: int = _LOOKUP_CHUNK) -> Iterator[List[Tuple[int, str]]]:
+        """All (id, text) rows of a collection, in batches."""
+        last = None
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, body FROM chunks WHERE collection = ?"
+                    + (" AND id > ?" if last is not None else "")
+                    + " ORDER BY id LIMIT ?",
+                    [collection_name, *([last] if last is not None else []), batch_size],
+                ).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [(i, decompress_text(body)) for i, body in rows]
+
+    def delete_many(self, collection_name: str, ids: Iterable[int]) -> int:
+        ids = [int(i) for i in ids]
+        n = 0
+        with self._lock:
+            for start in range(0, len(ids), _LOOKUP_CHUNK):
+                chunk = ids[start:start + _LOOKUP_CHUNK]
+                n += self._conn.execute(
+                    f"DELETE FROM chunks WHERE collection = ? AND id IN ({','.join('?' * len(chunk))})",
+                    [collection_name, *chunk],
+                ).rowcount
+            self._conn.commit()
+        return n
+
+    def delete_collection(self, collection_name: str) -> int:
+        with self._lock:
+            n = self._conn.execute("DELETE FROM chunks WHERE collection = ?", (collection_name,)).rowcount
+            self._conn.commit()
+        return n
+
+    def rename_collection(self, old_name: str, new_name: str) -> int:
+        with self._lock:
+            n = self._conn.execute(
+                "UPDATE chunks SET collection = ? WHERE collection = ?", (new_name, old_name)
+            ).rowcount
+            self._conn.commit()
+        return n
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT collection, COUNT(*), SUM(LENGTH(body)) FROM chunks GROUP BY collection"
+            ).fetchall()
+        return {
+            "path": self.path,
+            "codec": codec_name(),
+            "collections": {c: {"rows": n, "compressed_bytes": b} for c, n, b in rows},
+        }
+
+
+def open_text_store(path: str, level: int = 3) -> ChunkTextStore:
+    """Process-wide store per file (SQLite connections are shared across threads)."""
+    with _STORES_LOCK:
+        if path not in _STORES:
+            _STORES[path] = ChunkTextStore(path, level)
+        return _STORES[path]
@@ -0,0 +1,340 @@
+# tuning.py
+"""
+Automatic search-parameter tuning to a target recall@k.
+
+Held-out rows of the collection (or given query vectors) are used as
+queries; exact top-k ground truth is computed by streaming the whole
+collection through numpy. The index's search knob (nprobe / ef /
+search_list) is then swept from cheap to expensive and the first value that
+reaches the target recall is stored in `<tuning_dir>/<collection>.json`,
+where semantic_search picks it up.
+
+The stored result records the index type, metric and build params it was
+tuned on; once the collection's index no longer matches them (rebuilt with
+another type, metric or nlist/M), the result is ignored and retuned.
+"""
+import json
+import os
+import random
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from pymilvus import MilvusClient
+
+from quantization import decode_vectors, quantize_embeddings
+from consistency import consistency_kwargs
+from metadata import ensure_loaded, index_build_params
+
+
+# search knob and candidate values per index type (cheapest first)
+SEARCH_KNOBS = {
+    "IVF_FLAT": ("nprobe", [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]),
+    "IVF_SQ8": ("nprobe", [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]),
+    "IVF_PQ": ("nprobe", [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]),
+    "BIN_IVF_FLAT": ("nprobe", [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]),
+    "HNSW": ("ef", [16, 24, 32, 48, 64, 96, 128, 192, 256, 384, 512]),
+    "DISKANN": ("search_list", [16, 24, 32, 48, 64, 96, 128, 192, 256]),
+}
+
+_TUNED_CACHE: Dict[str, tuple] = {}
+
+
+def describe_vector_index(client: MilvusClient, collection_name: str, field_name: str = "embedding") -> Dict:
+    """Index type, metric and build params of the vector field."""
+    for index_name in client.list_indexes(collection_name, field_name=field_name):
+        info = client.describe_index(collection_name, index_name=index_name)
+        if info.get("field_name", field_name) == field_name:
+            return info
+    raise ValueError(f"No index on '{collection_name}.{field_name}'")
+
+
+def vector_dim(client: MilvusClient, collection_name: str, field_name: str = "embedding") -> int:
+    for field in client.describe_collection(collection_name)["fields"]:
+        if field["name"] == field_name:
+            return int(field["params"]["dim"])
+    raise ValueError(f"No field '{field_name}' in '{collection_name}'")
+
+
+def row_count(client: MilvusClient, collection_name: str) -> int:
+    """Rows visible to a Strong read (get_collection_stats lags until a flush)."""
+    ensure_loaded(client, collection_name)
+    res = client.query(collection_name, filter="", output_fields=["count(*)"], consistency_level="Strong")
+    return int(res[0]["count(*)"])
+
+
+def _unwrap(vector):
+    # pymilvus returns bytes-typed vectors as a single-element list
+    if isinstance(vector, list) and len(vector) == 1 and isinstance(vector[0], bytes):
+        return vector[0]
+    return vector
+
+
+def _iterate_vectors(client: MilvusClient, collection_name: str, batch_size: int):
+    iterator = client.query_iterator(
+        collection_name=collection_name,
+        batch_size=batch_size,
+        filter="",
+        output_fields=["id", "embedding"],
+    )
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            yield [r["id"] for r in batch], [_unwrap(r["embedding"]) for r in batch]
+    finally:
+        iterator.close()
+
+
+def _scores(queries: np.ndarray, docs: np.ndarray, metric_type: str) -> np.ndarray:
+    """Higher is better for every metric."""
+    if metric_type == "COSINE":
+        q = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        d = docs / np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+        return q @ d.T
+    if metric_type == "L2":
+        return -(
+            (queries ** 2).sum(axis=1)[:, None] - 2 * queries @ docs.T + (docs ** 2).sum(axis=1)[None, :]
+        )
+    # IP, and HAMMING on +/-1 decoded bits (agreement = dim - 2 * hamming)
+    return queries @ docs.T
+
+
+def sample_pseudo_queries(
+    client: MilvusClient,
+    collection_name: str,
+    n_queries: int = 200,
+    batch_size: int = 5000,
+    seed: int = 0,
+) -> Dict:
+    """Reservoir-sample stored rows to use as queries (one pass, bounded memory)."""
+    rng = random.Random(seed)
+    ids: List[int] = []
+    raw: List = []
+    seen = 0
+    for batch_ids, batch_vecs in _iterate_vectors(client, collection_name, batch_size):
+        for i, v in zip(batch_ids, batch_vecs):
+            if len(ids) < n_queries:
+                ids.append(i)
+                raw.append(v)
+            else:
+                j = rng.randint(0, seen)
+                if j < n_queries:
+                    ids[j], raw[j] = i, v
+            seen += 1
+    return {"ids": ids, "raw": raw}
+
+
+def exact_ground_truth(
+    client: MilvusClient,
+    collection_name: str,
+    queries: np.ndarray,
+    metric_type: str,
+    vector_storage: str,
+    top_k: int,
+    exclude_ids: Optional[List[int]] = None,
+    batch_size: int = 5000,
+) -> List[List[int]]:
+    """Exact top-k ids per query, streaming the collection batch by batch."""
+    dim = queries.shape[1]
+    best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+    exclude = np.asarray(exclude_ids if exclude_ids is not None else [], dtype=np.int64)
+
+    for batch_ids, batch_vecs in _iterate_vectors(client, collection_name, batch_size):
+        ids = np.asarray(batch_ids, dtype=np.int64)
+        scores = _scores(queries, decode_vectors(batch_vecs, vector_storage, dim), metric_type)
+        if len(exclude):
+            scores[ids[None, :] == exclude[:, None]] = -np.inf  # a query must not find itself
+        all_scores = np.hstack([best_scores, scores])
+        all_ids = np.hstack([best_ids, np.broadcast_to(ids, scores.shape)])
+        keep = np.argsort(-all_scores, axis=1)[:, :top_k]
+        best_scores = np.take_along_axis(all_scores, keep, axis=1)
+        best_ids = np.take_along_axis(all_ids, keep, axis=1)
+    # with fewer than top_k other rows, excluded ids (-inf) would fill the tail
+    return [ids[np.isfinite(scores)].tolist() for ids, scores in zip(best_ids, best_scores)]
+
+
+def tune_search_params(
+    client: MilvusClient,
+    collection_name: str,
+    target_recall: float = 0.95,
+    top_k: int = 5,
+    vector_storage: str = "float32",
+    query_embeddings=None,
+    n_queries: int = 200,
+    batch_size: int = 5000,
+    consistency_level: str = "Strong",
+) -> Dict:
+    """
+    Find the cheapest search setting of the collection's index that reaches
+    `target_recall` recall@top_k. Uses `query_embeddings` if given, otherwise
+    held-out stored rows as pseudo-queries. Sweep searches default to Strong
+    consistency so they see the same rows as the exact ground truth.
+    """
+    index = describe_vector_index(client, collection_name)
+    index_type = index.get("index_type", "FLAT")
+    metric_type = index.get("metric_type", "COSINE")
+    n_rows = row_count(client, collection_name)
+    result = {
+        "collection_name": collection_name,
+        "index_type": index_type,
+        "metric_type": metric_type,
+        "index_params": index_build_params(index),
+        "top_k": top_k,
+        "target_recall": target_recall,
+        "num_entities": n_rows,
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    if index_type not in SEARCH_KNOBS:
+        # FLAT / BIN_FLAT / AUTOINDEX: nothing to sweep
+        return {**result, "params": {}, "recall": 1.0 if "FLAT" in index_type else None, "sweep": []}
+
+    knob, values = SEARCH_KNOBS[index_type]
+    if knob == "nprobe" and "nlist" in index.get("params", index):
+        nlist = int(index.get("params", index)["nlist"])
+        values = [v for v in values if v <= nlist] or [nlist]
+
+    if query_embeddings is not None:
+        raw = quantize_embeddings(query_embeddings, vector_storage)
+        exclude = None
+    else:
+        sample = sample_pseudo_queries(client, collection_name, n_queries, batch_size)
+        raw, exclude = sample["raw"], sample["ids"]
+    if not raw:
+        raise ValueError(f"Collection '{collection_name}' is empty, nothing to tune on")
+
+    queries = decode_vectors(raw, vector_storage, vector_dim(client, collection_name))
+    truth = exact_ground_truth(
+        client, collection_name, queries,
+        "IP" if metric_type == "HAMMING" else metric_type,
+        vector_storage, top_k, exclude, batch_size,
+    )
+
+    sweep = []
+    chosen = None
+    limit = top_k + (1 if exclude else 0)
+    if knob == "ef":
+        # Milvus rejects ef < limit
+        values = [v for v in values if v >= limit] or [limit]
+    for value in values:
+        params = {knob: value}
+        t0 = time.perf_counter()
+        res = client.search(
+            collection_name=collection_name,
+            data=raw,
+            anns_field="embedding",
+            limit=limit,
+            search_params={"metric_type": metric_type, "params": params},
+            **consistency_kwargs(collection_name, consistency_level),
+        )
+        latency_ms = (time.perf_counter() - t0) * 1000 / len(raw)
+
+        hits = 0
+        for qi, q_hits in enumerate(res):
+            found = [h["id"] for h in q_hits if not exclude or h["id"] != exclude[qi]][:top_k]
+            hits += len(set(found) & set(truth[qi]))
+        recall = hits / max(sum(len(t) for t in truth), 1)
+        sweep.append({"params": params, "recall": round(recall, 4), "latency_ms": round(latency_ms, 3)})
+        print(f"[Tuning] {collection_name} {knob}={value}: recall@{top_k}={recall:.3f}, {latency_ms:.2f} ms/query")
+        if recall >= target_recall:
+            chosen = sweep[-1]
+            break
+
+    if chosen is None:
+        chosen = max(sweep, key=lambda s: s["recall"])
+        print(f"[Tuning] Target recall {target_recall} not reached, using best: {chosen['params']}")
+    return {**result, "params": chosen["params"], "recall": chosen["recall"], "sweep": sweep}
+
+
+# ---------- persistence ----------
+
+def tuned_path(tuning_dir: str, collection_name: str) -> str:
+    return os.path.join(tuning_dir, f"{collection_name}.json")
+
+
+def save_tuned_params(tuning_dir: str, result: Dict) -> str:
+    os.makedirs(tuning_dir, exist_ok=True)
+    path = tuned_path(tuning_dir, result["collection_name"])
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    _TUNED_CACHE.pop(path, None)
+    return path
+
+
+def tuned_mismatch(stored: Dict, index: Dict) -> Optional[str]:
+    """
+    Why a stored tuning result does not apply to `index` (collection_meta,
+    or index_type / metric_type / index_params), or None if it does.
+    """
+    for key in ("index_type", "metric_type", "index_params"):
+        if key not in stored:
+            return f"no {key} recorded"
+        if stored[key] != index.get(key):
+            return f"{key} {stored[key]} -> {index.get(key)}"
+    return None
+
+
+def load_tuned_params(
+    tuning_dir: Optional[str],
+    collection_name: str,
+    index: Optional[Dict] = None,
+) -> Optional[Dict]:
+    """
+    Stored tuning result for the collection (cached until the file changes).
+    With `index` (the collection's current metadata), a result tuned on a
+    different index is ignored.
+    """
+    if not tuning_dir:
+        return None
+    path = tuned_path(tuning_dir, collection_name)
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    cached = _TUNED_CACHE.get(path)
+    if cached and cached[0] == mtime:
+        result = cached[1]
+    else:
+        with open(path) as f:
+            result = json.load(f)
+        _TUNED_CACHE[path] = (mtime, result)
+    if index is not None and tuned_mismatch(result, index):
+        return None
+    return result
+
+
+def maybe_retune(
+    client: MilvusClient,
+    collection_name: str,
+    tuning_dir: str,
+    growth: float = 0.5,
+    **tune_kwargs,
+) -> Optional[Dict]:
+    """
+    Tune if the collection has never been tuned, its vector index changed
+    (type, metric or build params) since the last tuning, or it has grown
+    by more than `growth` (fraction of rows). Returns the new result, or
+    None if the stored one is still valid. A stale result that cannot be
+    replaced (empty collection) is deleted.
+    """
+    stored = load_tuned_params(tuning_dir, collection_name)
+    n_rows = row_count(client, collection_name)
+    if stored:
+        index = describe_vector_index(client, collection_name)
+        mismatch = tuned_mismatch(stored, {
+            "index_type": index.get("index_type"),
+            "metric_type": index.get("metric_type"),
+            "index_params": index_build_params(index),
+        })
+        if mismatch:
+            print(f"[Tuning] {collection_name}: index changed ({mismatch}), stored params discarded")
+            os.remove(tuned_path(tuning_dir, collection_name))
+            _TUNED_CACHE.pop(tuned_path(tuning_dir, collection_name), None)
+        elif n_rows <= stored["num_entities"] * (1 + growth):
+            return None
+    if n_rows == 0:
+        return None
+    result = tune_search_params(client, collection_name, **tune_kwargs)
+    save_tuned_params(tuning_dir, result)
+    return result
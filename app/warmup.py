@@ -0,0 +1,104 @@
+# warmup.py
+"""
+Server-level warm-up: load the embedding model and open the Milvus
+connection once per server process, in a background thread, and record how
+long each startup phase took.
+
+Heavy modules (sentence_transformers / torch) are only imported here, on
+first use, so the app script itself starts fast.
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+
+_MODELS: Dict[str, object] = {}
+_MODELS_LOCK = threading.Lock()
+
+
+def get_model(model_name: str):
+    """Process-wide SentenceTransformer cache (safe to call from any thread)."""
+    model = _MODELS.get(model_name)
+    if model is not None:
+        return model
+    with _MODELS_LOCK:
+        if model_name not in _MODELS:
+            from sentence_transformers import SentenceTransformer  # heavy: pulls in torch
+            _MODELS[model_name] = SentenceTransformer(model_name)
+        return _MODELS[model_name]
+
+
+class Readiness:
+    """Startup state shared by all sessions of one server process."""
+
+    def __init__(self, started_at: float):
+        self.started_at = started_at
+        self.phases: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.client = None
+        self.embedder_ready = threading.Event()
+        self.milvus_ready = threading.Event()
+        self.done = threading.Event()
+
+    def record(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = round(seconds, 3)
+        print(f"[Startup] {phase}: {seconds:.2f} s")
+
+    @property
+    def ready(self) -> bool:
+        return self.embedder_ready.is_set()
+
+    def summary(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "milvus_connected": self.milvus_ready.is_set(),
+            "phases_s": dict(self.phases),
+            "errors": dict(self.errors),
+        }
+
+
+def start_warmup(
+    model_name: str,
+    connect: Optional[Callable[[], object]] = None,
+    started_at: Optional[float] = None,
+    imports_s: Optional[float] = None,
+) -> Readiness:
+    """
+    Start the background warm-up and return its Readiness right away.
+
+    connect: optional zero-argument callable returning a MilvusClient; when
+    it fails (e.g. credentials not set) the app falls back to the manual
+    Connect button.
+    """
+    readiness = Readiness(started_at or time.perf_counter())
+    if imports_s is not None:
+        readiness.record("imports", imports_s)
+
+    def run():
+        try:
+            t0 = time.perf_counter()
+            model = get_model(model_name)
+            readiness.record("embedder_load", time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            model.encode(["ping"], convert_to_numpy=True)
+            readiness.record("embedder_first_encode", time.perf_counter() - t0)
+            readiness.embedder_ready.set()
+        except Exception as e:
+            readiness.errors["embedder"] = f"{type(e).__name__}: {e}"
+
+        if connect is not None:
+            try:
+                t0 = time.perf_counter()
+                readiness.client = connect()
+                readiness.client.list_collections()  # first round trip opens the channel
+                readiness.record("milvus_connect", time.perf_counter() - t0)
+                readiness.milvus_ready.set()
+            except Exception as e:
+                readiness.errors["milvus"] = f"{type(e).__name__}: {e}"
+
+        readiness.record("time_to_ready", time.perf_counter() - readiness.started_at)
+        readiness.done.set()
+
+    threading.Thread(target=run, name="warmup", daemon=True).start()
+    return readiness